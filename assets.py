@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import shutil
+
+from logger import log
+
+try:
+    # reflinks (copy-on-write copies) where the file system supports them
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ASSET_MANIFEST_FILE = os.path.normpath(".textstory-cache/asset-manifest.json")
+ASSET_COPY_THREADS = 8
+
+# ways of putting assets into the output folder (besides copying)
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+
+# ioctl request cloning a file on Linux (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+SyncResult = namedtuple('SyncResult', ['copied_files', 'copied_bytes', 'skipped_files', 'skipped_bytes'])
+
+
+# returns (source, destination) pairs for all files in or at the source path
+def list_files(source_path, destination_path):
+    if not os.path.isdir(source_path):
+        return [(source_path, destination_path)]
+    files = []
+    for root, dirs, file_names in os.walk(source_path):
+        relative_path = os.path.relpath(root, source_path)
+        for file_name in file_names:
+            files.append((os.path.join(root, file_name),
+                          os.path.normpath(os.path.join(destination_path, relative_path, file_name))))
+    return files
+
+
+# Brings the given (source, destination) files into the output folder, in
+# parallel threads. A manifest in the output folder records the content hash
+# of every file synced before, so that only files whose content changed (or
+# whose copy was changed or removed) are copied. Files synced before but no
+# longer given are removed. link may be HARDLINK or REFLINK, falling back to
+# copying where that is not possible.
+def sync_assets(files, output_folder_path, link=None):
+    manifest_file_path = os.path.join(output_folder_path, ASSET_MANIFEST_FILE)
+    manifest = _read_manifest(manifest_file_path)
+    new_manifest = {}
+    pending = []
+    skipped_files = skipped_bytes = 0
+    for source, destination in files:
+        name = os.path.relpath(destination, output_folder_path)
+        source_state = _file_state(source)
+        entry = manifest.get(name)
+        if entry is not None and entry['source'] == source_state and entry['destination'] == _file_state(destination):
+            new_manifest[name] = entry
+            skipped_files += 1
+            skipped_bytes += source_state[1]
+        else:
+            pending.append((name, source, destination, entry))
+
+    copied_files = copied_bytes = 0
+    if pending:
+        with ThreadPoolExecutor(max_workers=ASSET_COPY_THREADS) as executor:
+            results = list(executor.map(lambda arguments: _sync_file(*arguments, link=link), pending))
+        for (name, source, destination, entry), (new_entry, copied) in zip(pending, results):
+            new_manifest[name] = new_entry
+            if copied:
+                copied_files += 1
+                copied_bytes += new_entry['source'][1]
+            else:
+                skipped_files += 1
+                skipped_bytes += new_entry['source'][1]
+
+    for name in set(manifest) - set(new_manifest):
+        file_path = os.path.join(output_folder_path, name)
+        if os.path.isfile(file_path):
+            log.info("Removing asset without source: %s.", file_path)
+            os.remove(file_path)
+    if new_manifest != manifest:
+        _write_manifest(manifest_file_path, new_manifest)
+    log.info("Synced assets: copied %s files (%s bytes), skipped %s unchanged files (%s bytes).",
+             copied_files, copied_bytes, skipped_files, skipped_bytes)
+    return SyncResult(copied_files, copied_bytes, skipped_files, skipped_bytes)
+
+
+# returns the manifest entry of a file and whether it was copied
+def _sync_file(name, source, destination, entry, link=None):
+    content_hash = _hash_file(source)
+    source_state = _file_state(source)
+    if entry is None or entry['hash'] != content_hash or entry['destination'] != _file_state(destination):
+        copied = _put_file(source, destination, link)
+    else:
+        # touched, but not changed
+        copied = False
+    return {'source': source_state, 'hash': content_hash, 'destination': _file_state(destination)}, copied
+
+
+# returns whether the file was put into the output folder, which it is not
+# if it is there already (the output folder is the template folder, or a
+# hard link)
+def _put_file(source, destination, link):
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return False
+    folder_path = os.path.dirname(destination)
+    if not os.path.isdir(folder_path):
+        os.makedirs(folder_path, exist_ok=True)
+    # Replacing the destination (instead of writing into it) never changes
+    # the source through an earlier hard link.
+    temporary_file_path = destination + ".tmp"
+    if os.path.lexists(temporary_file_path):
+        os.remove(temporary_file_path)
+    if not (link == HARDLINK and _hardlink(source, temporary_file_path)
+            or link == REFLINK and _reflink(source, temporary_file_path)):
+        shutil.copy2(source, temporary_file_path)
+    os.replace(temporary_file_path, destination)
+    return True
+
+
+def _hardlink(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError as e:
+        log.debug("Cannot hard link %s: %s", source, e)
+        return False
+    return True
+
+
+def _reflink(source, destination):
+    if fcntl is None:
+        return False
+    try:
+        with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+            fcntl.ioctl(destination_file.fileno(), _FICLONE, source_file.fileno())
+    except OSError as e:
+        log.debug("Cannot reflink %s: %s", source, e)
+        os.remove(destination)
+        return False
+    shutil.copystat(source, destination)
+    return True
+
+
+def _file_state(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _hash_file(file_path):
+    content_hash = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def _read_manifest(manifest_file_path):
+    if not os.path.isfile(manifest_file_path):
+        return {}
+    try:
+        with open(manifest_file_path, "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+    except (IOError, ValueError) as e:
+        log.warning("Ignoring unreadable asset manifest %s: %s", manifest_file_path, type(e).__name__ + str(e.args))
+        return {}
+
+
+def _write_manifest(manifest_file_path, manifest):
+    folder_path = os.path.dirname(manifest_file_path)
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path, exist_ok=True)
+    temporary_file_path = manifest_file_path + ".tmp"
+    with open(temporary_file_path, "wb") as f:
+        f.write(json.dumps(manifest, sort_keys=True, indent=1).encode("utf-8"))
+    os.replace(temporary_file_path, manifest_file_path)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+import argparse
+from collections import namedtuple
+from concurrent.futures import as_completed
+import hashlib
+import json
+import logging
+import os
+import time
+
+from assets import HARDLINK, REFLINK, list_files
+from cache import build_code_version
+from filt0r import run_with_setup
+import images
+from logger import log
+from parallel import create_executor
+from paths import dir_path, LATEX_TEMPLATE, HTML_TEMPLATE, HTML_LICENSE, OUTFILE_LATEX_BODY, OUTFILE_LATEX_DOC, \
+    OUTFILE_HTML, OUTFILE_RESTRUCTURED_TEXT, PRELIMINARIES_PATH, APPENDIX_PATH
+from textstory_setup import Setup
+
+INPUT_FILE = "textstory.txt"
+SETUP_FILE_NAME = "setup.toml"
+BATCH_OUTPUT_FOLDER = "_output"
+BATCH_SUMMARY_FILE = "batch-summary.json"
+# written into the output folder of a project built successfully
+BATCH_STAMP_FILE = os.path.normpath(".textstory-cache/batch-stamp.json")
+
+# states of a project in the summary
+BUILT = 'built'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+Project = namedtuple('Project', ['name', 'setup_file_path', 'input_file_path', 'output_folder_path'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="filt0r.py batch",
+                                     description="Convert every textstory project (a folder with textstory.txt and "
+                                                 "setup.toml) below a folder to LaTeX and HTML.")
+    parser.add_argument('folder_path', help="folder containing the projects")
+    parser.add_argument('-o', '--output', dest='output_folder_path',
+                        help="folder for the outputs of all projects (default: %s in the folder)"
+                             % BATCH_OUTPUT_FOLDER)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="number of processes converting projects in parallel (default: number of CPUs)")
+    parser.add_argument('--rst', action='store_true', help="also write reStructuredText")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="render all chapters again instead of reusing unchanged ones")
+    parser.add_argument('--link-assets', choices=(HARDLINK, REFLINK),
+                        help="hard link or reflink assets into the output folders instead of copying them")
+    parser.add_argument('--force', action='store_true', help="also convert projects that are up to date")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log the conversion of every project")
+    args = parser.parse_args(argv)
+    summary = run_batch(args.folder_path, args.output_folder_path, args.jobs, args.rst, args.cache, args.link_assets,
+                        args.force, logging.INFO if args.verbose else logging.WARNING)
+    if summary[FAILED]:
+        raise SystemExit("%s of %s projects failed." % (summary[FAILED], len(summary['projects'])))
+
+
+# Returns the projects below the folder. A project's outputs go to the output
+# folder under its path relative to the folder (without a trailing "src").
+def find_projects(folder_path, output_folder_path):
+    projects = []
+    output_folder_path = os.path.realpath(output_folder_path)
+    for root, dirs, file_names in os.walk(folder_path):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.')
+                         and os.path.realpath(os.path.join(root, name)) != output_folder_path)
+        if INPUT_FILE not in file_names or SETUP_FILE_NAME not in file_names:
+            continue
+        relative_path = os.path.relpath(root, folder_path)
+        if os.path.basename(relative_path) == "src":
+            relative_path = os.path.dirname(relative_path) or "."
+        name = relative_path.replace(os.sep, "/")
+        projects.append(Project(name, os.path.join(root, SETUP_FILE_NAME), os.path.join(root, INPUT_FILE),
+                                os.path.normpath(os.path.join(output_folder_path, relative_path))))
+    return projects
+
+
+# Converts all projects below the folder on a pool of processes, skipping
+# projects whose outputs are up to date (unless forced). Project conversions
+# log at project_log_level. Returns the summary, which is also written to the
+# output folder.
+def run_batch(folder_path, output_folder_path=None, jobs=1, restructured_text=False, cache=True, link_assets=None,
+              force=False, project_log_level=logging.WARNING):
+    start = time.time()
+    if output_folder_path is None:
+        output_folder_path = os.path.join(folder_path, BATCH_OUTPUT_FOLDER)
+    projects = find_projects(folder_path, output_folder_path)
+    log.info("Found %s projects in %s.", len(projects), folder_path)
+
+    results = {}
+    pending = []
+    for project in projects:
+        stamp = project_stamp(project, restructured_text)
+        if not force and is_up_to_date(project, stamp, restructured_text):
+            results[project.name] = {'status': SKIPPED, 'seconds': 0.0}
+        else:
+            pending.append((project, stamp))
+    log.info("Converting %s projects, %s are up to date.", len(pending), len(projects) - len(pending))
+
+    options = (restructured_text, cache, link_assets, project_log_level)
+    interrupted = False
+    executor = None
+    try:
+        if jobs > 1 and len(pending) > 1:
+            # Workers keep imports, fonts and templates loaded from one project to the next.
+            executor = create_executor(min(jobs, len(pending)))
+            futures = dict((executor.submit(build_project, project, stamp, *options), project)
+                           for project, stamp in pending)
+            completed = ((futures[future], future.result()) for future in as_completed(futures))
+        else:
+            completed = ((project, build_project(project, stamp, *options)) for project, stamp in pending)
+        for index, (project, result) in enumerate(completed):
+            results[project.name] = result
+            if result['status'] == FAILED:
+                log.error("[%s/%s] %s failed: %s", index + 1, len(pending), project.name, result['error'])
+            else:
+                log.info("[%s/%s] %s converted in %.2f s.", index + 1, len(pending), project.name, result['seconds'])
+    except KeyboardInterrupt:
+        interrupted = True
+        log.warning("Interrupted, run again to convert the remaining projects.")
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=not interrupted, cancel_futures=True)
+
+    summary = dict((status, sum(1 for result in results.values() if result['status'] == status))
+                   for status in (BUILT, SKIPPED, FAILED))
+    summary['seconds'] = time.time() - start
+    summary['interrupted'] = interrupted
+    summary['projects'] = [dict(results[project.name], name=project.name) for project in projects
+                           if project.name in results]
+    write_json(os.path.join(output_folder_path, BATCH_SUMMARY_FILE), summary)
+    log.info("Converted %s projects, skipped %s, %s failed in %.1f s.", summary[BUILT], summary[SKIPPED],
+             summary[FAILED], summary['seconds'])
+    slowest = sorted((result for result in summary['projects'] if result['status'] == BUILT),
+                     key=lambda result: result['seconds'], reverse=True)[:5]
+    if slowest:
+        log.info("Slowest: %s", ", ".join("%s (%.2f s)" % (result['name'], result['seconds']) for result in slowest))
+    return summary
+
+
+# converts one project, in a worker process
+def build_project(project, stamp, restructured_text=False, cache=True, link_assets=None,
+                  project_log_level=logging.WARNING):
+    start = time.time()
+    log_level = log.level
+    log.setLevel(project_log_level)
+    try:
+        setup = Setup(project.setup_file_path, project.input_file_path, project.output_folder_path)
+        if not run_with_setup(setup, restructured_text=restructured_text, cache=cache, link_assets=link_assets):
+            raise SystemExit("Could not create the output folders.")
+    except (Exception, SystemExit) as e:
+        return {'status': FAILED, 'seconds': time.time() - start, 'error': type(e).__name__ + ": " + str(e)}
+    finally:
+        log.setLevel(log_level)
+    write_json(os.path.join(project.output_folder_path, BATCH_STAMP_FILE), stamp)
+    return {'status': BUILT, 'seconds': time.time() - start}
+
+
+# Returns a hash of everything the outputs of the project depend on: the
+# manuscript, its setup and images, the templates, the preliminary and
+# appendix pages and the code of the build.
+def project_stamp(project, restructured_text):
+    file_paths = [project.input_file_path, project.setup_file_path, LATEX_TEMPLATE, HTML_TEMPLATE, HTML_LICENSE]
+    try:
+        with open(project.input_file_path, "rb") as f:
+            markup = f.read().decode("utf-8", "replace")
+    except IOError:
+        markup = ""
+    source_folder_path = os.path.dirname(project.input_file_path)
+    file_paths += [os.path.join(source_folder_path, *path.split("/")) for path in images.find_images([markup])]
+    for folder_name in (PRELIMINARIES_PATH, APPENDIX_PATH):
+        file_paths += sorted(source for source, destination in list_files(os.path.join(dir_path, 'latex', folder_name),
+                                                                          folder_name))
+    states = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            states.append([file_path, stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            states.append([file_path, None, None])
+    # without Pillow, the images are not scaled
+    stamp = json.dumps([build_code_version(), images.Image is not None, restructured_text, states], sort_keys=True)
+    return hashlib.sha1(stamp.encode("utf-8")).hexdigest()
+
+
+def is_up_to_date(project, stamp, restructured_text):
+    output_files = [OUTFILE_LATEX_BODY, OUTFILE_LATEX_DOC, OUTFILE_HTML]
+    if restructured_text:
+        output_files.append(OUTFILE_RESTRUCTURED_TEXT)
+    if not all(os.path.isfile(os.path.join(project.output_folder_path, file_name)) for file_name in output_files):
+        return False
+    try:
+        with open(os.path.join(project.output_folder_path, BATCH_STAMP_FILE), "rb") as f:
+            return json.loads(f.read().decode("utf-8")) == stamp
+    except (IOError, ValueError):
+        return False
+
+
+def write_json(file_path, summary):
+    folder_path = os.path.dirname(file_path)
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path, exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(json.dumps(summary, sort_keys=True, indent=1).encode("utf-8"))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Times converting many small projects with one Python process per project
+and with batch mode, then a resumed batch where everything is up to date.
+
+    python benchmarks/bench_batch.py --projects 60 --jobs 4
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+root_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root_path)
+
+from batch import find_projects, run_batch  # noqa: E402
+from logger import log  # noqa: E402
+
+test_data_folder_path = os.path.join(root_path, "tests", "test_data")
+test_names = ("comments-on", "comments-off", "table-of-contents", "pirates-in-the-sea-of-blood")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=60, help="number of projects")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="processes converting projects")
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    work_folder_path = tempfile.mkdtemp()
+    try:
+        projects_folder_path = os.path.join(work_folder_path, "projects")
+        for index in range(args.projects):
+            test_name = test_names[index % len(test_names)]
+            shutil.copytree(os.path.join(test_data_folder_path, test_name, "src"),
+                            os.path.join(projects_folder_path, "%s-%03d" % (test_name, index), "src"))
+
+        start = time.time()
+        for project in find_projects(projects_folder_path, os.path.join(work_folder_path, "processes")):
+            subprocess.check_call([sys.executable, "-c", "import filt0r; filt0r.run(%r, %r, %r)"
+                                   % (project.setup_file_path, project.input_file_path, project.output_folder_path)],
+                                  cwd=root_path, stderr=subprocess.DEVNULL)
+        print("process per project %.2f s" % (time.time() - start))
+
+        output_folder_path = os.path.join(work_folder_path, "batch")
+        for name in ("batch", "resumed batch"):
+            start = time.time()
+            summary = run_batch(projects_folder_path, output_folder_path, jobs=args.jobs)
+            assert not summary['failed'], "projects failed"
+            print("%-19s %.2f s (%s converted, %s skipped)"
+                  % (name, time.time() - start, summary['built'], summary['skipped']))
+    finally:
+        shutil.rmtree(work_folder_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Times escaping a document with escaperoutes against the former per-route
+str.replace loops (one full copy of the document per route and call).
+The conversion itself does not call these functions any more, it parses
+escapes with the markup (see bench_suite.py for the conversion).
+
+    python benchmarks/bench_escapes.py --size 1000000
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import escaperoutes  # noqa: E402
+from escaperoutes import escape_routes  # noqa: E402
+
+# the temporary escapes of the former loops
+replace_loop_temporaries = dict((name, "$%s$" % index) for index, name in enumerate(escape_routes))
+
+
+def replace_loop_escape_all(string):
+    for name, escape_route in escape_routes.items():
+        string = string.replace(escape_route.original, replace_loop_temporaries[name])
+    return string
+
+
+def replace_loop_restore(string, output_format):
+    for name, escape_route in escape_routes.items():
+        string = string.replace(replace_loop_temporaries[name], getattr(escape_route, output_format))
+    return string
+
+
+test_story_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                               "tests", "test_data", "comments-on", "src", "textstory.txt")
+
+
+def make_prose(size):
+    with open(test_story_path, 'rb') as story_file:
+        story = story_file.read().decode('utf-8')
+    return (story * (size // len(story) + 1))[:size]
+
+
+def make_dense_text(size, seed=0):
+    random.seed(seed)
+    words = ["word", "Text", "and", "the", "story", "&", "<b>", "50%", "\\*", "\\--", "\\\\", "\\_", "~", "\\#"]
+    text = []
+    length = 0
+    while length < size:
+        word = random.choice(words)
+        text.append(word)
+        length += len(word) + 1
+    return " ".join(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000000, help="characters of text")
+    parser.add_argument('--repeat', type=int, default=5, help="best of N runs")
+    args = parser.parse_args()
+
+    for name, text in (("prose", make_prose(args.size)), ("escape-heavy text", make_dense_text(args.size))):
+        print("\n%s: %d characters" % (name, len(text)))
+        compare(text, args.repeat)
+
+
+def compare(text, repeat):
+    escaped = escaperoutes.escape_all(text)
+    loop_escaped = replace_loop_escape_all(text)
+    cases = [("escape_all", lambda: escaperoutes.escape_all(text), lambda: replace_loop_escape_all(text))]
+    for output_format in ("html", "latex", "restructured_text"):
+        restore = getattr(escaperoutes, "escape_to_" + output_format)
+        assert restore(escaped) == replace_loop_restore(loop_escaped, output_format)
+        cases.append(("escape_to_" + output_format, lambda restore=restore: restore(escaped),
+                      lambda output_format=output_format: replace_loop_restore(loop_escaped, output_format)))
+    print("%-30s %10s %10s" % ("", "loop", "engine"))
+    for name, engine, loop in cases:
+        loop_time = min(timeit.repeat(loop, number=1, repeat=repeat))
+        engine_time = min(timeit.repeat(engine, number=1, repeat=repeat))
+        print("%-30s %8.1fms %8.1fms  %.1fx" % (name, loop_time * 1000, engine_time * 1000,
+                                                loop_time / max(engine_time, 1e-6)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Times numbering the footnotes and side comments of a footnote-heavy book:
+the former regex filters renumbered by rescanning the whole document for
+every index, the renderers count while walking the document tree once.
+
+    python benchmarks/bench_footnotes.py --footnotes 10000
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from logger import log  # noqa: E402
+from markup import parse_markup  # noqa: E402
+from renderers import HtmlRenderer, LatexRenderer, ReStructuredTextRenderer  # noqa: E402
+from textstory_setup import Setup  # noqa: E402
+
+setup_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                               "tests", "test_data", "comments-on", "src", "setup.toml")
+
+
+# the numbering of the former filters.Filter.add_running_index_to_pattern
+def rescanning_running_index(string, pattern, start_index=1):
+    index = start_index
+    while True:
+        string, n = re.subn(pattern + r'(?!\d)', (pattern + str(index)), string, 2)
+        index += 1
+        if n < 2:
+            break
+    return string
+
+
+def make_book(footnotes):
+    lines = []
+    for index in range(footnotes):
+        if index % 100 == 0:
+            lines.append("## Chapter %d" % (index // 100))
+        lines.append('Some "text" with a note[A *short* footnote.] and a comment[[Check this.]] here.')
+    return "\n".join(lines)
+
+
+def best_of(repeat, function, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        result = function(*args)
+        times.append(time.time() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--footnotes', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3, help="best of N runs")
+    parser.add_argument('--skip-rescanning', action='store_true', help="do not time the former numbering")
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    setup = Setup(setup_file_path, None)
+    setup.general.output_mode = "draft"
+    markup = make_book(args.footnotes)
+    print("Book: %.1f MB, %d footnotes, %d side comments" % (len(markup) / 1e6, args.footnotes, args.footnotes))
+
+    parse_time, document = best_of(args.repeat, parse_markup, markup)
+    print("%-24s %.3f s" % ("parse", parse_time))
+    for renderer_class in (HtmlRenderer, LatexRenderer, ReStructuredTextRenderer):
+        render_time, output = best_of(args.repeat, lambda: document.render(renderer_class(setup)))
+        print("%-24s %.3f s" % (renderer_class.__name__, render_time))
+    html = document.render(HtmlRenderer(setup))
+    assert 'sn-tufte-handout%d"' % args.footnotes in html
+
+    if not args.skip_rescanning:
+        unnumbered = re.sub(r'(sn-tufte-(?:handout|comment))\d+', r'\1', html)
+        rescanning_time, renumbered = best_of(1, lambda: rescanning_running_index(
+            rescanning_running_index(unnumbered, 'sn-tufte-handout'), 'sn-tufte-comment'))
+        assert renumbered == html
+        print("%-24s %.3f s (numbering only)" % ("rescanning running index", rescanning_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Times rendering LaTeX and HTML bodies of a large book serially and with
+chapters rendered on process pools of growing size.
+
+    python benchmarks/bench_parallel_chapters.py --copies 300 --jobs 1 2 4 8
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from documentreader import DocumentReader  # noqa: E402
+from logger import log  # noqa: E402
+from markup import parse_markup  # noqa: E402
+from parallel import ChapterDocument, create_executor  # noqa: E402
+from renderers import HtmlRenderer, LatexRenderer  # noqa: E402
+from textstory_setup import Setup  # noqa: E402
+
+test_folder_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                                "tests", "test_data", "comments-on", "src")
+
+
+def render_serial(setup, markup):
+    document = parse_markup(markup)
+    return [document.render(renderer_class(setup)) for renderer_class in (LatexRenderer, HtmlRenderer)]
+
+
+def render_parallel(setup, markup, jobs):
+    with create_executor(jobs) as executor:
+        document = ChapterDocument(markup, executor, jobs)
+        return [document.render(renderer_class(setup)) for renderer_class in (LatexRenderer, HtmlRenderer)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=300, help="copies of the test story in the book")
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--repeat', type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    setup = Setup(os.path.join(test_folder_path, "setup.toml"), None)
+    story = DocumentReader(os.path.join(test_folder_path, "textstory.txt")).get_string()
+    markup = "\n\n".join([story] * args.copies)
+    print("Book: %.1f MB, %d chapters, %d CPUs" % (len(markup) / 1e6, markup.count("\n##") + 1, os.cpu_count()))
+
+    expected = None
+    serial_time = None
+    for jobs in sorted(set(args.jobs)):
+        times = []
+        for _ in range(args.repeat):
+            start = time.time()
+            outputs = render_serial(setup, markup) if jobs == 1 else render_parallel(setup, markup, jobs)
+            times.append(time.time() - start)
+        if expected is None:
+            expected = outputs
+        assert outputs == expected, "output differs from serial run"
+        if jobs == 1:
+            serial_time = min(times)
+        speedup = " (%.2fx)" % (serial_time / min(times)) if serial_time else ""
+        print("jobs=%-3d %.3f s%s" % (jobs, min(times), speedup))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Times a clean build of a large book, a rebuild without changes and a rebuild
+after fixing a typo in one chapter, with and without the render cache.
+
+    python benchmarks/bench_render_cache.py --copies 300
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import io
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import filt0r  # noqa: E402
+from logger import log  # noqa: E402
+
+test_folder_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                                "tests", "test_data", "table-of-contents", "src")
+
+
+def timed_run(setup_file_path, input_file_path, output_folder_path, cache):
+    start = time.time()
+    filt0r.run(setup_file_path, input_file_path, output_folder_path, cache=cache)
+    return time.time() - start
+
+
+def read_outputs(output_folder_path):
+    outputs = []
+    for file_name in ("latex/latex-body.tex", "latex/latex-document.tex", "html/index.html"):
+        with open(os.path.join(output_folder_path, file_name), "rb") as f:
+            outputs.append(f.read())
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=300, help="copies of the test story in the book")
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    work_folder_path = tempfile.mkdtemp()
+    try:
+        with io.open(os.path.join(test_folder_path, "textstory.txt"), encoding="utf-8") as f:
+            story = f.read()
+        markup = "\n\n".join([story] * args.copies)
+        input_file_path = os.path.join(work_folder_path, "textstory.txt")
+        setup_file_path = os.path.join(test_folder_path, "setup.toml")
+        print("Book: %.1f MB, %d chapters" % (len(markup) / 1e6, markup.count("\n##") + 1))
+
+        for cache in (False, True):
+            output_folder_path = os.path.join(work_folder_path, "cache" if cache else "no-cache")
+            with io.open(input_file_path, "w", encoding="utf-8", newline="") as f:
+                f.write(markup)
+            clean_time = timed_run(setup_file_path, input_file_path, output_folder_path, cache)
+            unchanged_time = timed_run(setup_file_path, input_file_path, output_folder_path, cache)
+            # a typo fixed in the middle of the book
+            middle = len(markup) // 2
+            with io.open(input_file_path, "w", encoding="utf-8", newline="") as f:
+                f.write(markup[:middle] + "x" + markup[middle:])
+            typo_time = timed_run(setup_file_path, input_file_path, output_folder_path, cache)
+            print("%-10s clean %.3f s, unchanged %.3f s, typo %.3f s"
+                  % ("cache" if cache else "no cache", clean_time, unchanged_time, typo_time))
+        assert read_outputs(os.path.join(work_folder_path, "cache")) == \
+            read_outputs(os.path.join(work_folder_path, "no-cache")), "cached output differs"
+    finally:
+        shutil.rmtree(work_folder_path)
+
+
+if __name__ == "__main__":
+    main()
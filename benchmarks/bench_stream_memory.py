@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Compares the peak memory (RSS) and time of converting a large book at once
+and streamed section by section. Every conversion runs in a fresh process.
+Streamed, only the chapter list (for the table of contents) grows with the
+book.
+
+    python benchmarks/bench_stream_memory.py --copies 300 1000
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import hashlib
+import io
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+test_folder_path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                                "tests", "test_data", "pirates-in-the-sea-of-blood", "src")
+
+
+# runs in the child process, prints the peak RSS in MB
+def convert(input_file_path, output_folder_path, stream):
+    import filt0r
+    from logger import log
+    log.setLevel(logging.WARNING)
+    filt0r.run(os.path.join(test_folder_path, "setup.toml"), input_file_path, output_folder_path, cache=False,
+               stream=stream)
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
+
+
+def timed_convert(input_file_path, output_folder_path, stream):
+    start = time.time()
+    output = subprocess.check_output([sys.executable, __file__, "--convert", input_file_path, output_folder_path]
+                                     + (["--stream"] if stream else []))
+    return time.time() - start, float(output.decode("utf-8").split()[-1])
+
+
+def file_hash(file_path):
+    file_hash = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, nargs='+', default=[300, 1000], help="copies of the test story")
+    parser.add_argument('--convert', nargs=2, help=argparse.SUPPRESS)
+    parser.add_argument('--stream', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.convert:
+        convert(args.convert[0], args.convert[1], args.stream)
+        return
+
+    work_folder_path = tempfile.mkdtemp()
+    try:
+        with io.open(os.path.join(test_folder_path, "textstory.txt"), encoding="utf-8") as f:
+            story = f.read()
+        for copies in args.copies:
+            input_file_path = os.path.join(work_folder_path, "textstory.txt")
+            with io.open(input_file_path, "w", encoding="utf-8", newline="") as f:
+                for _ in range(copies):
+                    f.write(story + "\n\n")
+            print("Book: %.1f MB" % (os.path.getsize(input_file_path) / 1e6))
+            outputs = []
+            for stream in (False, True):
+                output_folder_path = os.path.join(work_folder_path, "stream" if stream else "whole")
+                duration, peak = timed_convert(input_file_path, output_folder_path, stream)
+                print("%-8s %.2f s, peak RSS %.0f MB" % ("stream" if stream else "whole", duration, peak))
+                # only hashes, this process' memory would count for the next one
+                outputs.append(file_hash(os.path.join(output_folder_path, "html", "index.html")))
+            assert outputs[0] == outputs[1], "streamed output differs"
+    finally:
+        shutil.rmtree(work_folder_path)
+
+
+if __name__ == "__main__":
+    main()
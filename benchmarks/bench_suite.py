@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Times the parts of the pipeline on a synthetic manuscript (see corpus.py):
+setup parsing, FontManager construction, parsing, each renderer and an
+end-to-end filt0r.run(), as well as the escaperoutes functions the pipeline
+no longer calls (see escaperoutes.py). Results are written as JSON
+and compared with a saved baseline, failing if a case got slower than the
+threshold allows.
+
+    python benchmarks/bench_suite.py --size 1000000 --output results.json
+    python benchmarks/bench_suite.py --baseline results.json --threshold 0.1
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+benchmarks_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(benchmarks_path))
+sys.path.insert(0, benchmarks_path)
+
+import escaperoutes  # noqa: E402
+import filt0r  # noqa: E402
+from corpus import add_corpus_arguments, corpus_options, make_manuscript  # noqa: E402
+from fonts import FontManager  # noqa: E402
+from logger import log  # noqa: E402
+from markup import parse_markup  # noqa: E402
+from paths import SETUP_FILE  # noqa: E402
+from renderers import HtmlRenderer, LatexRenderer, ReStructuredTextRenderer  # noqa: E402
+from textstory_setup import Setup  # noqa: E402
+
+
+# returns (name, function, input size) of every case
+def make_cases(markup, input_file_path, output_folder_path):
+    setup = Setup(SETUP_FILE, None)
+    document = parse_markup(markup)
+    escaped = escaperoutes.escape_all(markup)
+    cases = [
+        ("setup.parse", lambda: Setup(SETUP_FILE, None), None),
+        ("fonts.FontManager", FontManager, None),
+        ("escaperoutes.escape_all", lambda: escaperoutes.escape_all(markup), len(markup)),
+    ]
+    for output_format in ("html", "latex", "restructured_text"):
+        escape_to = getattr(escaperoutes, "escape_to_" + output_format)
+        cases.append(("escaperoutes.escape_to_" + output_format, lambda escape_to=escape_to: escape_to(escaped),
+                      len(escaped)))
+    cases.append(("markup.parse", lambda: parse_markup(markup), len(markup)))
+    for renderer_class in (HtmlRenderer, LatexRenderer, ReStructuredTextRenderer):
+        cases.append(("render." + renderer_class.__name__,
+                      lambda renderer_class=renderer_class: document.render(renderer_class(setup)), len(markup)))
+    # after the first run, unchanged assets are no longer copied
+    cases.append(("filt0r.run", lambda: filt0r.run(SETUP_FILE, input_file_path, output_folder_path, cache=False),
+                  len(markup)))
+    return cases
+
+
+def measure(function, repeat):
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times)}
+
+
+# Returns the cases slower than the baseline by more than the threshold (a
+# fraction of the baseline time) and prints the comparison.
+def compare(results, baseline, threshold):
+    if results['corpus'] != baseline['corpus']:
+        print("Warning: the baseline was measured on a different corpus: %s" % json.dumps(baseline['corpus']))
+    regressions = []
+    print("\n%-40s %10s %10s %8s" % ("case", "baseline", "now", "change"))
+    for name, result in results['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        baseline_time = baseline['cases'][name]['best']
+        change = result['best'] / baseline_time - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("%-40s %8.1fms %8.1fms %+7.1f%%%s" % (name, 1000 * baseline_time, 1000 * result['best'],
+                                                    100 * change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_corpus_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per case, after one warm-up run")
+    parser.add_argument('--cases', nargs='+', help="only run cases whose names start with one of these")
+    parser.add_argument('--output', dest='output_file_path', help="write the results to this JSON file")
+    parser.add_argument('--baseline', dest='baseline_file_path', help="compare with the results in this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="fraction a case may be slower than the baseline (default: 0.1)")
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    options = corpus_options(args)
+    markup = make_manuscript(**options)
+    work_folder_path = tempfile.mkdtemp()
+    try:
+        input_file_path = os.path.join(work_folder_path, "textstory.txt")
+        with io.open(input_file_path, "w", encoding="utf-8", newline="") as f:
+            f.write(markup)
+        results = {'created': datetime.datetime.now().isoformat(), 'python': platform.python_version(),
+                   'platform': platform.platform(), 'corpus': options, 'cases': {}}
+        print("Manuscript: %s characters, %s chapters, Python %s" % (len(markup), args.chapters,
+                                                                     results['python']))
+        print("%-40s %10s %10s %10s" % ("case", "best", "median", "MB/s"))
+        for name, function, size in make_cases(markup, input_file_path, os.path.join(work_folder_path, "output")):
+            if args.cases and not any(name.startswith(prefix) for prefix in args.cases):
+                continue
+            result = measure(function, args.repeat)
+            result['input_size'] = size
+            results['cases'][name] = result
+            throughput = "%10.1f" % (size / result['best'] / 1e6) if size else ""
+            print("%-40s %8.1fms %8.1fms %s" % (name, 1000 * result['best'], 1000 * result['median'], throughput))
+    finally:
+        shutil.rmtree(work_folder_path)
+
+    if args.output_file_path:
+        with open(args.output_file_path, "wb") as f:
+            f.write(json.dumps(results, sort_keys=True, indent=1).encode("utf-8"))
+        print("Wrote %s." % args.output_file_path)
+    if args.baseline_file_path:
+        with open(args.baseline_file_path, "rb") as f:
+            baseline = json.loads(f.read().decode("utf-8"))
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            raise SystemExit("%s cases are more than %.0f%% slower than the baseline: %s"
+                             % (len(regressions), 100 * args.threshold, ", ".join(regressions)))
+
+
+if __name__ == "__main__":
+    main()
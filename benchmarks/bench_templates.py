@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Times writing the HTML document many times (as in watch or batch mode), with
+the template read and substituted every time as before and with the cached
+template whose parts are written around the body.
+
+    python benchmarks/bench_templates.py --documents 2000
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import logging
+import os
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from documentreader import DocumentReader  # noqa: E402
+from filt0r import write_output  # noqa: E402
+from logger import log  # noqa: E402
+from paths import HTML_TEMPLATE  # noqa: E402
+from templates import load_template  # noqa: E402
+
+values = dict(license="", lang="en", locale="en_US", header_title="Title", title="Title", subtitle_tag="",
+              author="Author", meta_description="", url="", site_name="", og_image_tag="")
+
+
+# like write_output(), the file is replaced when written
+def write_substituted(file_path, body):
+    template = string.Template(DocumentReader(HTML_TEMPLATE).get_string())
+    with open(file_path + ".tmp", "wb") as f:
+        f.write(template.substitute(html_content=body, **values).encode("utf-8"))
+    os.replace(file_path + ".tmp", file_path)
+
+
+def write_parts(file_path, body):
+    write_output(file_path, load_template(HTML_TEMPLATE).parts(html_content=body, **values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=2000, help="documents written")
+    parser.add_argument('--body-size', type=int, default=20000, help="characters of every document body")
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    body = "<p>Tea and rum.</p>\n" * (args.body_size // 20)
+    work_folder_path = tempfile.mkdtemp()
+    try:
+        outputs = []
+        for name, write in (("substituted", write_substituted), ("cached parts", write_parts)):
+            file_path = os.path.join(work_folder_path, name + ".html")
+            start = time.time()
+            for _ in range(args.documents):
+                write(file_path, body)
+            print("%-12s %.3f ms per document" % (name, (time.time() - start) * 1000 / args.documents))
+            with open(file_path, "rb") as f:
+                outputs.append(f.read())
+        assert outputs[0] == outputs[1], "output differs"
+    finally:
+        shutil.rmtree(work_folder_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Generates a synthetic textstory manuscript of a given size, with tunable
+numbers of chapters and images and densities (per 10000 characters) of
+footnotes, side and inline comments, quotes, emphasis and escapes. The same
+arguments and seed always give the same manuscript.
+
+    python benchmarks/corpus.py --size 1000000 --chapters 40 --footnotes 5 -o book.txt
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import io
+import random
+
+WORDS = ("the ship sails at dawn and every sailor knows the sea is wide but the rum runs out before the wind "
+         "turns captain storm harbour island gold map night lantern rope deck wave salt cannon crew letter").split()
+ESCAPES = ("\\*", "\\--", "\\\\", "\\_", "\\#", "\\$", "\\[", "\\]", "\\\"", "&", "<", ">", "%", "~", "^")
+
+# markup kind: (opening, closing delimiter)
+SPANS = {
+    'footnotes': ("[", "]"),
+    'side_comments': ("[[", "]]"),
+    'inline_comments': ("{{", "}}"),
+    'quotes': ("\"", "\""),
+    'emphasis': ("_", "_"),
+}
+# markup kind: occurrences per 10000 characters
+DEFAULT_DENSITIES = {
+    'footnotes': 2.0,
+    'side_comments': 1.0,
+    'inline_comments': 1.0,
+    'quotes': 5.0,
+    'emphasis': 5.0,
+    'escapes': 5.0,
+}
+
+
+# Returns the manuscript. densities are given like DEFAULT_DENSITIES,
+# missing kinds have their default density.
+def make_manuscript(size=1000000, chapters=40, images=0, densities=None, seed=0):
+    rng = random.Random(seed)
+    densities = dict(DEFAULT_DENSITIES, **(densities or {}))
+    chapters = max(chapters, 1)
+    parts = []
+    for chapter in range(chapters):
+        title = " ".join(rng.choice(WORDS) for _ in range(3)).title()
+        parts.append("## Chapter %s: %s\n\n" % (chapter + 1, title))
+        # images are spread evenly over the chapters
+        for index in range(images // chapters + (chapter < images % chapters)):
+            parts.append("![Image %s.%s](img/image-%s-%s.jpg \"%s\")\n\n"
+                         % (chapter + 1, index + 1, chapter + 1, index + 1, rng.choice(WORDS)))
+        parts.append(_make_text(rng, size // chapters, densities))
+        parts.append("\n\n")
+    return "".join(parts).strip() + "\n"
+
+
+def _make_text(rng, size, densities):
+    words = []
+    length = 0
+    paragraph_end = rng.randint(300, 1500)
+    while length < size:
+        word = rng.choice(WORDS)
+        # a word with its space has about 5 characters
+        roll = rng.random() * 10000 / 5
+        for kind, (opening, closing) in SPANS.items():
+            roll -= densities[kind]
+            if roll < 0:
+                word = opening + " ".join([word] + [rng.choice(WORDS) for _ in range(rng.randint(1, 8))]) + closing
+                break
+        else:
+            if roll < densities['escapes']:
+                word = rng.choice(ESCAPES) + word
+        words.append(word)
+        length += len(word) + 1
+        if length >= paragraph_end and length < size:
+            # a paragraph or, less often, a section ends
+            words[-1] += ".\n\n" if rng.random() < 0.3 else ".\n"
+            paragraph_end = length + rng.randint(300, 1500)
+    return " ".join(words).replace("\n ", "\n")
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument('--size', type=int, default=1000000, help="characters of the manuscript")
+    parser.add_argument('--chapters', type=int, default=40, help="number of chapters")
+    parser.add_argument('--images', type=int, default=0, help="number of images")
+    for kind, density in sorted(DEFAULT_DENSITIES.items()):
+        parser.add_argument('--' + kind.replace("_", "-"), dest=kind, type=float, default=density,
+                            help="%s per 10000 characters (default: %s)" % (kind.replace("_", " "), density))
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+
+
+# returns the keyword arguments of make_manuscript given on the command line
+def corpus_options(args):
+    return dict(size=args.size, chapters=args.chapters, images=args.images, seed=args.seed,
+                densities=dict((kind, getattr(args, kind)) for kind in DEFAULT_DENSITIES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_corpus_arguments(parser)
+    parser.add_argument('-o', '--output', dest='output_file_path', required=True, help="manuscript file to write")
+    args = parser.parse_args()
+    manuscript = make_manuscript(**corpus_options(args))
+    with io.open(args.output_file_path, "w", encoding="utf-8", newline="") as f:
+        f.write(manuscript)
+    print("Wrote %s characters to %s." % (len(manuscript), args.output_file_path))
+
+
+if __name__ == "__main__":
+    main()
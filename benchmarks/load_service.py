@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+"""
+Starts the render service and sends it requests from concurrent clients,
+reporting latency percentiles, throughput and the answers by status.
+Requests cycle through a number of distinct documents, so that the response
+cache takes part as it would for a live preview.
+
+    python benchmarks/load_service.py --clients 16 --requests 2000 --documents 50
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import asyncio
+from collections import Counter
+import json
+import logging
+import os
+import sys
+import time
+
+root_path = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root_path)
+
+from logger import log  # noqa: E402
+from service import DEFAULT_QUEUE_SIZE, RenderService  # noqa: E402
+
+test_data_folder_path = os.path.join(root_path, "tests", "test_data", "pirates-in-the-sea-of-blood", "src")
+
+
+def read_file(file_name):
+    with open(os.path.join(test_data_folder_path, file_name), "rb") as f:
+        return f.read().decode("utf-8")
+
+
+async def client(port, bodies, counter, latencies, statuses):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while counter:
+            index = counter.pop()
+            body = bodies[index % len(bodies)]
+            start = time.perf_counter()
+            writer.write(("POST /render HTTP/1.1\r\nHost: localhost\r\nContent-Length: %s\r\n\r\n"
+                          % len(body)).encode("latin-1") + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    service = RenderService(port=0, workers=args.workers, queue_size=args.queue_size)
+    await service.start()
+    try:
+        markup = read_file("textstory.txt")
+        setup = read_file("setup.toml")
+        bodies = [json.dumps({'markup': markup + "\n\nVariant %s." % index, 'setup': setup,
+                              'format': args.format}).encode("utf-8") for index in range(args.documents)]
+        counter = list(range(args.requests))
+        latencies = []
+        statuses = Counter()
+        start = time.perf_counter()
+        await asyncio.gather(*(client(service.port, bodies, counter, latencies, statuses)
+                               for _ in range(args.clients)))
+        seconds = time.perf_counter() - start
+    finally:
+        await service.stop()
+
+    latencies.sort()
+    for percentile in (50, 90, 99):
+        print("p%s: %.1f ms" % (percentile, 1000 * latencies[min(len(latencies) - 1,
+                                                                 len(latencies) * percentile // 100)]))
+    print("throughput: %.0f requests/s" % (len(latencies) / seconds))
+    print("statuses: %s" % ", ".join("%s: %s" % item for item in sorted(statuses.items())))
+    print("cache hits: %s, renderings: %s, refused: %s" % (service.hits, service.misses, service.refused))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16, help="concurrent connections")
+    parser.add_argument('--requests', type=int, default=2000, help="requests in total")
+    parser.add_argument('--documents', type=int, default=50, help="distinct documents")
+    parser.add_argument('--format', default='html', choices=('html', 'latex', 'rst'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="rendering processes")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help="renderings waiting")
+    args = parser.parse_args()
+    log.setLevel(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+from logger import log
+from paths import dir_path
+
+# upper limit for the pickled entries of a cache file
+CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+CACHE_FILE = os.path.normpath(".textstory-cache/render-cache.pickle")
+
+# modules whose code determines the rendered output
+_code_files = ("escaperoutes.py", "markup.py", "parallel.py", "renderers.py")
+# modules whose code determines the outputs of a build as a whole (templates, assets, images, ...)
+_build_code_files = _code_files + ("assets.py", "cache.py", "documentreader.py", "filt0r.py", "fonts.py", "images.py",
+                                   "paths.py", "publish.py", "stream.py", "templates.py", "textstory_setup.py")
+
+
+# hash of the code determining the rendered output (of the given modules)
+def code_version(file_names=_code_files):
+    version = hashlib.sha1()
+    for file_name in file_names:
+        with open(os.path.join(dir_path, file_name), "rb") as f:
+            version.update(f.read())
+    return version.hexdigest()
+
+
+# hash of the code determining the outputs of a build
+def build_code_version():
+    return code_version(_build_code_files)
+
+
+# returns a hash of all setup values (changed in memory or not)
+def setup_fingerprint(setup):
+    values = [setup.setup_toml] + [dict((name, value) for name, value in vars(data).items() if name != 'setup_toml')
+                                   for data in (setup.general, setup.html, setup.latex)]
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class RenderCache(object):
+    """
+    Persistent cache for rendering results (see parallel.ChapterDocument),
+    kept in a single file. Entries are keyed by a hash of everything the
+    result depends on, including the code version, so they never need to be
+    invalidated. The least recently used entries are evicted beyond max_size.
+    """
+    def __init__(self, file_path, max_size=CACHE_MAX_SIZE):
+        self.file_path = file_path
+        self.max_size = max_size
+        self.code_version = code_version()
+        self.hits = 0
+        self.misses = 0
+        # key: pickled value, least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+        self._modified = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.file_path):
+            return
+        try:
+            with open(self.file_path, "rb") as f:
+                code_version, entries = pickle.load(f)
+        except Exception as e:
+            log.warning("Ignoring unreadable render cache %s: %s", self.file_path, type(e).__name__ + str(e.args))
+            return
+        if code_version != self.code_version:
+            log.info("Render cache was created by other code, starting empty.")
+            return
+        self._entries = entries
+        self._size = sum(len(value) for value in entries.values())
+
+    def key(self, *parts):
+        key = json.dumps([self.code_version] + list(parts), sort_keys=True)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return pickle.loads(value)
+
+    def put(self, key, value):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_size:
+                self._size -= len(self._entries.popitem(last=False)[1])
+            self._modified = True
+
+    def save(self):
+        with self._lock:
+            if not self._modified:
+                return
+            folder_path = os.path.dirname(self.file_path)
+            if folder_path and not os.path.exists(folder_path):
+                os.makedirs(folder_path)
+            temporary_file_path = self.file_path + ".tmp"
+            with open(temporary_file_path, "wb") as f:
+                pickle.dump((self.code_version, self._entries), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file_path, self.file_path)
+            self._modified = False
+        log.info("Saved render cache: %s entries, %s hits, %s misses.", len(self._entries), self.hits, self.misses)
@@ -1,116 +1,145 @@
-# -*- coding: utf-8 -*-
-# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
-
-from __future__ import unicode_literals
-
-
-# returns the string with all special expressions replaced by temporary escapes
-def escape_all(string):
-    escaped_string = string
-    for name, escape_route in escape_routes.items():
-        escaped_string = escaped_string.replace(escape_route.original, escape_route.temporary)
-    return escaped_string
-
-
-# returns the string with the named special expression replaced by temporary escapes
-def escape(string, escape_route_name):
-    escape_route = escape_routes[escape_route_name]
-    return string.replace(escape_route.original, escape_route.temporary)
-
-
-# returns the string with temporary escapes replaced by html escapes
-def escape_to_html(string):
-    escaped_string = string
-    for name, escape_route in escape_routes.items():
-        escaped_string = escaped_string.replace(escape_route.temporary, escape_route.html)
-    return escaped_string
-
-
-#  returns the string with temporary escapes replaced by latex escapes
-def escape_to_latex(string):
-    escaped_string = string
-    for name, escape_route in escape_routes.items():
-        escaped_string = escaped_string.replace(escape_route.temporary, escape_route.latex)
-    return escaped_string
-
-
-#  returns the string with temporary escapes replaced by reStructuredText escapes
-def escape_to_restructured_text(string):
-    escaped_string = string
-    for name, escape_route in escape_routes.items():
-        escaped_string = escaped_string.replace(escape_route.temporary, escape_route.restructured_text)
-    return escaped_string
-
-
-# returns the temporary escape with the given name
-def get_escape(name):
-    return escape_routes[name].temporary
-
-
-# structure for defining how to escape and restore special characters
-class EscapeRoute(object):
-    def __init__(self, original, temporary, html, latex, restructured_text):
-        self.original = original
-        self.temporary = temporary
-        self.html = html
-        self.latex = latex
-        self.restructured_text = restructured_text
-
-
-r"""
-list of all allowed EscapeRoutes (\ needs to be escaped in python too, so theres a lot of \)
-
-HTML:
-& becomes &amp; (does not need to be escaped in original document)
-< becomes &lt; (does not need to be escaped in original document)
-> becomes &gt; (does not need to be escaped in original document)
-
-LATEX:
-& becomes \& (does not need to be escaped in original document)
-% becomes \% (does not need to be escaped in original document)
-$ becomes \$
-# becomes \#
-_ becomes \_
-{ becomes \{
-} becomes \}
-~ becomes \textasciitilde (does not need to be escaped in original document)
-^ becomes \textasciicircum (does not need to be escaped in original document)
-\ becomes \textbackslash
-
-TEXTSTORY MARKUP:
-\   backslash
-*   asterisk
-_   underscore
-{}  curly braces
-()  normal brackets
-[]  square brackets
-#   hash mark
-"   doublequote
-!   exclamation mark (only needs to be escaped when followed by '[')
---  double minus
-
-"""
-escape_routes = {
-    "\\": EscapeRoute('\\\\', '$escapeChar$', '\\', '\\textbackslash{}', '\\\\'),
-    "&": EscapeRoute('&', '$amp$', '&amp;', '\\&', '&'),
-    "<": EscapeRoute('<', '$lt$', '&lt;', '<', '\\<'),
-    ">": EscapeRoute('>', '$gt$', '&gt;', '>', '\\>'),
-    "%": EscapeRoute('%', '$percent$', '%', '\\% ', '%'),
-    "$": EscapeRoute('\\$', '$dollar$', '$', '\\$ ', '$'),
-    "#": EscapeRoute('\\#', '$hash$', '#', '\\# ', '#'),
-    "_": EscapeRoute('\\_', '$underscore$', '_', '\\_ ', '_'),
-    "{": EscapeRoute('\\{', '$curlyBracketOpen$', '{', '\\{ ', '\\{'),
-    "}": EscapeRoute('\\}', '$curlyBracketClose$', '}', '\\} ', '\\}'),
-    "(": EscapeRoute('\\(', '$bracketOpen$', '(', '(', '\\('),
-    ")": EscapeRoute('\\)', '$bracketClose$', ')', ')', '\\)'),
-    "[": EscapeRoute('\\[', '$squareBracketOpen$', '[', '[', '\\['),
-    "]": EscapeRoute('\\]', '$squareBracketClose$', ']', ']', '\\]'),
-    "~": EscapeRoute('~', '$tilde$', '~', '\\textasciitilde{}', '~'),
-    "^": EscapeRoute('^', '$circumflex$', '^', '\\textasciicircum{}', '^'),
-    "*": EscapeRoute('\\*', '$asterisk$', '*', '*', '\\*'),
-    "--": EscapeRoute('\\--', '$hyphen$', '--', '\\verb|--|', '--'),
-    '"': EscapeRoute('\\"', '$doubleQuote$', '&quot;', '"{}', '\\"'),
-    "'": EscapeRoute("\\'", '$singleQuote$', "'", "'", "\\'"),
-    "!": EscapeRoute('\\!', '$exclamation$', '!', '!', '!'),
-    # "": EscapeRoute('\\', '', '', ''),
-}
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+import re
+
+
+# The conversion does not use the functions escaping and restoring whole
+# strings: the markup parser (see markup.py) reads escapes with
+# escape_originals and the renderers write escape_routes. They are kept for
+# other callers.
+
+
+# returns the string with all special expressions replaced by temporary escapes
+def escape_all(string):
+    originals = _plain_originals
+    if "\\" in string:
+        # only the routes found in one scan need a replacement pass
+        found = set(_backslash_pattern.findall(string))
+        originals = [original for original in _backslash_originals if original in found] + originals
+    for original in originals:
+        if original in string:
+            string = string.replace(original, _temporaries[original])
+    return string
+
+
+# returns the string with the named special expression replaced by temporary escapes
+def escape(string, escape_route_name):
+    escape_route = escape_routes[escape_route_name]
+    return string.replace(escape_route.original, escape_route.temporary)
+
+
+# returns the string with temporary escapes replaced by html escapes
+def escape_to_html(string):
+    return _restore(string, _html_escapes)
+
+
+#  returns the string with temporary escapes replaced by latex escapes
+def escape_to_latex(string):
+    return _restore(string, _latex_escapes)
+
+
+#  returns the string with temporary escapes replaced by reStructuredText escapes
+def escape_to_restructured_text(string):
+    return _restore(string, _restructured_text_escapes)
+
+
+def _restore(string, escapes):
+    for temporary, escaped in escapes:
+        if temporary in string:
+            string = string.replace(temporary, escaped)
+    return string
+
+
+# returns the temporary escape with the given name
+def get_escape(name):
+    return escape_routes[name].temporary
+
+
+# structure for defining how to escape and restore special characters
+class EscapeRoute(object):
+    def __init__(self, original, html, latex, restructured_text):
+        self.original = original
+        # set below, once all routes are known
+        self.temporary = None
+        self.html = html
+        self.latex = latex
+        self.restructured_text = restructured_text
+
+
+r"""
+list of all allowed EscapeRoutes (\ needs to be escaped in python too, so theres a lot of \)
+
+HTML:
+& becomes &amp; (does not need to be escaped in original document)
+< becomes &lt; (does not need to be escaped in original document)
+> becomes &gt; (does not need to be escaped in original document)
+
+LATEX:
+& becomes \& (does not need to be escaped in original document)
+% becomes \% (does not need to be escaped in original document)
+$ becomes \$
+# becomes \#
+_ becomes \_
+{ becomes \{
+} becomes \}
+~ becomes \textasciitilde (does not need to be escaped in original document)
+^ becomes \textasciicircum (does not need to be escaped in original document)
+\ becomes \textbackslash
+
+TEXTSTORY MARKUP:
+\   backslash
+*   asterisk
+_   underscore
+{}  curly braces
+()  normal brackets
+[]  square brackets
+#   hash mark
+"   doublequote
+!   exclamation mark (only needs to be escaped when followed by '[')
+--  double minus
+
+"""
+escape_routes = {
+    "\\": EscapeRoute('\\\\', '\\', '\\textbackslash{}', '\\\\'),
+    "&": EscapeRoute('&', '&amp;', '\\&', '&'),
+    "<": EscapeRoute('<', '&lt;', '<', '\\<'),
+    ">": EscapeRoute('>', '&gt;', '>', '\\>'),
+    "%": EscapeRoute('%', '%', '\\% ', '%'),
+    "$": EscapeRoute('\\$', '$', '\\$ ', '$'),
+    "#": EscapeRoute('\\#', '#', '\\# ', '#'),
+    "_": EscapeRoute('\\_', '_', '\\_ ', '_'),
+    "{": EscapeRoute('\\{', '{', '\\{ ', '\\{'),
+    "}": EscapeRoute('\\}', '}', '\\} ', '\\}'),
+    "(": EscapeRoute('\\(', '(', '(', '\\('),
+    ")": EscapeRoute('\\)', ')', ')', '\\)'),
+    "[": EscapeRoute('\\[', '[', '[', '\\['),
+    "]": EscapeRoute('\\]', ']', ']', '\\]'),
+    "~": EscapeRoute('~', '~', '\\textasciitilde{}', '~'),
+    "^": EscapeRoute('^', '^', '\\textasciicircum{}', '^'),
+    "*": EscapeRoute('\\*', '*', '*', '\\*'),
+    "--": EscapeRoute('\\--', '--', '\\verb|--|', '--'),
+    '"': EscapeRoute('\\"', '&quot;', '"{}', '\\"'),
+    "'": EscapeRoute("\\'", "'", "'", "\\'"),
+    "!": EscapeRoute('\\!', '!', '!', '!'),
+    # "": EscapeRoute('\\', '', '', ''),
+}
+
+# Temporary escapes are single characters of the Unicode private use area.
+# They cannot be mistaken for text or for each other, so every route is
+# replaced in one str.replace pass, which is skipped if the route is absent.
+for index, escape_route in enumerate(escape_routes.values()):
+    escape_route.temporary = chr(0xE000 + index)
+
+# longest originals first, so that e.g. \-- is not read as \ followed by --
+escape_originals = sorted((escape_route.original for escape_route in escape_routes.values()), key=len, reverse=True)
+_temporaries = dict((escape_route.original, escape_route.temporary) for escape_route in escape_routes.values())
+# escaped backslashes first, so that e.g. \\* is a backslash and an asterisk
+_backslash_originals = sorted((original for original in escape_originals if original.startswith("\\")),
+                              key=lambda original: original != "\\\\")
+_backslash_pattern = re.compile('|'.join(re.escape(original) for original in _backslash_originals))
+_plain_originals = [original for original in escape_originals if not original.startswith("\\")]
+_html_escapes = [(route.temporary, route.html) for route in escape_routes.values()]
+_latex_escapes = [(route.temporary, route.latex) for route in escape_routes.values()]
+_restructured_text_escapes = [(route.temporary, route.restructured_text) for route in escape_routes.values()]
@@ -3,40 +3,150 @@
 
 
 from __future__ import unicode_literals
+import argparse
+import io
 import os
+import re
 import sys
-from distutils import dir_util, file_util
-import string
 
+from assets import HARDLINK, REFLINK, list_files, sync_assets
+from cache import CACHE_FILE, RenderCache
 from documentreader import DocumentReader
-from filters import get_filters, get_latex_chapters
+from images import PRINT_IMAGE_CACHE_PATH, WEB_IMAGE_CACHE_PATH, create_print_images, create_web_images, \
+    find_images
+from latexbuild import build_pdf
 from logger import log
+from markup import Document, parse_markup
+from parallel import ChapterDocument, create_executor, run_stages, split_chapters
 from paths import dir_path, SETUP_FILE, LATEX_TEMPLATE, HTML_TEMPLATE, HTML_LICENSE, OUTFILE_LATEX_BODY, \
-    OUTFILE_LATEX_DOC, OUTFILE_HTML, OUTFILE_RESTRUCTURED_TEXT, PRELIMINARIES_PATH, APPENDIX_PATH
+    OUTFILE_LATEX_DOC, OUTFILE_HTML, OUTFILE_RESTRUCTURED_TEXT, OUTFILE_PROFILE, PRELIMINARIES_PATH, APPENDIX_PATH, \
+    LATEX_CHAPTERS_PATH, OUTFILE_LATEX_PREAMBLE, HTML_PUBLISH_PATH
+from publish import FONT_CACHE_PATH, publish_html
+from renderers import HtmlRenderer, LatexRenderer, ReStructuredTextRenderer
+from runprofile import RunProfile, count_nodes, measure
+from stream import StreamedDocument, read_sections
+from templates import load_template, load_text
 from textstory_setup import Setup
 
+# outputs of a build
+ASSETS = 'assets'
+LATEX = 'latex'
+HTML = 'html'
+RESTRUCTURED_TEXT = 'restructured_text'
+OUTPUTS = (ASSETS, LATEX, HTML)
+# formats rendered in memory by render(), besides LATEX, HTML and RESTRUCTURED_TEXT
+LATEX_BODY = 'latex_body'
+# stages of a run profile, besides the outputs
+DOCUMENT = 'document'
+CACHE = 'cache'
+# characters encoded and written at once
+WRITE_CHUNK_SIZE = 64 * 1024
+# chapters typeset from a LaTeX body split into chapter files, besides a list of chapter numbers
+ALL_CHAPTERS = 'all'
+CHANGED_CHAPTERS = 'changed'
+# The LaTeX template up to this line depends on the font, geometry, document
+# type and todonotes config only. It is written to a file of its own as well.
+LATEX_STATIC_PREAMBLE_END = "\n%% some handy commands\n"
+
+_include_only_pattern = re.compile(r'^\\includeonly\{.*\}$', re.MULTILINE)
+_tag_pattern = re.compile(r'<[^>]*>')
+
 
 def main():
+    if sys.argv[1:2] == ['batch']:
+        # filt0r.py batch <folder> converts many projects with this module
+        from batch import main as batch_main
+        batch_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['serve']:
+        # filt0r.py serve renders previews over HTTP with this module
+        from service import main as service_main
+        service_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['pdf']:
+        # filt0r.py pdf [<latex folder>] compiles a converted document
+        from latexbuild import main as latex_build_main
+        latex_build_main(sys.argv[2:])
+        return
     # checking command line args
-    
+    parser = argparse.ArgumentParser(description="Convert a textstory document to LaTeX and HTML.")
     # required arg 1: input document
-    if len(sys.argv) < 2:
-        sys.exit("First argument must be path to document source.")
-    infile_path = sys.argv[1]
-    
+    parser.add_argument('input_file_path', help="path to document source")
     # optional arg 2: setup file path (otherwise using default)
-    setup_file_path = SETUP_FILE
-    if len(sys.argv) > 2:
-        setup_file_path = sys.argv[2]
+    parser.add_argument('setup_file_path', nargs='?', default=SETUP_FILE, help="path to setup file")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of processes rendering formats and chapters in parallel (default: 1)")
+    parser.add_argument('--rst', action='store_true', help="also write reStructuredText")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="render all chapters again instead of reusing unchanged ones")
+    parser.add_argument('--stream', action='store_true',
+                        help="read, convert and write very large documents section by section with bounded memory "
+                             "(without cache and parallel chapters)")
+    parser.add_argument('--link-assets', choices=(HARDLINK, REFLINK),
+                        help="hard link or reflink assets (images, CSS, ...) into the output folder instead of "
+                             "copying them, where possible")
+    parser.add_argument('--watch', action='store_true',
+                        help="build again whenever the document, setup or templates change")
+    parser.add_argument('--port', type=int, default=8000,
+                        help="port serving the HTML in watch mode, open pages reload after every build (default: 8000)")
+    parser.add_argument('--latex-chapters', nargs='?', const=ALL_CHAPTERS, type=parse_chapters, metavar='CHAPTERS',
+                        help="write every chapter of the LaTeX body to a file of its own and only typeset the given "
+                             "chapters: %s (default), %s (since the last conversion) or numbers such as 3,5-7"
+                             % (ALL_CHAPTERS, CHANGED_CHAPTERS))
+    parser.add_argument('--html-chapters', action='store_true',
+                        help="write every chapter to an HTML page of its own, linked from a table of contents in "
+                             "index.html")
+    parser.add_argument('--publish-html', action='store_true',
+                        help="also write the HTML output minified, with content hashes in the names of stylesheets, "
+                             "fonts and images and precompressed (.gz, .br) to %s, to be served with far-future "
+                             "cache headers" % HTML_PUBLISH_PATH)
+    parser.add_argument('--pdf', action='store_true',
+                        help="compile the LaTeX document to PDF with lualatex, as often as the table of contents "
+                             "needs (skipped if the LaTeX files did not change)")
+    parser.add_argument('--profile', action='store_true',
+                        help="write the time, input and output size of every step to %s in the output folder"
+                             % OUTFILE_PROFILE)
+    args = parser.parse_args()
+    if args.stream and args.latex_chapters:
+        parser.error("--latex-chapters cannot split a streamed document")
+    if args.stream and args.html_chapters:
+        parser.error("--html-chapters cannot split a streamed document")
+    if args.watch:
+        # watch builds with this module
+        from watch import Watcher
+        Watcher(args.setup_file_path, args.input_file_path, jobs=args.jobs, restructured_text=args.rst,
+                cache=args.cache, port=args.port, link_assets=args.link_assets, stream=args.stream,
+                profile=args.profile, pdf=args.pdf, latex_chapters=args.latex_chapters,
+                html_chapters=args.html_chapters, publish=args.publish_html).run()
+        return
     try:
-        run(setup_file_path, infile_path)
+        run(args.setup_file_path, args.input_file_path, jobs=args.jobs, restructured_text=args.rst,
+            cache=args.cache, stream=args.stream, link_assets=args.link_assets, profile=args.profile, pdf=args.pdf,
+            latex_chapters=args.latex_chapters, html_chapters=args.html_chapters, publish=args.publish_html)
     except SystemExit as e:
         log.info(str(e.args[0]))
         log.info("Abort.")
         return
 
 
-def run(setup_file_path, input_file_path, output_folder_path=None):
+# returns ALL_CHAPTERS, CHANGED_CHAPTERS or the list of chapter numbers given like 3,5-7
+def parse_chapters(chapters):
+    if chapters in (ALL_CHAPTERS, CHANGED_CHAPTERS):
+        return chapters
+    numbers = []
+    try:
+        for chapter_range in chapters.split(","):
+            first, _, last = chapter_range.partition("-")
+            numbers.extend(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected %s, %s or chapter numbers such as 3,5-7, not %s"
+                                         % (ALL_CHAPTERS, CHANGED_CHAPTERS, chapters))
+    return numbers
+
+
+def run(setup_file_path, input_file_path, output_folder_path=None, jobs=1, restructured_text=False, cache=True,
+        stream=False, link_assets=None, profile=False, pdf=False, latex_chapters=None, html_chapters=False,
+        publish=False):
     log.info("++++++++++ textstory-to-beautiful-latex-html ++++++++++")
 
     # Setup
@@ -44,22 +154,80 @@ def run(setup_file_path, input_file_path, output_folder_path=None):
     setup = Setup(setup_file_path, input_file_path, output_folder_path)
     log.info("Done with setup.")
 
-    run_with_setup(setup)
-
+    run_with_setup(setup, jobs, restructured_text, cache, stream, link_assets, profile, pdf, latex_chapters,
+                   html_chapters, publish)
 
-def run_with_setup(setup):
-    input_markup = DocumentReader(setup.input_file_path).get_string()
-
-    filters = get_filters(setup)
-
-    out_folder = prepare_out_folder(setup)
 
+# Returns whether the outputs were created. With profile, a report of the
+# steps of the build is written to the output folder. With pdf, the LaTeX
+# document is compiled as well. For latex_chapters, see LatexGenerator, for
+# html_chapters, see HtmlGenerator. With publish, the HTML folder is also
+# written ready to be served (see publish.publish_html).
+def run_with_setup(setup, jobs=1, restructured_text=False, cache=True, stream=False, link_assets=None,
+                   profile=False, pdf=False, latex_chapters=None, html_chapters=False, publish=False):
     if not prepare_out_folder(setup):
-        return
+        return False
+
+    run_profile = RunProfile() if profile else None
+    outputs = OUTPUTS + (RESTRUCTURED_TEXT,) if restructured_text else OUTPUTS
+    render_cache = None
+    executor = None
+    if stream:
+        # formats are still rendered concurrently, but each one in a single stream
+        log.info("Streaming the document section by section.")
+        jobs = 1
+    else:
+        if cache:
+            # chapters that did not change since the last run are not rendered again
+            with measure(run_profile, CACHE, 'load'):
+                render_cache = RenderCache(os.path.join(setup.output_folder_path, CACHE_FILE))
+        if jobs > 1:
+            log.info("Rendering with %s processes.", jobs)
+            executor = create_executor(jobs)
+    try:
+        if not build(setup, outputs, render_cache, executor, jobs, stream, link_assets, run_profile, latex_chapters,
+                     html_chapters, publish):
+            return False
+        if pdf:
+            build_pdf(os.path.join(setup.output_folder_path, 'latex'), profile=run_profile)
+        return True
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if run_profile is not None:
+            run_profile.write(os.path.join(setup.output_folder_path, OUTFILE_PROFILE))
+            log.info("Run profile:\n%s", run_profile.summary())
+
+
+# Creates the given outputs (ASSETS, LATEX, HTML, RESTRUCTURED_TEXT) in the
+# prepared output folder of the setup. Returns whether that succeeded. The
+# steps are recorded in the profile (a RunProfile), if given.
+def build(setup, outputs, render_cache=None, executor=None, jobs=1, stream=False, link_assets=None, profile=None,
+          latex_chapters=None, html_chapters=False, publish=False):
+    if stream:
+        # read and parsed while rendering
+        document = StreamedDocument(setup.input_file_path)
+    else:
+        with measure(profile, DOCUMENT, 'read') as record:
+            input_markup = DocumentReader(setup.input_file_path).get_string()
+            record['output_size'] = len(input_markup)
+        with measure(profile, DOCUMENT, 'parse', len(input_markup)) as record:
+            if executor is None and render_cache is None:
+                document = parse_markup(input_markup)
+            else:
+                # parsed chunk by chunk while rendering
+                document = ChapterDocument(input_markup, executor, jobs, render_cache)
+        if profile is not None:
+            if isinstance(document, ChapterDocument):
+                record['counts'] = {'chunks': len(document.chunks)}
+            else:
+                record['counts'] = count_nodes(document.children)
 
     # create directory structure
     latex_output_path = os.path.join(setup.output_folder_path, 'latex')
     html_output_path = os.path.join(setup.output_folder_path, 'html')
+    restructured_text_output_path = os.path.dirname(os.path.join(setup.output_folder_path,
+                                                                 OUTFILE_RESTRUCTURED_TEXT))
     try:
         if not os.path.exists(latex_output_path):
             os.makedirs(latex_output_path)
@@ -71,37 +239,76 @@ def run_with_setup(setup):
         #     os.makedirs(appendixPath)
         if not os.path.exists(html_output_path):
             os.makedirs(html_output_path)
+        if RESTRUCTURED_TEXT in outputs and not os.path.exists(restructured_text_output_path):
+            os.makedirs(restructured_text_output_path)
     except Exception as e:
         log.info("Failed creating output subdirectories: " + type(e).__name__ + str(e.args))
         log.info("Abort.")
-        return
+        return False
 
+    # set outfile paths
+    outfile_latex_doc = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_LATEX_DOC))
+    outfile_latex_body = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_LATEX_BODY))
+    outfile_latex_preamble = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_LATEX_PREAMBLE))
+    outfile_html = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_HTML))
+    outfile_restructured_text = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_RESTRUCTURED_TEXT))
+
+    # The stages are independent and write distinct files, so they run
+    # concurrently. Rendering itself runs on the process pool, if there is one.
+    stages = {
+        ASSETS: lambda: copy_assets(setup.output_folder_path, latex_output_path, html_output_path, link_assets,
+                                    profile),
+        LATEX: lambda: create_latex(setup, document, outfile_latex_doc, outfile_latex_body, profile, latex_chapters,
+                                    outfile_latex_preamble),
+        HTML: lambda: create_html(setup, document, outfile_html, profile, html_chapters),
+        RESTRUCTURED_TEXT: lambda: create_restructured_text_file(setup, document, outfile_restructured_text,
+                                                                 profile),
+    }
+    if HTML in outputs or LATEX in outputs:
+        # the documents are rendered with the web and print versions of the images, so they are made first
+        image_paths = find_images(read_sections(setup.input_file_path) if stream else [input_markup])
+        create_images(setup, image_paths, outputs, html_output_path, latex_output_path, executor, profile)
+    run_stages([stages[output] for output in outputs], executor)
+    if publish and HTML in outputs:
+        # pages and assets are complete now (assets not built again are from an earlier build)
+        with measure(profile, HTML, 'publish') as record:
+            result = publish_html(html_output_path, os.path.join(setup.output_folder_path, HTML_PUBLISH_PATH),
+                                  font_cache_folder_path=os.path.join(setup.output_folder_path, FONT_CACHE_PATH))
+            record['input_size'] = result.source_bytes
+            record['output_size'] = result.published_bytes
+            record['counts'] = {'written': result.written_files, 'unchanged': result.unchanged_files}
+    if render_cache is not None:
+        with measure(profile, CACHE, 'save') as record:
+            render_cache.save()
+            record['counts'] = {'hits': render_cache.hits, 'misses': render_cache.misses}
+    return True
+
+
+def copy_assets(output_folder_path, latex_output_path, html_output_path, link=None, profile=None):
+    files = []
     # copy required files from latex template folders
     appendix_source_path = os.path.join(dir_path, 'latex', APPENDIX_PATH)
     if not os.path.exists(appendix_source_path):
         os.makedirs(appendix_source_path)
-    dir_util.copy_tree(appendix_source_path,
-                       os.path.join(latex_output_path, APPENDIX_PATH), update=1)
+    files += list_files(appendix_source_path, os.path.join(latex_output_path, APPENDIX_PATH))
     # TODO appendix files from config?
     preliminaries_source_path = os.path.join(dir_path, 'latex', PRELIMINARIES_PATH)
     if not os.path.exists(preliminaries_source_path):
         os.makedirs(preliminaries_source_path)
-    dir_util.copy_tree(preliminaries_source_path,
-                       os.path.join(latex_output_path, PRELIMINARIES_PATH), update=1)
+    files += list_files(preliminaries_source_path, os.path.join(latex_output_path, PRELIMINARIES_PATH))
     # TODO preliminary files from config?
-    dir_util.copy_tree(os.path.join(dir_path, 'latex', 'img'),
-                       os.path.join(latex_output_path, 'img'), update=1)
+    files += list_files(os.path.join(dir_path, 'latex', 'img'), os.path.join(latex_output_path, 'img'))
     latex_files = [
         'build.bash',
         'build.bat',
         'license.tex'  # TODO get license from config, allow not using license
     ]
     for file_name in latex_files:
-        copy_file(file_name, 'latex', latex_output_path)
+        files += list_files(os.path.join(dir_path, 'latex', file_name), os.path.join(latex_output_path, file_name))
 
     # copy required files from html template folders
-    dir_util.copy_tree(os.path.join(dir_path, 'html', 'css'), os.path.join(html_output_path, 'css'), update=1)
-    dir_util.copy_tree(os.path.join(dir_path, 'html', 'img'), os.path.join(html_output_path, 'img'), update=1)
+    files += list_files(os.path.join(dir_path, 'html', 'css'), os.path.join(html_output_path, 'css'))
+    files += list_files(os.path.join(dir_path, 'html', 'img'), os.path.join(html_output_path, 'img'))
     html_files = [  # TODO get license from config, allow not using license
         'apple-touch-icon.png',
         'browserconfig.xml',
@@ -111,27 +318,61 @@ def run_with_setup(setup):
         'tile-wide.png'
     ]
     for file_name in html_files:
-        copy_file(file_name, 'html', html_output_path)
-
-    # set outfile paths
-    outfile_latex_doc = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_LATEX_DOC))
-    outfile_latex_body = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_LATEX_BODY))
-    outfile_html = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_HTML))
-    
-    # Create LaTeX
+        files += list_files(os.path.join(dir_path, 'html', file_name), os.path.join(html_output_path, file_name))
+
+    # only files changed since the last run are copied
+    with measure(profile, ASSETS, 'sync') as record:
+        result = sync_assets(files, output_folder_path, link)
+        record['input_size'] = result.copied_bytes + result.skipped_bytes
+        record['output_size'] = result.copied_bytes
+        record['counts'] = {'copied': result.copied_files, 'skipped': result.skipped_files}
+
+
+# Makes the web variants (for HTML) and print versions (for LATEX) of the
+# images and has the documents refer to them (see images.create_web_images
+# and images.create_print_images).
+def create_images(setup, image_paths, outputs, html_output_path, latex_output_path, executor=None, profile=None):
+    source_folder_path = os.path.dirname(setup.input_file_path)
+    if HTML in outputs:
+        with measure(profile, HTML, 'images') as record:
+            result = create_web_images(image_paths, source_folder_path, html_output_path,
+                                       os.path.join(setup.output_folder_path, WEB_IMAGE_CACHE_PATH), executor)
+            setup.html.responsive_images = result.images
+            record['counts'] = {'images': len(result.images), 'resized': result.made_files,
+                                'cached': result.cached_files}
+    if LATEX in outputs:
+        with measure(profile, LATEX, 'images') as record:
+            result = create_print_images(image_paths, source_folder_path, latex_output_path,
+                                         os.path.join(setup.output_folder_path, PRINT_IMAGE_CACHE_PATH),
+                                         setup.latex.paper_size, setup.latex.image_dpi, executor)
+            setup.latex.print_images = result.images
+            record['counts'] = {'images': len(result.images), 'resized': result.made_files,
+                                'cached': result.cached_files}
+
+
+def create_latex(setup, document, outfile_latex_doc, outfile_latex_body, profile=None, latex_chapters=None,
+                 outfile_latex_preamble=None):
     log.info("***************** Creating LaTeX *****************")
-    latex_generator = LatexGenerator(setup, input_markup, filters,
-                                     LATEX_TEMPLATE, outfile_latex_doc, outfile_latex_body)
+    latex_generator = LatexGenerator(setup, document, LATEX_TEMPLATE, outfile_latex_doc, outfile_latex_body,
+                                     profile, latex_chapters, outfile_latex_preamble)
     latex_generator.create_output()
     log.info("Done creating LaTeX.")
-    
-    # Create HTML
+
+
+def create_html(setup, document, outfile_html, profile=None, html_chapters=False):
     log.info("***************** Creating HTML *****************")
-    html_generator = HtmlGenerator(setup, input_markup, filters, HTML_TEMPLATE, HTML_LICENSE, outfile_html)
+    html_generator = HtmlGenerator(setup, document, HTML_TEMPLATE, HTML_LICENSE, outfile_html, profile, html_chapters)
     html_generator.create_output()
     log.info("Done creating HTML.")
 
 
+def create_restructured_text_file(setup, document, outfile_restructured_text, profile=None):
+    log.info("***************** Creating reStructuredText *****************")
+    restructured_text_generator = ReStructuredTextGenerator(setup, document, outfile_restructured_text, profile)
+    restructured_text_generator.create_output()
+    log.info("Done creating reStructuredText.")
+
+
 def create_restructured_text(setup_file_path, input_file_path, output_folder_path=None):
     log.info("++++++++++ textstory-to-beautiful-latex-html ++++++++++")
 
@@ -140,23 +381,62 @@ def create_restructured_text(setup_file_path, input_file_path, output_folder_pat
     setup = Setup(setup_file_path, input_file_path, output_folder_path)
     log.info("Done with setup.")
 
-    # run_with_setup(setup)
     input_markup = DocumentReader(input_file_path).get_string()
-
-    filters = get_filters(setup)
-
-#     if not prepare_out_folder(setup):
-#         return
-
-    # set outfile path
-    # outfile_restructured_text = os.path.normpath(os.path.join(setup.output_folder_path, OUTFILE_RESTRUCTURED_TEXT))
-
-    # Create reStructuredText
-    log.info("***************** Creating reStructuredText *****************")
-    restructured_text_generator = ReStructuredTextGenerator(setup, input_markup, filters, None)
-    # restructured_text_generator.create_output()
-    log.info("Done creating reStructuredText.")
-    return restructured_text_generator.output_markup
+    return render(input_markup, setup, (RESTRUCTURED_TEXT,))[RESTRUCTURED_TEXT]
+
+
+# Renders markup to the given formats (HTML, LATEX, LATEX_BODY,
+# RESTRUCTURED_TEXT) in memory, without creating folders or writing files.
+# setup is a Setup or the dict of a parsed setup TOML. Returns a dict of
+# format: document, encoded if an encoding is given. The steps are recorded
+# in the profile (a RunProfile), if given.
+def render(markup, setup, formats=(HTML, LATEX), encoding=None, profile=None):
+    unknown_formats = set(formats) - {HTML, LATEX, LATEX_BODY, RESTRUCTURED_TEXT}
+    if unknown_formats:
+        raise ValueError("Unknown formats: %s" % ", ".join(sorted(unknown_formats)))
+    if not isinstance(setup, Setup):
+        setup = Setup(None, None, setup_toml=setup)
+    markup = markup.strip()
+    with measure(profile, DOCUMENT, 'parse', len(markup)) as record:
+        document = parse_markup(markup)
+    if profile is not None:
+        record['counts'] = count_nodes(document.children)
+
+    outputs = {}
+    if HTML in formats:
+        outputs[HTML] = ''.join(HtmlGenerator(setup, document, HTML_TEMPLATE, HTML_LICENSE, None, profile).html_doc)
+    if LATEX in formats or LATEX_BODY in formats:
+        latex_generator = LatexGenerator(setup, document, LATEX_TEMPLATE, None, None, profile)
+        outputs[LATEX] = ''.join(latex_generator.latex_doc)
+        outputs[LATEX_BODY] = latex_generator.output_latex
+    if RESTRUCTURED_TEXT in formats:
+        outputs[RESTRUCTURED_TEXT] = ReStructuredTextGenerator(setup, document, None, profile).output_markup
+    if encoding is not None:
+        outputs = dict((output_format, output.encode(encoding)) for output_format, output in outputs.items())
+    return dict((output_format, outputs[output_format]) for output_format in formats)
+
+
+# Returns the document split before every chapter, as documents of their own
+# (the first one holds the text before the first chapter and is None if there
+# is none), or None for a document that cannot be split (a streamed one).
+def split_document(document):
+    if isinstance(document, ChapterDocument):
+        chunks = [chunk.strip() for chunk in split_chapters(document.markup)]
+        if chunks[0].startswith("##"):
+            chunks.insert(0, "")
+        return [ChapterDocument(chunk, document.executor, document.jobs, document.cache) if chunk else None
+                for chunk in chunks]
+    if isinstance(document, Document):
+        parts = [[]]
+        for node in document.children:
+            if node.kind == 'headline':
+                # the breaks before a headline belong to it
+                while parts[-1] and parts[-1][-1].kind in ('paragraph_break', 'section_break'):
+                    parts[-1].pop()
+                parts.append([])
+            parts[-1].append(node)
+        return [Document(nodes) if nodes else None for nodes in parts]
+    return None
 
 
 def prepare_out_folder(setup):
@@ -185,17 +465,53 @@ def prepare_out_folder(setup):
     return True
 
 
-def copy_file(file_name, src_folder, dst_folder):
-    file_util.copy_file(os.path.join(dir_path, src_folder, file_name), os.path.join(dst_folder, file_name), update=1)
+# Writes the parts UTF-8-encoded to a file. A part is a string or an iterable
+# of strings (a rendered StreamedDocument), which is written piece by piece.
+# Large strings are encoded in chunks instead of copying them as a whole. The
+# file is replaced only once everything is written. Returns the number of
+# characters written.
+def write_output(file_path, parts):
+    temporary_file_path = file_path + ".tmp"
+    size = 0
+    try:
+        with io.open(temporary_file_path, "w", encoding="utf-8", newline="") as f:
+            for part in parts:
+                for piece in (part,) if isinstance(part, str) else part:
+                    size += len(piece)
+                    for start in range(0, len(piece), WRITE_CHUNK_SIZE):
+                        f.write(piece[start:start + WRITE_CHUNK_SIZE])
+    except BaseException:
+        # not there if it could not be opened, the original error is raised either way
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+        raise
+    os.replace(temporary_file_path, file_path)
+    return size
+
+
+# returns the contents of a file written by write_output, None if there is none
+def read_output(file_path):
+    try:
+        with io.open(file_path, encoding="utf-8", newline="") as f:
+            return f.read()
+    except (IOError, UnicodeDecodeError):
+        return None
+
+
+# returns the number of characters in the parts, None if a part is a rendered stream
+def parts_size(parts):
+    if not all(isinstance(part, str) for part in parts):
+        return None
+    return sum(len(part) for part in parts)
 
 
 class Generator(object):
-    def __init__(self, setup, input_markup, filters, template_file_path):
+    def __init__(self, setup, document, template_file_path):
         self.template_file_path = template_file_path
-        self.apply_filters(filters, input_markup)
+        self.render(setup, document)
         self.substitute(setup)
 
-    def apply_filters(self, filters, input_markup):
+    def render(self, setup, document):
         pass
         
     def substitute(self, setup):
@@ -206,20 +522,51 @@ class Generator(object):
 
 
 class HtmlGenerator(Generator):
-    def __init__(self, setup, input_markup, filters, template_file_path, license_file_path, output_file_path):
+    """
+    With html_chapters, every chapter is written to a page of its own
+    (html/chapter-NNN.html) with links to the previous and next chapter and
+    to index.html, which holds the text before the first chapter and the
+    table of contents. Every chapter is rendered on its own, so that its
+    sidenotes are numbered from 1 and its page changes with the chapter
+    only. All pages link the same stylesheets.
+    """
+    def __init__(self, setup, document, template_file_path, license_file_path, output_file_path, profile=None,
+                 html_chapters=False):
         self.output_file_path = output_file_path
         self.license_file_path = license_file_path
+        self.profile = profile
+        self.html_chapters = html_chapters
         self.output_html = ""
-        self.html_doc = ""
-        Generator.__init__(self, setup, input_markup, filters, template_file_path)
-
-    def apply_filters(self, filters, input_markup):
-        # Push original contents through HTML filters (same order, order matters).
-        self.output_html = input_markup
-        for f in filters:
-            log.info("Process with %s", f)
-            self.output_html = f.to_html(self.output_html)
-            log.info("Done.")   
+        self.html_doc = []
+        # (name, HTML) of every chapter, with html_chapters
+        self.chapters = []
+        # file name: page of every chapter
+        self.chapter_docs = {}
+        Generator.__init__(self, setup, document, template_file_path)
+
+    def render(self, setup, document):
+        log.info("Rendering HTML body")
+        documents = None
+        if self.html_chapters:
+            documents = split_document(document)
+            if documents is None:
+                log.warning("A streamed HTML body is not split into chapter pages.")
+        with measure(self.profile, HTML, 'render') as record:
+            if documents is None:
+                renderer = HtmlRenderer(setup)
+                self.output_html = document.render(renderer)
+                chapter_count = len(renderer.chapters.chapters)
+            else:
+                if documents[0] is not None:
+                    self.output_html = documents[0].render(HtmlRenderer(setup))
+                for chapter_document in documents[1:]:
+                    renderer = HtmlRenderer(setup)
+                    chapter_html = chapter_document.render(renderer)
+                    self.chapters.append((renderer.chapters.chapters[0]['name'], chapter_html))
+                chapter_count = len(self.chapters)
+            # a rendered stream is measured while writing
+            record['output_size'] = parts_size([self.output_html] + [html for name, html in self.chapters])
+            record['counts'] = {'chapters': chapter_count}
 
     def substitute(self, setup):
         log.info("Performing HTML template substitution")
@@ -230,45 +577,122 @@ class HtmlGenerator(Generator):
             subtitle_tag = '<p class="subtitle">%s</p>\n' % setup.html.subtitle
         
         if os.path.isfile(self.license_file_path):
-            html_license = DocumentReader(self.license_file_path).get_string()
-            if not html_license:
-                html_license = ""
+            html_license = load_text(self.license_file_path)
         else:
             html_license = ""
         
-        html_template_string = DocumentReader(self.template_file_path).get_string()
-        if not html_template_string:
-            log.error("Could not read HTML template.")
-            return
-        html_template = string.Template(html_template_string)
-        self.html_doc = html_template.substitute(html_content=self.output_html, license=html_license, 
-                                                 lang=setup.general.language, locale=setup.html.locale, 
-                                                 header_title=setup.html.header_title, title=setup.html.title,
-                                                 subtitle_tag=subtitle_tag, author=setup.general.author, 
-                                                 meta_description=setup.html.meta_description, url=setup.html.url,
-                                                 site_name=setup.html.site_name, og_image_tag=setup.html.og_image_tag)
-        
+        with measure(self.profile, HTML, 'substitute', parts_size([self.output_html])) as record:
+            html_template = load_template(self.template_file_path)
+            if not html_template:
+                log.error("Could not read HTML template.")
+                return
+            values = dict(license=html_license, lang=setup.general.language, locale=setup.html.locale,
+                          title=setup.html.title, subtitle_tag=subtitle_tag, author=setup.general.author,
+                          meta_description=setup.html.meta_description, url=setup.html.url,
+                          site_name=setup.html.site_name, og_image_tag=setup.html.og_image_tag)
+            html_content = self.output_html
+            if self.chapters:
+                html_content = self.output_html + self.table_of_contents()
+            # the parts of the document are joined only while writing it
+            self.html_doc = html_template.parts(html_content=html_content, header_title=setup.html.header_title,
+                                                **values)
+            for number, (name, chapter_html) in enumerate(self.chapters, 1):
+                navigation = self.chapter_navigation(setup, number)
+                header_title = "%s | %s" % (_tag_pattern.sub("", name), setup.html.header_title)
+                self.chapter_docs[self.chapter_file_name(number)] = html_template.substitute(
+                    html_content=navigation + chapter_html + navigation, header_title=header_title, **values)
+            record['output_size'] = parts_size(self.html_doc)
+
+    def chapter_file_name(self, number):
+        return "chapter-%03d.html" % number
+
+    def table_of_contents(self):
+        return '\n<nav class="table-of-contents">\n<ol>\n%s</ol>\n</nav>\n' \
+               % "".join('<li><a href="%s">%s</a></li>\n' % (self.chapter_file_name(number), name)
+                         for number, (name, chapter_html) in enumerate(self.chapters, 1))
+
+    # links to the previous chapter, the index and the next chapter
+    def chapter_navigation(self, setup, number):
+        links = ['<a href="index.html">%s</a>' % setup.html.title]
+        if number > 1:
+            links.insert(0, '<a href="%s" rel="prev">&larr; %s</a>'
+                         % (self.chapter_file_name(number - 1), self.chapters[number - 2][0]))
+        if number < len(self.chapters):
+            links.append('<a href="%s" rel="next">%s &rarr;</a>'
+                         % (self.chapter_file_name(number + 1), self.chapters[number][0]))
+        return '<nav class="chapter-navigation">\n%s\n</nav>\n' % "\n".join(links)
+
     def create_output(self):
-        with open(self.output_file_path, "wb") as f:
-            f.write(self.html_doc.encode("utf-8"))
+        with measure(self.profile, HTML, 'write') as record:
+            record['output_size'] = write_output(self.output_file_path, self.html_doc)
         log.info("Wrote UTF-8-encoded HTML document: %s.", self.output_file_path)
+        if self.html_chapters:
+            with measure(self.profile, HTML, 'write chapters') as record:
+                record['output_size'], record['counts'] = self.write_chapter_pages()
+
+    # Writes the chapter pages that changed and removes those of chapters
+    # that no longer exist. Returns the number of characters written and the
+    # counts of written and unchanged pages.
+    def write_chapter_pages(self):
+        folder_path = os.path.dirname(self.output_file_path)
+        size = 0
+        written = 0
+        for file_name, page in sorted(self.chapter_docs.items()):
+            file_path = os.path.join(folder_path, file_name)
+            # unchanged pages keep their modification time, and so stay cached by browsers
+            if read_output(file_path) != page:
+                size += write_output(file_path, [page])
+                written += 1
+        for file_name in os.listdir(folder_path):
+            if file_name.startswith("chapter-") and file_name.endswith(".html") and file_name not in self.chapter_docs:
+                os.remove(os.path.join(folder_path, file_name))
+        log.info("Wrote %s of %s HTML chapter pages.", written, len(self.chapter_docs))
+        return size, {'written': written, 'unchanged': len(self.chapter_docs) - written}
 
 
 class LatexGenerator(Generator):
-    def __init__(self, setup, input_markup, filters, template_file_path, output_doc_file_path, output_body_file_path):
+    """
+    With latex_chapters, every chapter of the body is written to a file of
+    its own (with the text before the first chapter as chapter 0), which the
+    body includes. Only the chapters given by latex_chapters (ALL_CHAPTERS,
+    CHANGED_CHAPTERS or a list of numbers) are typeset then, the others keep
+    their pages from the last compilation. \\include starts every chapter on
+    a new page, even without chapterPagebreak; chapter 0 is always typeset.
+
+    With output_preamble_file_path, the static part of the preamble (see
+    LATEX_STATIC_PREAMBLE_END) is written to that file as well, from which
+    latexbuild.py precompiles a format.
+    """
+    def __init__(self, setup, document, template_file_path, output_doc_file_path, output_body_file_path,
+                 profile=None, latex_chapters=None, output_preamble_file_path=None):
         self.output_doc_file_path = output_doc_file_path
         self.output_body_file_path = output_body_file_path
+        self.output_preamble_file_path = output_preamble_file_path
+        self.profile = profile
+        self.latex_chapters = latex_chapters
         self.output_latex = ""
-        self.latex_doc = ""
-        Generator.__init__(self, setup, input_markup, filters, template_file_path)
+        self.latex_doc = []
+        self.chapters = []
+        # chapter number: LaTeX, with latex_chapters
+        self.chapter_files = {}
+        Generator.__init__(self, setup, document, template_file_path)
         
-    def apply_filters(self, filters, input_markup):
-        # Push original contents through all LaTeX filters (order matters).
-        self.output_latex = input_markup
-        for f in filters:
-            log.info("Process with %s", f)
-            self.output_latex = f.to_latex(self.output_latex)
-            log.info("Done.")
+    def render(self, setup, document):
+        log.info("Rendering LaTeX body")
+        renderer = LatexRenderer(setup)
+        with measure(self.profile, LATEX, 'render') as record:
+            self.output_latex = document.render(renderer)
+            record['output_size'] = parts_size([self.output_latex])
+            record['counts'] = {'chapters': len(renderer.chapters.chapters)}
+        if not isinstance(self.output_latex, str):
+            # A streamed body is written right away, as the table of contents
+            # needs all of its chapters.
+            with measure(self.profile, LATEX, 'write body') as record:
+                record['output_size'] = write_output(self.output_body_file_path, [self.output_latex])
+                record['counts'] = {'chapters': len(renderer.chapters.chapters)}
+            log.info("Wrote UTF-8-encoded LaTeX document body: %s.", self.output_body_file_path)
+            self.output_latex = None
+        self.chapters = renderer.chapters.chapters
 
     def substitute(self, setup):
         latex_first_page_setup = ""
@@ -277,18 +701,15 @@ class LatexGenerator(Generator):
             if setup.latex.latex_contents_title:
                 latex_first_page_setup += "\n{\\vspace{0.5cm}\\noindent\\LARGE %s}\n\n" \
                                           % setup.latex.latex_contents_title
-            longest_chapter_title = ""
-            for chapter in get_latex_chapters():
-                if len(chapter['name']) > len(longest_chapter_title):
-                    longest_chapter_title = chapter['name']
+            longest_chapter_title = max([chapter['name'] for chapter in self.chapters] + [""], key=len)
             latex_first_page_setup += "%%%% Calculate width for table of contents\n" \
                                       "\\newlength{\\toctextwidth}\n" \
                                       "\\setlength{\\toctextwidth}{\\minof{0.8\\linewidth}{\\widthof{%s}}}\n\n" \
                                       % longest_chapter_title
             latex_first_page_setup += "\\vspace{0.5cm}\\noindent" \
                                       "\\begin{supertabular}{p{\\toctextwidth}p{0.1\\toctextwidth}}\n"
-            for chapter in get_latex_chapters():
-                latex_first_page_setup += chapter['name'] + " & \\hfill\\pageref{" + chapter['id'] + "} \\\\\n"
+            latex_first_page_setup += "".join(chapter['name'] + " & \\hfill\\pageref{" + chapter['id'] + "} \\\\\n"
+                                              for chapter in self.chapters)
             latex_first_page_setup += "\\end{supertabular}\n"
             latex_first_page_setup += "}\n\n"
             if setup.latex.chapter_pagebreak or setup.latex.table_of_contents_pagebreak:
@@ -306,67 +727,179 @@ class LatexGenerator(Generator):
             header += "\\ohead{" + setup.latex.header_right + "}\n"
             latex_first_page_setup = "\\thispagestyle{empty}\n\n\\printtitle\n" + latex_first_page_setup
                
+        include_only = ""
+        if self.latex_chapters is not None:
+            if self.output_latex is None:
+                log.warning("A streamed LaTeX body is not split into chapter files.")
+            else:
+                self.chapter_files = self.split_chapters()
+                include_only = self.include_only()
+                if not setup.latex.chapter_pagebreak:
+                    log.warning("Chapters typeset separately start on new pages, unlike without them "
+                                "(chapterPagebreak is off): page numbers differ from a normal build.")
+
         log.info("Performing LaTeX template substitution")
-        latex_template_string = DocumentReader(self.template_file_path).get_string()
-        if not latex_template_string:
+        with measure(self.profile, LATEX, 'substitute') as record:
+            self.latex_doc = self.substitute_template(setup, latex_first_page_setup, header, include_only)
+            record['output_size'] = parts_size(self.latex_doc)
+
+    # returns the body cut before every chapter
+    def split_chapters(self):
+        starts = [0]
+        for chapter in self.chapters:
+            starts.append(self.output_latex.index("\n{\\label{%s}" % chapter['id'], starts[-1]))
+        starts.append(len(self.output_latex))
+        chapter_files = {}
+        for number in range(len(starts) - 1):
+            latex = self.output_latex[starts[number]:starts[number + 1]]
+            if number > 0 or latex.strip():
+                chapter_files[number] = latex
+        return chapter_files
+
+    def chapter_file_path(self, number):
+        return os.path.join(os.path.dirname(self.output_body_file_path), LATEX_CHAPTERS_PATH,
+                            "chapter-%03d.tex" % number)
+
+    # returns the \includeonly command for the chapters to typeset, if not all
+    def include_only(self):
+        if self.latex_chapters == ALL_CHAPTERS:
+            return ""
+        if self.latex_chapters == CHANGED_CHAPTERS:
+            numbers = [number for number, latex in sorted(self.chapter_files.items())
+                       if read_output(self.chapter_file_path(number)) != latex]
+            if not numbers:
+                # the same chapters as last time
+                match = _include_only_pattern.search(read_output(self.output_doc_file_path) or "")
+                return match.group() if match else ""
+        else:
+            numbers = [number for number in self.latex_chapters if number in self.chapter_files]
+            if len(numbers) < len(self.latex_chapters):
+                log.warning("The document has no chapters %s.",
+                            ", ".join(str(number) for number in self.latex_chapters if number not in numbers))
+        log.info("Typesetting chapters %s.", ", ".join(str(number) for number in numbers))
+        return "\\includeonly{%s}" % ",".join(LATEX_CHAPTERS_PATH + "chapter-%03d" % number for number in numbers)
+
+    def substitute_template(self, setup, latex_first_page_setup, header, include_only=""):
+        latex_template = load_template(self.template_file_path)
+        if not latex_template:
             log.error("Could not read LaTeX template.")
-            return
-        latex_template = string.Template(latex_template_string)
-        self.latex_doc = latex_template.substitute(isbn=setup.latex.isbn, 
-                                                   document_type=setup.latex.latex_document_type,
-                                                   geometry=setup.latex.latex_geometry,
-                                                   font=setup.latex.font,
-                                                   font_size=setup.latex.latex_font_size,
-                                                   title=setup.latex.latex_title,
-                                                   subtitle=setup.latex.latex_subtitle,
-                                                   half_title=setup.latex.latex_half_title,
-                                                   print_title=setup.latex.print_title,
-                                                   author=setup.general.author, 
-                                                   first_page_setup=latex_first_page_setup, 
-                                                   header=header,
-                                                   pdf_title=setup.latex.latex_title,
-                                                   pdf_author=setup.general.author, 
-                                                   pdf_subject=setup.latex.pdf_subject,
-                                                   pdf_keywords=setup.latex.pdf_keywords,
-                                                   has_color_links=setup.latex.has_color_links,
-                                                   url_color=setup.latex.url_color,
-                                                   link_color=setup.latex.link_color,
-                                                   preliminaries=setup.latex.preliminaries, 
-                                                   appendix=setup.latex.appendix,
-                                                   todonotes_config=setup.latex.todonotes_config)
+            return []
+        return latex_template.parts(isbn=setup.latex.isbn, 
+                                    document_type=setup.latex.latex_document_type,
+                                    geometry=setup.latex.latex_geometry,
+                                    font=setup.latex.font,
+                                    font_size=setup.latex.latex_font_size,
+                                    title=setup.latex.latex_title,
+                                    subtitle=setup.latex.latex_subtitle,
+                                    half_title=setup.latex.latex_half_title,
+                                    print_title=setup.latex.print_title,
+                                    author=setup.general.author, 
+                                    first_page_setup=latex_first_page_setup, 
+                                    header=header,
+                                    pdf_title=setup.latex.latex_title,
+                                    pdf_author=setup.general.author, 
+                                    pdf_subject=setup.latex.pdf_subject,
+                                    pdf_keywords=setup.latex.pdf_keywords,
+                                    has_color_links=setup.latex.has_color_links,
+                                    url_color=setup.latex.url_color,
+                                    link_color=setup.latex.link_color,
+                                    preliminaries=setup.latex.preliminaries, 
+                                    appendix=setup.latex.appendix,
+                                    todonotes_config=setup.latex.todonotes_config,
+                                    include_only=include_only)
  
     def create_output(self):
         # writing latex document
-        with open(self.output_doc_file_path, "wb") as f:
-            f.write(self.latex_doc.encode("utf-8"))
+        with measure(self.profile, LATEX, 'write') as record:
+            record['output_size'] = write_output(self.output_doc_file_path, self.latex_doc)
         log.info("Wrote UTF-8-encoded LaTeX document: %s.", self.output_doc_file_path)
-        # writing latex document body
-        with open(self.output_body_file_path, "wb") as f:
-            f.write(self.output_latex.encode("utf-8"))
-        log.info("Wrote UTF-8-encoded LaTeX document body: %s.", self.output_body_file_path)
+        if self.output_preamble_file_path:
+            self.write_static_preamble()
+        if self.chapter_files:
+            with measure(self.profile, LATEX, 'write chapters') as record:
+                record['output_size'], record['counts'] = self.write_chapter_files()
+        # writing latex document body (unless streamed already)
+        elif self.output_latex is not None:
+            with measure(self.profile, LATEX, 'write body') as record:
+                record['output_size'] = write_output(self.output_body_file_path, [self.output_latex])
+            log.info("Wrote UTF-8-encoded LaTeX document body: %s.", self.output_body_file_path)
+
+    # returns the beginning of the document up to LATEX_STATIC_PREAMBLE_END, or None
+    def static_preamble(self):
+        preamble = []
+        for part in self.latex_doc:
+            if not isinstance(part, str):
+                return None
+            end = part.find(LATEX_STATIC_PREAMBLE_END)
+            if end >= 0:
+                preamble.append(part[:end + 1])
+                return "".join(preamble)
+            preamble.append(part)
+        return None
+
+    def write_static_preamble(self):
+        preamble = self.static_preamble()
+        if preamble is None:
+            # a template without the static preamble, the document is compiled as a whole
+            if os.path.exists(self.output_preamble_file_path):
+                os.remove(self.output_preamble_file_path)
+            return
+        # unchanged, the file is left alone
+        if read_output(self.output_preamble_file_path) != preamble:
+            write_output(self.output_preamble_file_path, [preamble])
+            log.info("Wrote UTF-8-encoded LaTeX preamble: %s.", self.output_preamble_file_path)
+
+    # Writes the chapter files that changed, removes those of chapters that
+    # no longer exist and writes the body including them. Returns the number
+    # of characters written and the counts of written and unchanged files.
+    def write_chapter_files(self):
+        chapters_folder_path = os.path.dirname(self.chapter_file_path(0))
+        if not os.path.exists(chapters_folder_path):
+            os.makedirs(chapters_folder_path)
+        size = 0
+        written = 0
+        for number, latex in sorted(self.chapter_files.items()):
+            file_path = self.chapter_file_path(number)
+            # unchanged files are left alone, so that their state is kept
+            if read_output(file_path) != latex:
+                size += write_output(file_path, [latex])
+                written += 1
+        file_names = set(os.path.basename(self.chapter_file_path(number)) for number in self.chapter_files)
+        for file_name in os.listdir(chapters_folder_path):
+            if file_name.startswith("chapter-") and file_name.endswith(".tex") and file_name not in file_names:
+                os.remove(os.path.join(chapters_folder_path, file_name))
+        # \include starts a new page, which the text before the first chapter does not get
+        body = "".join("\\%s{%schapter-%03d}\n"
+                       % ("input" if number == 0 else "include", LATEX_CHAPTERS_PATH, number)
+                       for number in sorted(self.chapter_files))
+        size += write_output(self.output_body_file_path, [body])
+        log.info("Wrote %s of %s LaTeX chapter files and the document body including them: %s.", written,
+                 len(self.chapter_files), self.output_body_file_path)
+        return size, {'written': written, 'unchanged': len(self.chapter_files) - written}
 
 
 class ReStructuredTextGenerator(Generator):
-    def __init__(self, setup, input_markup, filters, output_file_path=None):
+    def __init__(self, setup, document, output_file_path=None, profile=None):
         self.output_file_path = output_file_path
+        self.profile = profile
         self.output_markup = ""
-        Generator.__init__(self, setup, input_markup, filters, None)
+        Generator.__init__(self, setup, document, None)
 
-    def apply_filters(self, filters, input_markup):
-        # Push original contents through reStructuredText filters (same order, order matters).
-        self.output_markup = input_markup
-        for f in filters:
-            log.info("Process with %s", f)
-            self.output_markup = f.to_restructured_text(self.output_markup)
-            log.info("Done.")
+    def render(self, setup, document):
+        log.info("Rendering reStructuredText")
+        renderer = ReStructuredTextRenderer(setup)
+        with measure(self.profile, RESTRUCTURED_TEXT, 'render') as record:
+            self.output_markup = document.render(renderer)
+            record['output_size'] = parts_size([self.output_markup])
+            record['counts'] = {'chapters': len(renderer.chapters.chapters)}
 
     def substitute(self, setup):
         pass
 
     def create_output(self):
         if self.output_file_path:
-            with open(self.output_file_path, "wb") as f:
-                f.write(self.output_markup.encode("utf-8"))
+            with measure(self.profile, RESTRUCTURED_TEXT, 'write') as record:
+                record['output_size'] = write_output(self.output_file_path, [self.output_markup])
             log.info("Wrote UTF-8-encoded reStructuredText document: %s.", self.output_file_path)
 
 
@@ -4,9 +4,24 @@
 from __future__ import unicode_literals
 
 import string
+import threading
 
 from logger import log
 
+_font_manager = None
+_font_manager_lock = threading.Lock()
+
+
+# returns the FontManager of this process, which is set up only once (also
+# when setups are loaded in several threads at once)
+def get_font_manager():
+    global _font_manager
+    if _font_manager is None:
+        with _font_manager_lock:
+            if _font_manager is None:
+                _font_manager = FontManager()
+    return _font_manager
+
 
 class FontManager(object):
     def __init__(self):
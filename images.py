@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+from collections import namedtuple
+import hashlib
+import os
+import re
+import shutil
+
+from logger import log
+from parallel import create_executor
+
+try:
+    # images are resized only with the Pillow package
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# widths (in pixels) of the web variants of an image, as far as it is wider
+WEB_IMAGE_WIDTHS = (480, 800, 1200, 1600)
+# the width of images on the pages (figures take 55% of the text column, 90% on phones)
+WEB_IMAGE_SIZES = "(max-width: 760px) 90vw, 50vw"
+WEB_IMAGE_QUALITY = 82
+# folder in the HTML folder with the web variants
+WEB_IMAGE_PATH = "img-web"
+# variants by the hash of the image, width and format, in the output folder
+WEB_IMAGE_CACHE_PATH = os.path.normpath(".textstory-cache/images/web")
+# JPEG quality of the print versions (the compiler embeds JPEG files as they are)
+PRINT_IMAGE_QUALITY = 90
+# folder in the LaTeX folder with the print versions
+PRINT_IMAGE_PATH = "img-print"
+PRINT_IMAGE_CACHE_PATH = os.path.normpath(".textstory-cache/images/print")
+
+# lines consisting of ![Alt text](/path/to/img.jpg "optional title"), see markup.py
+_image_line_pattern = re.compile(r'^!\[(.*)\]\(([^")\r\n]*)(\s"(.*)")?\)\r?$', re.MULTILINE)
+# EXIF orientations of images that are turned by 90 degrees
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+ImageStageResult = namedtuple('ImageStageResult', ['images', 'made_files', 'cached_files'])
+ResponsiveImage = namedtuple('ResponsiveImage', ['src', 'srcset', 'sizes', 'width', 'height'])
+
+
+# returns the paths of the images in the markup, given in sections (see
+# stream.read_sections), each path once
+def find_images(sections):
+    paths = []
+    for markup in sections:
+        for match in _image_line_pattern.finditer(markup):
+            path = match.group(2).strip()
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+# Makes the web variants of the images (paths as in the markup, relative to
+# the source folder) in the HTML folder: one for every width in widths the
+# image is wider than, and one as wide as the image (at most the widest). The
+# variants are made on the process pool (or one of their own) and kept in
+# the cache folder by the hash of the image, so that images that did not
+# change are not resized again. Returns a ResponsiveImage by path for the
+# HtmlRenderer. Images that are not in the source folder (e.g. put into the
+# HTML folder by hand) are left as they are. Without Pillow, nothing is done.
+def create_web_images(paths, source_folder_path, html_output_path, cache_folder_path, executor=None,
+                      widths=WEB_IMAGE_WIDTHS):
+    sources = _find_sources(paths, source_folder_path)
+    if sources and Image is None:
+        log.info("Install Pillow to make web variants of the images.")
+    if not sources or Image is None:
+        _publish({}, os.path.join(html_output_path, WEB_IMAGE_PATH))
+        return ImageStageResult({}, 0, 0)
+
+    variants = _variants(sources, lambda image_width, image_height: sorted(set(
+        [width for width in widths if width < image_width] + [min(image_width, max(widths))])))
+    made_files, cached_files = _make_variants(sources, variants, cache_folder_path, WEB_IMAGE_QUALITY, executor)
+
+    images = {}
+    files = {}
+    for path, path_variants in variants.items():
+        srcset = []
+        for width, height, name, image_format in path_variants:
+            files[name] = os.path.join(cache_folder_path, name)
+            srcset.append("%s/%s %sw" % (WEB_IMAGE_PATH, name, width))
+        width, height, name = path_variants[-1][:3]
+        images[path] = ResponsiveImage("%s/%s" % (WEB_IMAGE_PATH, name), ", ".join(srcset), WEB_IMAGE_SIZES,
+                                       width, height)
+    _publish(files, os.path.join(html_output_path, WEB_IMAGE_PATH))
+    log.info("Made web variants of %s images: %s resized, %s from the cache.", len(images), made_files,
+             cached_files)
+    return ImageStageResult(images, made_files, cached_files)
+
+
+# Makes the print versions of the images (paths as in the markup, relative
+# to the source folder) in the LaTeX folder: scaled down to fit the paper
+# (width and height in mm) at the resolution (dots per inch), photos as JPEG
+# and others as PNG, which the compiler both embeds without converting them.
+# They are made and cached like the web variants (see create_web_images).
+# Returns the paths of the print versions (relative to the LaTeX folder) by
+# path for the LatexRenderer.
+def create_print_images(paths, source_folder_path, latex_output_path, cache_folder_path, paper_size, dpi,
+                        executor=None):
+    sources = _find_sources(paths, source_folder_path)
+    if sources and Image is None:
+        log.info("Install Pillow to scale the images down for print.")
+    if not sources or Image is None or paper_size is None:
+        _publish({}, os.path.join(latex_output_path, PRINT_IMAGE_PATH))
+        return ImageStageResult({}, 0, 0)
+
+    # the size of the paper in pixels
+    paper_width, paper_height = [int(size / 25.4 * dpi) for size in paper_size]
+    variants = _variants(sources, lambda image_width, image_height: [
+        max(1, min(image_width, paper_width, int(image_width * paper_height / float(image_height))))])
+    made_files, cached_files = _make_variants(sources, variants, cache_folder_path, PRINT_IMAGE_QUALITY, executor)
+
+    images = {}
+    files = {}
+    for path, [(width, height, name, image_format)] in variants.items():
+        files[name] = os.path.join(cache_folder_path, name)
+        images[path] = "%s/%s" % (PRINT_IMAGE_PATH, name)
+    _publish(files, os.path.join(latex_output_path, PRINT_IMAGE_PATH))
+    log.info("Made print versions of %s images at %s dpi: %s scaled, %s from the cache.", len(images), dpi,
+             made_files, cached_files)
+    return ImageStageResult(images, made_files, cached_files)
+
+
+# Returns the variants (width, height, name, format) of the images by path,
+# for the widths returned by widths(image width, image height). Images that
+# cannot be read are removed from the sources.
+def _variants(sources, widths):
+    variants = {}
+    for path, source_path in list(sources.items()):
+        try:
+            image_width, image_height, image_format = _image_info(source_path)
+        except OSError as e:
+            log.warning("Cannot read image %s, left as it is: %s", source_path, e)
+            del sources[path]
+            continue
+        content_hash = _hash_file(source_path)
+        variants[path] = [(width, int(round(image_height * width / float(image_width))),
+                           _variant_name(source_path, content_hash, width, image_format), image_format)
+                          for width in widths(image_width, image_height)]
+    return variants
+
+
+# returns the image files by path, for the paths of files in the source folder
+def _find_sources(paths, source_folder_path):
+    sources = {}
+    for path in paths:
+        if "://" in path or path.startswith(("/", "data:")):
+            continue
+        source_path = os.path.normpath(os.path.join(source_folder_path, *path.split("/")))
+        if os.path.isfile(source_path):
+            sources[path] = source_path
+        else:
+            log.debug("Image not next to the manuscript, left as it is: %s", path)
+    return sources
+
+
+# returns the width and height (as displayed) and the format the variants get
+def _image_info(source_path):
+    with Image.open(source_path) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        # line art and images with transparency stay PNG, photos become JPEG
+        if image.format in ("PNG", "GIF") or image.mode in ("RGBA", "LA", "P"):
+            return width, height, "PNG"
+        return width, height, "JPEG"
+
+
+def _variant_name(source_path, content_hash, width, image_format):
+    stem = re.sub(r'[^\w-]', "-", os.path.splitext(os.path.basename(source_path))[0])
+    return "%s-%s-%s.%s" % (stem, content_hash[:16], width, "png" if image_format == "PNG" else "jpg")
+
+
+def _hash_file(file_path):
+    content_hash = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+# makes the variants not in the cache yet, returns how many were made and
+# how many were in the cache
+def _make_variants(sources, variants, cache_folder_path, quality, executor=None):
+    jobs = []
+    cached_files = 0
+    for path, path_variants in variants.items():
+        for width, height, name, image_format in path_variants:
+            cache_file_path = os.path.join(cache_folder_path, name)
+            if os.path.isfile(cache_file_path):
+                cached_files += 1
+            elif (sources[path], cache_file_path, width, image_format, quality) not in jobs:
+                jobs.append((sources[path], cache_file_path, width, image_format, quality))
+    if not jobs:
+        return 0, cached_files
+    os.makedirs(cache_folder_path, exist_ok=True)
+    own_executor = None
+    if executor is None and len(jobs) > 1:
+        executor = own_executor = create_executor(min(len(jobs), os.cpu_count() or 1))
+    try:
+        if executor is None:
+            for job in jobs:
+                _resize(*job)
+        else:
+            for future in [executor.submit(_resize, *job) for job in jobs]:
+                future.result()
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+    return len(jobs), cached_files
+
+
+# Writes the image scaled down to the width (if it is wider) in the format.
+# An image that needs neither is copied as it is.
+def _resize(source_path, file_path, width, image_format, quality):
+    with Image.open(source_path) as image:
+        if image.width <= width and image.format == image_format and image.getexif().get(0x0112, 1) == 1:
+            shutil.copyfile(source_path, file_path)
+            return
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, int(round(image.height * width / float(image.width)))), Image.LANCZOS)
+        if image_format == "JPEG":
+            image = image.convert("RGB")
+            options = {'quality': quality, 'optimize': True, 'progressive': True}
+        else:
+            options = {'optimize': True}
+        temporary_file_path = file_path + ".tmp"
+        image.save(temporary_file_path, image_format, **options)
+    os.replace(temporary_file_path, file_path)
+
+
+# Puts the files (cache file paths by name) into the folder, as hard links
+# where possible, and removes all others. Names are content-addressed, so
+# files already there are up to date.
+def _publish(files, folder_path):
+    for name, cache_file_path in files.items():
+        file_path = os.path.join(folder_path, name)
+        if os.path.exists(file_path):
+            continue
+        os.makedirs(folder_path, exist_ok=True)
+        try:
+            os.link(cache_file_path, file_path)
+        except OSError:
+            shutil.copyfile(cache_file_path, file_path)
+    if os.path.isdir(folder_path):
+        for name in os.listdir(folder_path):
+            if name not in files:
+                os.remove(os.path.join(folder_path, name))
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+import argparse
+from collections import namedtuple
+import hashlib
+import json
+import os
+import subprocess
+import time
+
+from logger import log
+from runprofile import measure
+
+LATEX_COMPILER = ("lualatex", "--interaction=nonstopmode", "--output-format=pdf")
+LATEX_DOCUMENT = "latex-document.tex"
+# The static preamble (written by filt0r.py), which is precompiled into a
+# format once, so that the compiler does not load its packages and fonts on
+# every pass. The compiler then reads the rest of the document only.
+LATEX_PREAMBLE = "latex-preamble.tex"
+LATEX_FORMAT = "latex-preamble"
+LATEX_FORMAT_COMPILER = ("lualatex", "--ini", "--interaction=nonstopmode", "--jobname=" + LATEX_FORMAT, "&lualatex")
+LATEX_FORMAT_STAMP_FILE = os.path.normpath(".textstory-cache/latex-format.json")
+LATEX_FORMAT_DOCUMENT = os.path.normpath(".textstory-cache/latex-document-after-preamble.tex")
+# more passes are needed only if labels keep moving, e.g. between pages
+LATEX_MAX_PASSES = 5
+# written into the LaTeX folder after a successful build
+LATEX_BUILD_STAMP_FILE = os.path.normpath(".textstory-cache/latex-build.json")
+# files written by the compiler (also for included files), compared between passes
+AUXILIARY_EXTENSIONS = (".aux", ".toc", ".out")
+# files written by the compiler, not inputs of the build
+OUTPUT_EXTENSIONS = AUXILIARY_EXTENSIONS + (".fmt", ".log", ".pdf", ".synctex.gz", ".tmp")
+
+PDF = 'pdf'
+
+PdfBuildResult = namedtuple('PdfBuildResult', ['pdf_file_path', 'pass_seconds', 'skipped'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="filt0r.py pdf",
+                                     description="Compile the LaTeX document in a folder to PDF, with as many "
+                                                 "compiler passes as the table of contents needs.")
+    parser.add_argument('latex_folder_path', nargs='?', default="latex",
+                        help="folder containing %s (default: latex)" % LATEX_DOCUMENT)
+    parser.add_argument('--force', action='store_true', help="compile even if nothing changed since the last PDF")
+    parser.add_argument('--max-passes', type=int, default=LATEX_MAX_PASSES,
+                        help="passes at most (default: %s)" % LATEX_MAX_PASSES)
+    parser.add_argument('--no-format', dest='precompile', action='store_false',
+                        help="do not precompile the preamble (%s) into a format" % LATEX_PREAMBLE)
+    args = parser.parse_args(argv)
+    build_pdf(args.latex_folder_path, force=args.force, max_passes=args.max_passes, precompile=args.precompile)
+
+
+# Compiles the LaTeX document in the folder to PDF. The compiler runs again
+# as long as a pass changes the auxiliary files (labels, table of contents),
+# so that page references are resolved with as few passes as possible. If the
+# inputs (document, body, preliminaries, appendix, images, ...) did not change
+# since the last successful build, nothing is compiled. compiler is the command
+# (a sequence), which gets the document file name appended. With precompile,
+# the static preamble is loaded from a format built by format_compiler (see
+# prepare_format). If compiling with the format fails, e.g. after an update of
+# the TeX distribution, the format is removed and the document compiled as a
+# whole.
+def build_pdf(latex_folder_path, compiler=LATEX_COMPILER, max_passes=LATEX_MAX_PASSES, force=False, profile=None,
+              precompile=True, format_compiler=LATEX_FORMAT_COMPILER):
+    document_file_path = os.path.join(latex_folder_path, LATEX_DOCUMENT)
+    if not os.path.isfile(document_file_path):
+        raise SystemExit("File not found: %s" % document_file_path)
+    pdf_file_path = os.path.splitext(document_file_path)[0] + ".pdf"
+    stamp_file_path = os.path.join(latex_folder_path, LATEX_BUILD_STAMP_FILE)
+    stamp = {'inputs': _hash_inputs(latex_folder_path), 'compiler': list(compiler)}
+
+    if not force and _read_stamp(stamp_file_path) == dict(stamp, pdf=_file_state(pdf_file_path)):
+        log.info("PDF is up to date: %s.", pdf_file_path)
+        return PdfBuildResult(pdf_file_path, [], True)
+
+    arguments = [LATEX_DOCUMENT]
+    if precompile:
+        with measure(profile, PDF, 'format'):
+            arguments = prepare_format(latex_folder_path, format_compiler) or arguments
+    pass_seconds = []
+    auxiliary_hash = _hash_auxiliary_files(latex_folder_path)
+    while True:
+        if len(pass_seconds) == max_passes:
+            log.warning("Page references still changing after %s passes.", max_passes)
+            break
+        with measure(profile, PDF, "pass %s" % (len(pass_seconds) + 1)):
+            start = time.time()
+            try:
+                _compile(compiler, latex_folder_path, arguments)
+            except SystemExit:
+                if arguments == [LATEX_DOCUMENT]:
+                    raise
+                log.warning("Compiling with the precompiled preamble failed, compiling without it.")
+                _remove_format(latex_folder_path)
+                arguments = [LATEX_DOCUMENT]
+                start = time.time()
+                _compile(compiler, latex_folder_path, arguments)
+            pass_seconds.append(time.time() - start)
+        log.info("LaTeX pass %s took %.1f s.", len(pass_seconds), pass_seconds[-1])
+        previous_auxiliary_hash, auxiliary_hash = auxiliary_hash, _hash_auxiliary_files(latex_folder_path)
+        if auxiliary_hash == previous_auxiliary_hash:
+            break
+
+    if not os.path.isfile(pdf_file_path):
+        raise SystemExit("The LaTeX compiler wrote no PDF: %s" % pdf_file_path)
+    _write_stamp(stamp_file_path, dict(stamp, pdf=_file_state(pdf_file_path)))
+    log.info("Wrote PDF in %s passes (%.1f s): %s.", len(pass_seconds), sum(pass_seconds), pdf_file_path)
+    return PdfBuildResult(pdf_file_path, pass_seconds, False)
+
+
+# Builds the format from the static preamble, unless the format was built
+# from the same preamble already. Returns the compiler arguments for the
+# document with this format, or None if the document is to be compiled as a
+# whole: without a preamble file, if the document does not begin with it (a
+# stale preamble file) or if the format cannot be built. format_compiler is
+# the command, which gets a line of TeX appended that loads the preamble and
+# dumps the format.
+def prepare_format(latex_folder_path, format_compiler=LATEX_FORMAT_COMPILER):
+    try:
+        with open(os.path.join(latex_folder_path, LATEX_PREAMBLE), "rb") as f:
+            preamble = f.read()
+    except IOError:
+        return None
+    with open(os.path.join(latex_folder_path, LATEX_DOCUMENT), "rb") as f:
+        document = f.read()
+    if not document.startswith(preamble):
+        log.info("The document does not begin with %s, compiling it without a format.", LATEX_PREAMBLE)
+        return None
+
+    # the rest of the document, compiled with the format (under the name of the document)
+    _write_if_changed(os.path.join(latex_folder_path, LATEX_FORMAT_DOCUMENT), document[len(preamble):])
+    format_file_path = os.path.join(latex_folder_path, LATEX_FORMAT + ".fmt")
+    stamp_file_path = os.path.join(latex_folder_path, LATEX_FORMAT_STAMP_FILE)
+    stamp = {'preamble': hashlib.sha1(preamble).hexdigest(), 'compiler': list(format_compiler)}
+    if _read_stamp(stamp_file_path) != dict(stamp, format=_file_state(format_file_path)):
+        log.info("Precompiling the LaTeX preamble into %s.", format_file_path)
+        _remove_format(latex_folder_path)
+        try:
+            _compile(format_compiler, latex_folder_path, ["\\input{%s}\\dump" % os.path.splitext(LATEX_PREAMBLE)[0]],
+                     LATEX_FORMAT + ".log")
+        except SystemExit as e:
+            log.warning("%s Compiling the document without a format.", e)
+            return None
+        if not os.path.isfile(format_file_path):
+            log.warning("The LaTeX compiler wrote no format, compiling the document without it.")
+            return None
+        _write_stamp(stamp_file_path, dict(stamp, format=_file_state(format_file_path)))
+    return ["--fmt=" + LATEX_FORMAT, "--jobname=" + os.path.splitext(LATEX_DOCUMENT)[0],
+            LATEX_FORMAT_DOCUMENT.replace(os.sep, "/")]
+
+
+def _remove_format(latex_folder_path):
+    for file_path in (os.path.join(latex_folder_path, LATEX_FORMAT + ".fmt"),
+                      os.path.join(latex_folder_path, LATEX_FORMAT_STAMP_FILE)):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def _compile(compiler, latex_folder_path, arguments=(LATEX_DOCUMENT,), log_file_name=None):
+    try:
+        process = subprocess.run(list(compiler) + list(arguments), cwd=latex_folder_path,
+                                 stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as e:
+        raise SystemExit("Cannot run the LaTeX compiler %s: %s" % (compiler[0], e))
+    if process.returncode != 0:
+        output = process.stdout.decode("utf-8", "replace").splitlines()
+        log.error("\n".join(output[-20:]))
+        raise SystemExit("The LaTeX compiler failed with exit status %s, see %s."
+                         % (process.returncode, log_file_name or os.path.splitext(LATEX_DOCUMENT)[0] + ".log"))
+
+
+# hash of the files in the folder the compiler reads
+def _hash_inputs(latex_folder_path):
+    inputs_hash = hashlib.sha1()
+    for root, dirs, file_names in os.walk(latex_folder_path):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        for file_name in sorted(file_names):
+            if file_name.endswith(OUTPUT_EXTENSIONS):
+                continue
+            file_path = os.path.join(root, file_name)
+            inputs_hash.update(os.path.relpath(file_path, latex_folder_path).encode("utf-8") + b"\0")
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    inputs_hash.update(block)
+            inputs_hash.update(b"\0")
+    return inputs_hash.hexdigest()
+
+
+def _hash_auxiliary_files(latex_folder_path):
+    auxiliary_hash = hashlib.sha1()
+    for root, dirs, file_names in os.walk(latex_folder_path):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        for file_name in sorted(file_names):
+            if file_name.endswith(AUXILIARY_EXTENSIONS):
+                file_path = os.path.join(root, file_name)
+                with open(file_path, "rb") as f:
+                    auxiliary_hash.update(os.path.relpath(file_path, latex_folder_path).encode("utf-8") + b"\0"
+                                          + f.read() + b"\0")
+    return auxiliary_hash.hexdigest()
+
+
+def _file_state(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _read_stamp(stamp_file_path):
+    try:
+        with open(stamp_file_path, "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+    except (IOError, ValueError):
+        return None
+
+
+def _write_if_changed(file_path, content):
+    try:
+        with open(file_path, "rb") as f:
+            if f.read() == content:
+                return
+    except IOError:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(content)
+
+
+def _write_stamp(stamp_file_path, stamp):
+    folder_path = os.path.dirname(stamp_file_path)
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path, exist_ok=True)
+    with open(stamp_file_path, "wb") as f:
+        f.write(json.dumps(stamp, sort_keys=True, indent=1).encode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+import re
+
+from escaperoutes import escape_originals, escape_routes
+from logger import log
+
+
+def parse_markup(markup):
+    return MarkupParser().parse(markup)
+
+
+# Nodes of the document tree. Leaf nodes carry their own data, span nodes
+# (quotes, bold, footnotes, ...) carry a list of child nodes. Paragraph and
+# section breaks are leaves as well, so that spans may continue across them
+# (e.g. a quote over several paragraphs).
+class Node(object):
+    __slots__ = ()
+    kind = None
+
+
+class Container(Node):
+    __slots__ = ('children',)
+
+    def __init__(self, children=None):
+        self.children = [] if children is None else children
+
+
+class Document(Container):
+    __slots__ = ()
+    kind = 'document'
+
+    def render(self, renderer):
+        return renderer.render(self)
+
+
+class Text(Node):
+    __slots__ = ('text',)
+    kind = 'text'
+
+    def __init__(self, text):
+        self.text = text
+
+
+class Escape(Node):
+    __slots__ = ('name',)
+    kind = 'escape'
+
+    def __init__(self, name):
+        self.name = name
+
+
+class ParagraphBreak(Node):
+    __slots__ = ()
+    kind = 'paragraph_break'
+
+
+class SectionBreak(Node):
+    __slots__ = ()
+    kind = 'section_break'
+
+
+# Lines beginning with ## (children: the headline text)
+class Headline(Container):
+    __slots__ = ()
+    kind = 'headline'
+
+
+# Lines consisting of ![Alt text](/path/to/img.jpg "optional title")
+class Image(Node):
+    __slots__ = ('alt', 'path', 'title')
+    kind = 'image'
+
+    def __init__(self, alt, path, title=None):
+        self.alt = alt
+        self.path = path
+        self.title = title
+
+
+class Quote(Container):
+    __slots__ = ()
+    kind = 'quote'
+
+
+class Bold(Container):
+    __slots__ = ()
+    kind = 'bold'
+
+
+class Italic(Container):
+    __slots__ = ()
+    kind = 'italic'
+
+
+class Footnote(Container):
+    __slots__ = ()
+    kind = 'footnote'
+
+
+class Highlight(Container):
+    __slots__ = ()
+    kind = 'highlight'
+
+
+class InlineComment(Container):
+    __slots__ = ()
+    kind = 'inline_comment'
+
+
+class SideComment(Container):
+    __slots__ = ()
+    kind = 'side_comment'
+
+
+PARAGRAPH_BREAK = ParagraphBreak()
+SECTION_BREAK = SectionBreak()
+
+# opening delimiter: (span node class, closing delimiter)
+SPANS = {
+    '((': (Highlight, '))'),
+    '{{': (InlineComment, '}}'),
+    '[[': (SideComment, ']]'),
+    '[': (Footnote, ']'),
+    '"': (Quote, '"'),
+    '__': (Bold, '__'),
+    '**': (Bold, '**'),
+    '_': (Italic, '_'),
+    '*': (Italic, '*'),
+}
+
+_escape_names = dict((route.original, name) for name, route in escape_routes.items())
+
+# Kept as one flat alternation of literals, which lets the regex engine skip
+# plain text quickly.
+_token_pattern = re.compile(
+    '|'.join(re.escape(original) for original in escape_originals)
+    + r'|\r\n|\r|\n|\(\(|\)\)|\{\{|\}\}|\[\[|\]\]|\[|\]|"|__|\*\*|_|\*')
+_newlines_pattern = re.compile(r'[\r\n]*')
+_line_end_pattern = re.compile(r'[\r\n]')
+_headline_pattern = re.compile(r'##[^\S\r\n]*')
+_image_pattern = re.compile(r'!\[(.*)\]\(([^")]*)(\s"(.*)")?\)$')
+
+
+class MarkupParser(object):
+    """
+    Reads textstory markup in a single scan and builds the document tree.
+
+    Spans are paired like the markup documentation describes them: an opening
+    delimiter is closed by the next matching closing delimiter. Delimiters
+    that are never closed (or that are cut off by an enclosing span closing
+    first) stay literal text.
+    """
+    def __init__(self):
+        # number of spans left unclosed at the end of the last document
+        self.unclosed_spans = 0
+
+    def parse(self, markup):
+        document = Document()
+        self._parse(markup, document, blocks=True, spans=True)
+        log.debug("Parsed document: %s top level nodes.", len(document.children))
+        return document
+
+    def _parse(self, markup, container, blocks, spans):
+        # stack of open spans: [node, closing delimiter, opening delimiter]
+        stack = [[container, None, None]]
+        pos = 0
+        at_line_start = blocks
+        while True:
+            if at_line_start:
+                pos = self._parse_block(markup, pos, stack[-1][0].children)
+                at_line_start = False
+            match = _token_pattern.search(markup, pos)
+            if match is None:
+                append_text(stack[-1][0].children, markup[pos:])
+                break
+            if match.start() > pos:
+                append_text(stack[-1][0].children, markup[pos:match.start()])
+            token = match.group()
+            pos = match.end()
+            if token in _escape_names:
+                stack[-1][0].children.append(Escape(_escape_names[token]))
+            elif token[0] in '\r\n':
+                # two line feeds separate sections, a single one paragraphs
+                start = match.start()
+                pos = _newlines_pattern.match(markup, pos).end()
+                token = markup[start:pos]
+                count = len(token) - token.count('\r\n')
+                children = stack[-1][0].children
+                children.extend([SECTION_BREAK] * (count // 2))
+                if count % 2:
+                    children.append(PARAGRAPH_BREAK)
+                at_line_start = blocks
+            elif spans:
+                if token == ']]' and stack[-1][1] == ']':
+                    # footnote at the very end of a side comment: the first ] closes the footnote, the
+                    # rest is read again (and may close the side comment)
+                    token = ']'
+                    pos -= 1
+                self._parse_delimiter(stack, token)
+            else:
+                append_text(stack[-1][0].children, token)
+        if blocks:
+            self.unclosed_spans = len(stack) - 1
+        while len(stack) > 1:
+            self._revert_span(stack)
+        return container
+
+    def _parse_block(self, markup, pos, children):
+        if markup.startswith('##', pos):
+            line_end = self._find_line_end(markup, pos)
+            title_start = _headline_pattern.match(markup, pos).end()
+            headline = Headline()
+            self._parse(markup[title_start:line_end], headline, blocks=False, spans=True)
+            children.append(headline)
+            return line_end
+        if markup.startswith('![', pos):
+            line_end = self._find_line_end(markup, pos)
+            match = _image_pattern.match(markup, pos, line_end)
+            if match is not None:
+                alt = self._parse(match.group(1), Container(), blocks=False, spans=False)
+                # as images.find_images, without the blanks before the title
+                path = self._parse(match.group(2).strip(), Container(), blocks=False, spans=False)
+                title = None
+                if match.group(4) is not None:
+                    title = self._parse(match.group(4), Container(), blocks=False, spans=True)
+                children.append(Image(alt, path, title))
+                return line_end
+        return pos
+
+    @staticmethod
+    def _find_line_end(markup, pos):
+        match = _line_end_pattern.search(markup, pos)
+        return len(markup) if match is None else match.start()
+
+    def _parse_delimiter(self, stack, token):
+        for depth in range(len(stack) - 1, 0, -1):
+            if stack[depth][1] == token:
+                while len(stack) - 1 > depth:
+                    self._revert_span(stack)
+                node = stack.pop()[0]
+                stack[-1][0].children.append(node)
+                return
+        if token in SPANS:
+            node_class, closing = SPANS[token]
+            stack.append([node_class(), closing, token])
+        else:
+            append_text(stack[-1][0].children, token)
+
+    @staticmethod
+    def _revert_span(stack):
+        # an unclosed span: its opening delimiter is literal text after all
+        node, closing, opening = stack.pop()
+        children = stack[-1][0].children
+        append_text(children, opening)
+        for child in node.children:
+            if child.kind == 'text':
+                append_text(children, child.text)
+            else:
+                children.append(child)
+
+
+def append_text(children, text):
+    if not text:
+        return
+    if children and children[-1].kind == 'text':
+        children[-1] = Text(children[-1].text + text)
+    else:
+        children.append(Text(text))
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import hashlib
+import multiprocessing
+import re
+
+from cache import setup_fingerprint
+from logger import log
+from markup import MarkupParser
+
+# chunks per job, smaller chunks even out the load between workers
+CHUNKS_PER_JOB = 4
+# Size of chunks looked up in a render cache. It does not depend on the
+# number of jobs, so that the cache is used no matter how many there are.
+CACHE_CHUNK_SIZE = 32 * 1024
+
+# a literal (instead of ^## in multiline mode) lets the regex engine skip text quickly
+_chapter_pattern = re.compile(r'\n##')
+
+
+# returns the markup split before lines beginning with ##, into chunks of at
+# least target_size characters (except the last one)
+def split_chapters(markup, target_size=0):
+    chunks = []
+    start = 0
+    for match in _chapter_pattern.finditer(markup):
+        end = match.start() + 1
+        if end - start >= target_size:
+            chunks.append(markup[start:end])
+            start = end
+    chunks.append(markup[start:])
+    return chunks
+
+
+# Returns a process pool for rendering. Its workers are started by a fork
+# server where possible, as forking while other threads (e.g. the stages
+# below) hold locks may deadlock the workers. They log at the given level,
+# or at the level of this process.
+def create_executor(jobs, log_level=None):
+    mp_context = None
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("forkserver")
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context, initializer=_init_worker,
+                               initargs=(log.level if log_level is None else log_level,))
+
+
+def _init_worker(log_level):
+    log.setLevel(log_level)
+
+
+# Runs independent stages (functions without arguments) in threads and
+# returns their results in order. The first failing stage cancels the work
+# on the process pool (executor) not started yet, which makes the stages
+# waiting for it fail as well. Stages running in this process are not
+# interrupted: its exception is raised once they are done.
+def run_stages(stages, executor=None):
+    stage_executor = ThreadPoolExecutor(max_workers=max(len(stages), 1))
+    try:
+        futures = [stage_executor.submit(stage) for stage in stages]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = [future for future in futures if future in done and future.exception() is not None]
+        if failed:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise failed[0].exception()
+        return [future.result() for future in futures]
+    finally:
+        stage_executor.shutdown()
+
+
+def _parse_chunk(chunk):
+    parser = MarkupParser()
+    return parser.parse(chunk), parser.unclosed_spans
+
+
+# Both take the result of _parse_chunk(chunk) if it is at hand (i.e. not in a worker process).
+def _count_chunk(renderer_class, setup, chunk, parsed=None):
+    document, unclosed_spans = parsed or _parse_chunk(chunk)
+    return renderer_class(setup).count(document.children), unclosed_spans
+
+
+def _render_chunk(renderer_class, setup, chunk, first, last, counters, parsed=None):
+    document, unclosed_spans = parsed or _parse_chunk(chunk)
+    renderer = renderer_class(setup)
+    output = renderer.render_chunk(document.children, first, last, counters)
+    return output, renderer.chapters.chapters
+
+
+class ChapterDocument(object):
+    """
+    Markup that is parsed and rendered chapter-wise, on a process pool and/or
+    with a cache.RenderCache.
+
+    The markup is split into chunks at headlines. A first pass counts the
+    chapters, footnotes and comments of every chunk, so that the second pass
+    renders each chunk with the same numbering as a serial run would. If a
+    span (e.g. a quote) runs across a chunk boundary, the document is parsed
+    and rendered as a whole instead. That also happens on the process pool,
+    so that several formats are rendered in parallel.
+
+    With a cache, chunks have a fixed size. Counts and renderings are looked
+    up by chunk, renderer, setup and numbering offsets, so only chunks that
+    changed (or whose numbering changed) are rendered again.
+    """
+    def __init__(self, markup, executor=None, jobs=1, cache=None, cache_chunk_size=CACHE_CHUNK_SIZE):
+        self.markup = markup
+        self.executor = executor
+        self.jobs = jobs
+        self.cache = cache
+        if cache is None:
+            target_size = len(markup) / float(jobs * CHUNKS_PER_JOB)
+        else:
+            target_size = cache_chunk_size
+        self.chunks = split_chapters(markup, target_size)
+        # parsed chunks, when rendering in this process
+        self._parsed = {}
+        self._chunk_hashes = {}
+
+    def render(self, renderer):
+        setup_hash = None if self.cache is None else setup_fingerprint(renderer.setup)
+        if renderer.chunkable and len(self.chunks) > 1:
+            output = self._render_chunks(renderer, setup_hash)
+            if output is not None:
+                return output
+        [(output, chapters)] = self._map(_render_chunk, 'render', setup_hash,
+                                         [(renderer.__class__, renderer.setup, self.markup, True, True, None)])
+        renderer.reset()
+        renderer.chapters.chapters.extend(chapters)
+        return output
+
+    def _render_chunks(self, renderer, setup_hash):
+        renderer_class = renderer.__class__
+        counted = self._map(_count_chunk, 'count', setup_hash,
+                            [(renderer_class, renderer.setup, chunk) for chunk in self.chunks])
+        if any(unclosed_spans for counts, unclosed_spans in counted[:-1]):
+            log.warning("Markup spans across chapters, cannot render chapters separately.")
+            return None
+
+        # each chunk continues the numbering of the chunks before it
+        chunk_counters = []
+        totals = {}
+        for counts, unclosed_spans in counted:
+            chunk_counters.append(dict(totals))
+            for kind, count in counts.items():
+                totals[kind] = totals.get(kind, 0) + count
+
+        last_index = len(self.chunks) - 1
+        results = self._map(_render_chunk, 'render', setup_hash,
+                            [(renderer_class, renderer.setup, chunk, index == 0, index == last_index, counters)
+                             for index, (chunk, counters) in enumerate(zip(self.chunks, chunk_counters))])
+        renderer.reset()
+        outputs = []
+        for output, chapters in results:
+            outputs.append(output)
+            renderer.chapters.chapters.extend(chapters)
+        log.info("Rendered %s chunks.", len(outputs))
+        return ''.join(outputs)
+
+    # returns function(*arguments) for every argument tuple, taken from the
+    # cache or computed (on the process pool, if there is one)
+    def _map(self, function, kind, setup_hash, argument_tuples):
+        results = [None] * len(argument_tuples)
+        keys = None
+        if self.cache is not None:
+            # the renderer class is represented by its name, setup and chunk by their hashes
+            keys = [self.cache.key(kind, arguments[0].__name__, setup_hash, self._hash(arguments[2]), *arguments[3:])
+                    for arguments in argument_tuples]
+            results = [self.cache.get(key) for key in keys]
+        missing = [index for index, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        if self.executor is None:
+            computed = [function(*argument_tuples[index], parsed=self._parse(argument_tuples[index][2]))
+                        for index in missing]
+        else:
+            chunksize = max(1, len(missing) // (self.jobs * CHUNKS_PER_JOB))
+            computed = self.executor.map(function, *zip(*[argument_tuples[index] for index in missing]),
+                                         chunksize=chunksize)
+        for index, result in zip(missing, computed):
+            results[index] = result
+            if keys is not None:
+                self.cache.put(keys[index], result)
+        return results
+
+    def _parse(self, chunk):
+        if chunk not in self._parsed:
+            self._parsed[chunk] = _parse_chunk(chunk)
+        return self._parsed[chunk]
+
+    def _hash(self, chunk):
+        if chunk not in self._chunk_hashes:
+            self._chunk_hashes[chunk] = hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+        return self._chunk_hashes[chunk]
@@ -14,14 +14,23 @@ LATEX_TEMPLATE = os.path.normpath(os.path.join(dir_path, "latex/latex-document.t
 
 OUTFILE_LATEX_BODY = os.path.normpath("latex/latex-body.tex")
 OUTFILE_LATEX_DOC = os.path.normpath("latex/latex-document.tex")
+# static part of the preamble of the document, precompiled by latexbuild.py
+OUTFILE_LATEX_PREAMBLE = os.path.normpath("latex/latex-preamble.tex")
 
 # Html
 HTML_TEMPLATE = os.path.normpath(os.path.join(dir_path, "html/index.tpl.html"))
 HTML_LICENSE = os.path.normpath(os.path.join(dir_path, "html/license.tpl.html"))
 
 OUTFILE_HTML = os.path.normpath("html/index.html")
+# minified, fingerprinted and compressed copy of the HTML folder (--publish-html)
+HTML_PUBLISH_PATH = os.path.normpath("html-publish")
 PRELIMINARIES_PATH = "bookPreliminaries/"
 APPENDIX_PATH = "bookAppendix/"
+# chapter files of the LaTeX body (--latex-chapters)
+LATEX_CHAPTERS_PATH = "chapters/"
 
 # reStructuredText
-OUTFILE_RESTRUCTURED_TEXT = os.path.normpath("reStructuredText/restructured.txt")
\ No newline at end of file
+OUTFILE_RESTRUCTURED_TEXT = os.path.normpath("reStructuredText/restructured.txt")
+
+# Run profile (--profile)
+OUTFILE_PROFILE = os.path.normpath("textstory-profile.json")
\ No newline at end of file
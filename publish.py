@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+from collections import namedtuple
+import gzip
+import hashlib
+from html import unescape
+import io
+import logging
+import os
+import posixpath
+import re
+
+from logger import log
+
+try:
+    # .br files are written only with the brotli package
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    # web fonts are subset only with the fonttools package
+    from fontTools import subset as font_subset
+    from fontTools.ttLib import TTFont
+    # it logs every table it subsets or drops
+    logging.getLogger("fontTools").setLevel(logging.ERROR)
+except ImportError:
+    font_subset = None
+
+# files compressed in the published folder (if that makes them smaller)
+COMPRESSED_EXTENSIONS = (".html", ".css", ".js", ".svg", ".xml", ".txt", ".ttf", ".otf", ".ico")
+# hex digits of the content hash in the names of fingerprinted files
+FINGERPRINT_LENGTH = 10
+# characters at the beginning of the body of a page taken as above the fold
+CRITICAL_HTML_SIZE = 8 * 1024
+# Critical CSS is not inlined if it is larger than this (about what arrives
+# with the first round trip), the stylesheets are loaded as they are then.
+CRITICAL_CSS_LIMIT = 14 * 1024
+# format of subset fonts
+FONT_FLAVOR = "woff2" if brotli is not None else "woff"
+# fonts referenced from @font-face rules that are subset to the characters of the pages
+FONT_EXTENSIONS = (".ttf", ".otf")
+# characters kept in every subset, e.g. for numbers or text inserted with CSS
+FONT_BASE_CHARACTERS = range(0x20, 0x7f)
+# subset fonts by the hashes of the font and the characters, in the output folder
+FONT_CACHE_PATH = os.path.normpath(".textstory-cache/fonts")
+# Template sources, in the HTML folder if that is the template folder (the
+# default output folder), are not published.
+TEMPLATE_SUFFIX = ".tpl.html"
+TEMPLATES_PATH = "templates"
+# at-rules whose rules are pruned like top level ones
+_CONDITIONAL_AT_RULES = ("@media", "@supports")
+
+# whitespace next to these tags is not rendered
+_BLOCK_TAGS = ("html", "head", "body", "meta", "link", "title", "article", "section", "nav", "div", "p", "h1", "h2",
+               "h3", "h4", "h5", "h6", "ol", "ul", "li", "figure", "figcaption", "br", "hr")
+# comments and elements whose contents are left as they are
+_raw_element_pattern = re.compile(r'(<!--.*?-->|<(pre|textarea|script|style)\b.*?</\2\s*>)',
+                                  re.DOTALL | re.IGNORECASE)
+_block_tag_pattern = "</?(?:%s)\\b[^>]*>" % "|".join(_BLOCK_TAGS)
+_space_after_block_pattern = re.compile(r'(%s)\s+' % _block_tag_pattern, re.IGNORECASE)
+_space_before_block_pattern = re.compile(r'\s+(?=%s)' % _block_tag_pattern, re.IGNORECASE)
+_spaces_pattern = re.compile(r'\s{2,}')
+_css_comment_pattern = re.compile(r'/\*.*?\*/', re.DOTALL)
+_css_space_pattern = re.compile(r'\s*([{};,>])\s*')
+_html_reference_pattern = re.compile(r'(\b(?:href|src)=")([^"]*)(")')
+_srcset_pattern = re.compile(r'(\bsrcset=")([^"]*)(")')
+# the URL of every candidate (URL and width or density) in a srcset
+_srcset_candidate_pattern = re.compile(r'((?:^|,)\s*)([^\s,]+)()')
+_css_reference_pattern = re.compile(r'(url\(\s*["\']?)([^"\')]*)(["\']?\s*\))')
+_tag_name_pattern = re.compile(r'<([a-zA-Z][\w-]*)')
+_class_id_pattern = re.compile(r'\b(class|id)="([^"]*)"')
+_body_pattern = re.compile(r'<body\b[^>]*>', re.IGNORECASE)
+_stylesheet_link_pattern = re.compile(r'<link\b[^>]*\brel="stylesheet"[^>]*>')
+# selector parts that do not require an element, class or id: arguments, attributes, pseudo-classes
+_selector_condition_pattern = re.compile(r'\([^)]*\)|\[[^\]]*\]|::?[\w-]+')
+_selector_name_pattern = re.compile(r'[.#]?-?[_a-zA-Z][\w-]*')
+# markup around the text of a page
+_markup_pattern = re.compile(r'<(style|script)\b.*?</\1\s*>|<!--.*?-->|<[^>]*>', re.DOTALL | re.IGNORECASE)
+_font_format_pattern = re.compile(r'(url\(\s*["\']?[^"\')]*\.(woff2?)["\']?\s*\))\s*format\([^)]*\)')
+_font_style_italic_pattern = re.compile(r'font-style\s*:\s*(italic|oblique)')
+
+PublishResult = namedtuple('PublishResult', ['written_files', 'unchanged_files', 'source_bytes', 'published_bytes'])
+
+
+# Writes the HTML folder (pages and assets) minified and ready to be served
+# with far-future cache headers into the publish folder: every file
+# referenced from a page or stylesheet gets the hash of its content in its
+# name, and the references are rewritten accordingly. Text files get .gz
+# (and, with the brotli package, .br) siblings. Only files whose content
+# changed are written and compressed again, files no longer published are
+# removed. Template sources are left out.
+#
+# With prune, the stylesheets keep only the rules that may match an element
+# of one of the pages. With inline_critical, every page gets the rules for
+# its beginning inlined and loads the stylesheets without blocking
+# rendering. With subset_fonts, the TrueType and OpenType fonts of @font-face
+# rules are published as WOFF2 (WOFF without the brotli package) with only
+# the characters of the pages, and the pages get preload hints for the
+# upright ones. That is skipped if fonttools is not installed. Subset fonts
+# are kept in the font cache folder.
+def publish_html(html_folder_path, publish_folder_path, prune=True, inline_critical=True, subset_fonts=True,
+                 font_cache_folder_path=None):
+    sources = {}
+    for root, dirs, file_names in os.walk(html_folder_path):
+        if root == html_folder_path and TEMPLATES_PATH in dirs:
+            dirs.remove(TEMPLATES_PATH)
+        for file_name in file_names:
+            if file_name.endswith(TEMPLATE_SUFFIX):
+                continue
+            file_path = os.path.join(root, file_name)
+            sources[os.path.relpath(file_path, html_folder_path).replace(os.sep, "/")] = file_path
+
+    contents = {}
+    for name, file_path in sources.items():
+        with open(file_path, "rb") as f:
+            contents[name] = f.read()
+    referenced = set()
+    fonts = set()
+    for name, content in contents.items():
+        if name.endswith((".html", ".css")):
+            for reference in _references(name, content.decode("utf-8")):
+                target = _resolve(name, reference)
+                if target in contents and not target.endswith(".html"):
+                    referenced.add(target)
+            if name.endswith(".css"):
+                fonts.update(font_faces(content.decode("utf-8"), name))
+    fonts = set(font for font in fonts if font in contents and font.endswith(FONT_EXTENSIONS))
+    if not subset_fonts or not fonts:
+        fonts = set()
+    elif font_subset is None:
+        log.info("Install fonttools to publish the web fonts subset to the characters of the pages.")
+        fonts = set()
+
+    pages = dict((name, minify_html(content.decode("utf-8"))) for name, content in contents.items()
+                 if name.endswith(".html"))
+    used_names = set()
+    for page in pages.values():
+        used_names.update(page_names(page))
+    code_points = page_code_points(pages.values()) if fonts else None
+
+    # Assets are renamed after their (minified) content, stylesheets after
+    # the references to the assets in them have been rewritten, pages last.
+    published_names = {}
+    published = {}
+    preloaded_fonts = []
+    for name in sorted(contents, key=lambda name: (name.endswith(".html"), name.endswith(".css"), name)):
+        content = contents[name]
+        stem, extension = posixpath.splitext(name)
+        if name in fonts:
+            subset = subset_font(content, code_points, font_cache_folder_path)
+            if subset is not None:
+                content, extension = subset, "." + FONT_FLAVOR
+        elif name.endswith(".css"):
+            css = _rewrite(content.decode("utf-8"), name, _css_reference_pattern, published_names)
+            css = _font_format_pattern.sub(r'\1 format("\2")', css)
+            if prune:
+                css = prune_css(css, used_names)
+            preloaded_fonts.extend(font for font in font_faces(css, name, italic=False)
+                                   if font.endswith((".woff2", ".woff")) and font not in preloaded_fonts)
+            content = minify_css(css).encode("utf-8")
+        elif name.endswith(".html"):
+            page = _rewrite(pages[name], name, _html_reference_pattern, published_names)
+            page = _srcset_pattern.sub(lambda match: match.group(1) + _rewrite(
+                match.group(2), name, _srcset_candidate_pattern, published_names) + match.group(3), page)
+            page = add_font_preloads(page, name, preloaded_fonts)
+            if inline_critical:
+                page = inline_critical_css(page, name, published)
+            content = page.encode("utf-8")
+        published_name = stem + extension
+        if name in referenced:
+            published_name = "%s.%s%s" % (stem, hashlib.sha1(content).hexdigest()[:FINGERPRINT_LENGTH], extension)
+        published_names[name] = published_name
+        published[published_name] = content
+
+    written_files = unchanged_files = 0
+    for name, content in sorted(published.items()):
+        file_path = os.path.join(publish_folder_path, *name.split("/"))
+        if _write_if_changed(file_path, content):
+            written_files += 1
+        else:
+            unchanged_files += 1
+    _remove_others(publish_folder_path, published)
+    source_bytes = sum(len(content) for content in contents.values())
+    published_bytes = sum(len(content) for content in published.values())
+    log.info("Published HTML: wrote %s files, %s unchanged (%s bytes, minified from %s bytes): %s.",
+             written_files, unchanged_files, published_bytes, source_bytes, publish_folder_path)
+    return PublishResult(written_files, unchanged_files, source_bytes, published_bytes)
+
+
+# Removes comments and whitespace that is not rendered. Whitespace within
+# text is collapsed, but kept, as it separates inline elements and words.
+def minify_html(html):
+    parts = _raw_element_pattern.split(html)
+    minified = []
+    # split() returns the text, a comment or element and its tag name, the next text, ...
+    for index in range(0, len(parts), 3):
+        text = _space_after_block_pattern.sub(r"\1", parts[index])
+        text = _space_before_block_pattern.sub("", text)
+        minified.append(_spaces_pattern.sub(lambda match: "\n" if "\n" in match.group() else " ", text))
+        # comments are removed, except conditional ones
+        if index + 1 < len(parts) and not (parts[index + 1].startswith("<!--")
+                                           and not parts[index + 1].startswith("<!--[if")):
+            minified.append(parts[index + 1])
+    return "".join(minified).strip() + "\n"
+
+
+def minify_css(css):
+    css = _css_comment_pattern.sub("", css)
+    css = _spaces_pattern.sub(" ", css.replace("\r", " ").replace("\n", " ").replace("\t", " "))
+    css = _css_space_pattern.sub(r"\1", css)
+    return css.replace(";}", "}").replace(": ", ":").strip() + "\n"
+
+
+# returns the element names, classes (.name) and ids (#name) in the HTML
+def page_names(html):
+    names = set(tag.lower() for tag in _tag_name_pattern.findall(html))
+    for attribute, value in _class_id_pattern.findall(html):
+        names.update(("." if attribute == "class" else "#") + word for word in value.split())
+    return names
+
+
+# Removes the rules (and selectors of rules) that require an element, class
+# or id not in the names (see page_names), also within @media rules. Other
+# at-rules (@font-face, @keyframes, ...) are kept.
+def prune_css(css, names):
+    pruned = []
+    for prelude, body in _css_blocks(_css_comment_pattern.sub("", css)):
+        if body is None:
+            pruned.append(prelude + ";")
+        elif prelude.startswith(_CONDITIONAL_AT_RULES):
+            body = prune_css(body, names)
+            if body:
+                pruned.append("%s{%s}" % (prelude, body))
+        elif prelude.startswith("@"):
+            pruned.append("%s{%s}" % (prelude, body))
+        else:
+            selectors = [selector.strip() for selector in re.split(r',(?![^(]*\))', prelude)
+                         if _may_match(selector, names)]
+            if selectors:
+                pruned.append("%s{%s}" % (",".join(selectors), body))
+    return "".join(pruned)
+
+
+# Inlines the rules of the page's stylesheets that its beginning (above the
+# fold) needs, and turns the links to the stylesheets into ones loading them
+# without blocking rendering (with a fallback without JavaScript).
+# stylesheets are the published ones by name.
+def inline_critical_css(html, name, stylesheets):
+    body = _body_pattern.search(html)
+    if body is None:
+        return html
+    links = list(_stylesheet_link_pattern.finditer(html, 0, body.start()))
+    names = page_names(html[:body.end() + CRITICAL_HTML_SIZE])
+    critical = []
+    for link in links:
+        reference = _html_reference_pattern.search(link.group())
+        stylesheet_name = reference and _resolve(name, reference.group(2))
+        if stylesheet_name not in stylesheets:
+            # not a stylesheet of the folder, the page is left as it is
+            return html
+        critical.append(_rebase(prune_css(stylesheets[stylesheet_name].decode("utf-8"), names), stylesheet_name,
+                                name))
+    critical = "".join(critical)
+    if not links or len(critical) > CRITICAL_CSS_LIMIT:
+        return html
+    parts = [html[:links[0].start()], "<style>%s</style>" % critical]
+    position = links[0].start()
+    for link in links:
+        parts.append(html[position:link.start()])
+        parts.append(link.group().replace('rel="stylesheet"', 'rel="preload" as="style" '
+                                                              'onload="this.onload=null;this.rel=\'stylesheet\'"'))
+        parts.append("<noscript>%s</noscript>" % link.group())
+        position = link.end()
+    parts.append(html[position:])
+    return "".join(parts)
+
+
+# returns the characters in the text of the pages (and FONT_BASE_CHARACTERS), as code points
+def page_code_points(pages):
+    code_points = set(FONT_BASE_CHARACTERS)
+    for page in pages:
+        code_points.update(ord(char) for char in unescape(_markup_pattern.sub("", page)))
+    return code_points
+
+
+# returns the names of the files the @font-face rules in the CSS of the named
+# stylesheet refer to, only those of upright fonts if italic is False
+def font_faces(css, name, italic=True):
+    fonts = []
+    for prelude, body in _css_blocks(_css_comment_pattern.sub("", css)):
+        if prelude.lower() != "@font-face" or body is None:
+            continue
+        if not italic and _font_style_italic_pattern.search(body):
+            continue
+        for match in _css_reference_pattern.finditer(body):
+            font = _resolve(name, match.group(2))
+            if font is not None:
+                fonts.append(font)
+    return fonts
+
+
+# Returns the font (the content of a TrueType or OpenType file) with only the
+# glyphs for the code points, as FONT_FLAVOR, or None if fonttools cannot
+# read it. With a cache folder, subset fonts are kept there by the hashes of
+# the font and the code points.
+def subset_font(content, code_points, cache_folder_path=None):
+    code_points_hash = hashlib.sha1(",".join("%x" % code_point for code_point in sorted(code_points)).encode("ascii"))
+    cache_file_path = cache_folder_path and os.path.join(cache_folder_path, "%s-%s.%s" % (
+        hashlib.sha1(content).hexdigest()[:16], code_points_hash.hexdigest()[:16], FONT_FLAVOR))
+    if cache_file_path and os.path.isfile(cache_file_path):
+        with open(cache_file_path, "rb") as f:
+            return f.read()
+    try:
+        font = TTFont(io.BytesIO(content), recalcTimestamp=False)
+        options = font_subset.Options()
+        options.flavor = FONT_FLAVOR
+        subsetter = font_subset.Subsetter(options)
+        subsetter.populate(unicodes=code_points)
+        subsetter.subset(font)
+        output = io.BytesIO()
+        font.flavor = FONT_FLAVOR
+        font.save(output)
+    except Exception as e:
+        log.warning("Cannot subset a font, publishing it as it is: %s", e)
+        return None
+    subset = output.getvalue()
+    if cache_file_path:
+        os.makedirs(cache_folder_path, exist_ok=True)
+        with open(cache_file_path, "wb") as f:
+            f.write(subset)
+    return subset
+
+
+# Adds preload hints for the fonts (published names) to the head of the
+# named page, before its stylesheets, so that the fonts are loaded right
+# away and not only once the CSS has been applied.
+def add_font_preloads(html, name, fonts):
+    body = _body_pattern.search(html)
+    position = html.find("<link", 0, body.start() if body else len(html))
+    if not fonts or position == -1:
+        return html
+    hints = "".join('<link rel="preload" href="%s" as="font" type="font/%s" crossorigin>'
+                    % (posixpath.relpath(font, posixpath.dirname(name) or "."), posixpath.splitext(font)[1][1:])
+                    for font in fonts)
+    return html[:position] + hints + html[position:]
+
+
+# returns (prelude, body) of every top level rule, body is None for statements like @import
+def _css_blocks(css):
+    blocks = []
+    start = body_start = depth = 0
+    quote = None
+    for index, char in enumerate(css):
+        if quote:
+            if char == quote and css[index - 1] != "\\":
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            if depth == 0:
+                body_start = index + 1
+            depth += 1
+        elif char == "}" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                blocks.append((css[start:body_start - 1].strip(), css[body_start:index]))
+                start = index + 1
+        elif char == ";" and depth == 0:
+            if css[start:index].strip():
+                blocks.append((css[start:index].strip(), None))
+            start = index + 1
+    return blocks
+
+
+# whether the selector may match an element, i.e. the names it requires are all given
+def _may_match(selector, names):
+    for name in _selector_name_pattern.findall(_selector_condition_pattern.sub("", selector)):
+        if (name if name[0] in ".#" else name.lower()) not in names:
+            return False
+    return True
+
+
+# rewrites the references in the CSS of a stylesheet for inlining it into the named page
+def _rebase(css, stylesheet_name, name):
+    def replace(match):
+        target = _resolve(stylesheet_name, match.group(2))
+        if target is None:
+            return match.group()
+        return match.group(1) + posixpath.relpath(target, posixpath.dirname(name) or ".") + match.group(3)
+    return _css_reference_pattern.sub(replace, css)
+
+
+# returns the name of the file a relative reference in the named file points to
+def _resolve(name, reference):
+    if not reference or "://" in reference or reference.startswith(("/", "#", "data:", "mailto:")):
+        return None
+    return posixpath.normpath(posixpath.join(posixpath.dirname(name), reference.split("#")[0].split("?")[0]))
+
+
+# returns the references in the named page or stylesheet
+def _references(name, text):
+    if name.endswith(".css"):
+        return [match.group(2) for match in _css_reference_pattern.finditer(text)]
+    references = [match.group(2) for match in _html_reference_pattern.finditer(text)]
+    for match in _srcset_pattern.finditer(text):
+        references.extend(candidate.group(2) for candidate in _srcset_candidate_pattern.finditer(match.group(2)))
+    return references
+
+
+def _rewrite(text, name, pattern, published_names):
+    def replace(match):
+        target = _resolve(name, match.group(2))
+        if target not in published_names or published_names[target] == target:
+            return match.group()
+        reference = posixpath.relpath(published_names[target], posixpath.dirname(name) or ".")
+        return match.group(1) + reference + match.group(3)
+    return pattern.sub(replace, text)
+
+
+# Writes the file and its compressed siblings (.gz, .br) where they do not
+# have this content already, each on its own, so that missing siblings are
+# written even for an unchanged file. Returns whether any was written.
+def _write_if_changed(file_path, content):
+    written = False
+    if _read_file(file_path) != content:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(content)
+        written = True
+    if not file_path.endswith(COMPRESSED_EXTENSIONS):
+        return written
+    for extension, compress, decompress in _compressions():
+        compressed_file_path = file_path + extension
+        compressed_content = _read_file(compressed_file_path)
+        try:
+            if compressed_content is not None and decompress(compressed_content) == content:
+                continue
+        except Exception:
+            # not compressed properly, written again
+            pass
+        compressed_content = compress(content)
+        if len(compressed_content) < len(content):
+            with open(compressed_file_path, "wb") as f:
+                f.write(compressed_content)
+            written = True
+        elif os.path.exists(compressed_file_path):
+            os.remove(compressed_file_path)
+    return written
+
+
+# returns (extension, compress, decompress) of the compressed siblings of text files
+def _compressions():
+    compressions = [(".gz", lambda content: gzip.compress(content, compresslevel=9, mtime=0), gzip.decompress)]
+    if brotli is not None:
+        compressions.append((".br", brotli.compress, brotli.decompress))
+    return compressions
+
+
+def _read_file(file_path):
+    try:
+        with open(file_path, "rb") as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+def _remove_others(publish_folder_path, published):
+    for root, dirs, file_names in os.walk(publish_folder_path):
+        for file_name in file_names:
+            file_path = os.path.join(root, file_name)
+            name = os.path.relpath(file_path, publish_folder_path).replace(os.sep, "/")
+            stem, extension = posixpath.splitext(name)
+            if name not in published and not (extension in (".gz", ".br") and stem in published):
+                os.remove(file_path)
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+import re
+import tempfile
+
+from escaperoutes import escape_routes
+
+
+class ChapterCollector(object):
+    def __init__(self, first_index=0):
+        self.first_index = first_index
+        self.chapters = []
+
+    def add_chapter(self, name):
+        label_text = str(self.count()) + name
+        self.chapters.append({'id': label_text, 'name': name})
+        return label_text
+
+    def count(self):
+        return self.first_index + len(self.chapters)
+
+
+class Renderer(object):
+    """
+    Walks the document tree built by markup.MarkupParser and writes one output
+    format. Subclasses implement render_<kind> for every node kind.
+
+    A document may also be rendered in consecutive chunks (see parallel.py):
+    each chunk then starts with the counters (chapters, footnotes, ...) of
+    all chunks before it.
+
+    All state of a rendering is kept in the renderer (and set by reset()),
+    nothing in the module or the setup. A renderer renders one document at
+    a time, but any number of renderers may render concurrently in threads.
+    """
+    # name of the EscapeRoute attribute holding this format's escapes
+    escape_format = None
+    # (old, new) replacements applied to every text node, in order
+    text_replacements = ()
+    # node kinds that are numbered throughout the document
+    numbered_kinds = ('headline',)
+    # whether the output of consecutive chunks can simply be joined
+    chunkable = True
+
+    def __init__(self, setup):
+        self.setup = setup
+        self.escapes = dict((name, getattr(route, self.escape_format)) for name, route in escape_routes.items())
+        self._parts = []
+        self.reset()
+
+    def render(self, document):
+        return self.render_chunk(document.children)
+
+    def render_chunk(self, nodes, first=True, last=True, counters=None):
+        self._parts = []
+        self.reset(counters or {})
+        if first:
+            self.begin_document()
+        self.render_nodes(nodes)
+        if last:
+            self.end_document()
+        return self._take_output()
+
+    # renders a document given as consecutive lists of top level nodes (see
+    # stream.py) and yields the output of each list as soon as it is rendered
+    def render_sections(self, sections):
+        self._parts = []
+        self.reset()
+        self.begin_document()
+        for nodes in sections:
+            self.render_nodes(nodes)
+            yield self._take_output()
+        self.end_document()
+        yield self._take_output()
+
+    def _take_output(self):
+        output = ''.join(self._parts)
+        self._parts = []
+        return output
+
+    # sets all per-document state, counters start at the given values
+    def reset(self, counters=None):
+        self.chapters = ChapterCollector((counters or {}).get('headline', 0))
+
+    # node kinds whose contents are not rendered at all
+    def hidden_kinds(self):
+        return ()
+
+    # counts the numbered node kinds the way render_nodes would number them
+    def count(self, nodes):
+        counts = dict((kind, 0) for kind in self.numbered_kinds)
+        hidden = self.hidden_kinds()
+        pending = list(nodes)
+        while pending:
+            node = pending.pop()
+            if node.kind in hidden:
+                continue
+            if node.kind in counts:
+                counts[node.kind] += 1
+            if node.kind == 'image':
+                if node.title is not None:
+                    pending.extend(node.title.children)
+            elif hasattr(node, 'children'):
+                pending.extend(node.children)
+        return counts
+
+    def render_nodes(self, nodes):
+        for node in nodes:
+            getattr(self, 'render_' + node.kind)(node)
+
+    # renders nodes into a string instead of the output
+    def capture(self, nodes):
+        start = len(self._parts)
+        self.render_nodes(nodes)
+        captured = ''.join(self._parts[start:])
+        del self._parts[start:]
+        return captured
+
+    def write(self, s):
+        self._parts.append(s)
+
+    def convert_text(self, text):
+        for old, new in self.text_replacements:
+            text = text.replace(old, new)
+        return text
+
+    # renders text without text replacements (e.g. file paths)
+    def verbatim(self, container):
+        return ''.join(node.text if node.kind == 'text' else self.escapes[node.name] for node in container.children)
+
+    def begin_document(self):
+        pass
+
+    def end_document(self):
+        pass
+
+    def render_text(self, node):
+        self.write(self.convert_text(node.text))
+
+    def render_escape(self, node):
+        self.write(self.escapes[node.name])
+
+
+class HtmlRenderer(Renderer):
+    escape_format = 'html'
+    text_replacements = (("---", "&mdash;"), ("--", "&ndash;"), ("...", "&hellip;"))
+    numbered_kinds = ('headline', 'footnote', 'side_comment')
+
+    def __init__(self, setup):
+        self.show_comments = setup.general.output_mode == "draft"
+        super(HtmlRenderer, self).__init__(setup)
+
+    def reset(self, counters=None):
+        super(HtmlRenderer, self).reset(counters)
+        counters = counters or {}
+        self.footnote_count = counters.get('footnote', 0)
+        self.comment_count = counters.get('side_comment', 0)
+        self._quote_depth = 0
+        # Every line becomes a paragraph. Its opening tag is written lazily,
+        # as headlines and images replace the paragraph of their line.
+        self._pending_paragraph = None
+        self._after_block = False
+
+    def hidden_kinds(self):
+        if self.show_comments:
+            return ()
+        return ('inline_comment', 'side_comment')
+
+    def begin_document(self):
+        self.write("<section>\n")
+        self._pending_paragraph = "<p>"
+
+    def end_document(self):
+        if not self._after_block:
+            self.write("</p>")
+        self.write("\n</section>")
+
+    def write(self, s):
+        if self._pending_paragraph:
+            self._parts.append(self._pending_paragraph)
+            self._pending_paragraph = None
+        self._parts.append(s)
+
+    def _begin_block(self):
+        self._pending_paragraph = None
+        self._after_block = True
+
+    def _break_line(self, separator, paragraph):
+        if not self._after_block:
+            self.write("</p>")
+        self.write(separator)
+        self._after_block = False
+        self._pending_paragraph = paragraph
+
+    def render_paragraph_break(self, node):
+        # Paragraphs within quotations are not indented.
+        self._break_line("\n\n", '<p>' if self._quote_depth else '<p class="indent">')
+
+    def render_section_break(self, node):
+        self._break_line("\n</section>\n\n\n<section>\n", "<p>")
+
+    def render_headline(self, node):
+        self._begin_block()
+        text = self.capture(node.children)
+        self.chapters.add_chapter(text)
+        self.write("<h2>%s</h2>" % text)
+
+    def render_image(self, node):
+        self._begin_block()
+        self.write('<figure class="textimage">\n')
+        path = self.verbatim(node.path)
+        image = self.setup.html.responsive_images.get(path)
+        if image is None:
+            self.write('<img src="%s" alt="%s"  />\n' % (path, self.capture(node.alt.children)))
+        else:
+            self.write('<img src="%s" srcset="%s" sizes="%s" width="%s" height="%s" alt="%s" loading="lazy" '
+                       'decoding="async" />\n' % (image.src, image.srcset, image.sizes, image.width, image.height,
+                                                  self.capture(node.alt.children)))
+        if node.title is not None:
+            self.write("<figcaption>")
+            self.render_nodes(node.title.children)
+            self.write("</figcaption>\n")
+        self.write("</figure>")
+
+    def render_quote(self, node):
+        self._quote_depth += 1
+        self.write("»")
+        self.render_nodes(node.children)
+        self.write("«")
+        self._quote_depth -= 1
+
+    def render_bold(self, node):
+        self.write("<strong>")
+        self.render_nodes(node.children)
+        self.write("</strong>")
+
+    def render_italic(self, node):
+        self.write("<em>")
+        self.render_nodes(node.children)
+        self.write("</em>")
+
+    def render_footnote(self, node):
+        self.footnote_count += 1
+        self.write('<label for="sn-tufte-handout%d" class="margin-toggle sidenote-number">'
+                   '</label><input type="checkbox" id="sn-tufte-handout%d" class="margin-toggle"/>'
+                   '<span class="sidenote">' % (self.footnote_count, self.footnote_count))
+        self.render_nodes(node.children)
+        self.write("</span>")
+
+    def render_highlight(self, node):
+        if self.show_comments:
+            self.write('<span class="highlighted">')
+            self.render_nodes(node.children)
+            self.write("</span>")
+        else:
+            self.render_nodes(node.children)
+
+    def render_inline_comment(self, node):
+        # TODO may create empty <p>-tags and so mess with text indent
+        if self.show_comments:
+            self.write('<span class="inline-comment">')
+            self.render_nodes(node.children)
+            self.write("</span>")
+
+    def render_side_comment(self, node):
+        if self.show_comments:
+            self.comment_count += 1
+            self.write('<label for="sn-tufte-comment%d" class="margin-toggle sidenote-comment-number">'
+                       '</label><input type="checkbox" id="sn-tufte-comment%d" class="margin-toggle"/>'
+                       '<span class="sidenote-comment">' % (self.comment_count, self.comment_count))
+            self.render_nodes(node.children)
+            self.write("</span>")
+
+
+class LatexRenderer(Renderer):
+    escape_format = 'latex'
+    text_replacements = (("...", r"{\dots}"),)
+
+    def __init__(self, setup):
+        super(LatexRenderer, self).__init__(setup)
+        self.chapter_pagebreak = setup.latex.chapter_pagebreak
+        self.hide_chapter_header = setup.latex.hide_chapter_header
+
+    def render_paragraph_break(self, node):
+        self.write("\n\n")
+
+    def render_section_break(self, node):
+        self.write("\n\n\\vspace{0.5cm}\\noindent\n")
+
+    def render_headline(self, node):
+        text = self.capture(node.children)
+        old_chapter_count = self.chapters.count()
+        label_text = self.chapters.add_chapter(text)
+        result = "\n{\\label{%s}\\vspace{0.5cm}\\noindent\\LARGE %s}\n\\renewcommand{\\storychapter}{%s}" \
+                 % (label_text, text, text,)
+        if self.chapter_pagebreak and old_chapter_count > 0:
+            result = "\\clearpage\n\n" + result
+        if self.hide_chapter_header:
+            result += "\n\\thispagestyle{empty}"
+        self.write(result)
+
+    def render_image(self, node):
+        self.write("\\begin{figure}[!ht]\n\\centering\n")
+        max_height = "1.0\\textheight"
+        caption = ""
+        if node.title is not None:
+            max_height = "0.9\\textheight"
+            caption = "\\caption*{%s}\n" % self.capture(node.title.children)
+        path = self.verbatim(node.path)
+        self.write("\\includegraphics[max height=%s,max width=1.0\\textwidth]{%s}\n"
+                   % (max_height, self.setup.latex.print_images.get(path, path)))
+        self.write(caption)
+        self.write("\\end{figure}")
+
+    def render_quote(self, node):
+        # Paragraphs within quotations should not be indented.
+        quote = self.capture(node.children).replace("\n\n", "\n\n\\noindent\n")
+        self.write("\\enquote{%s}" % quote)
+
+    def render_bold(self, node):
+        self.write("{\\boldfont\\textbf{%s}}" % self.capture(node.children))
+
+    def render_italic(self, node):
+        text = self.capture(node.children)
+        if "\n" in text:  # itshape works over multiple lines but gets easily disturbed
+            self.write("\\begin{itshape}%s\\end{itshape}" % text)
+        else:  # \textit can be combined with \textbf etc. but does not work over multiple lines
+            self.write("\\textit{%s}" % text)
+
+    def render_footnote(self, node):
+        self.write("\\footnote{%s}" % self.capture(node.children))
+
+    def render_highlight(self, node):
+        self.write("\\wiggle{%s}" % self.capture(node.children))
+
+    def render_inline_comment(self, node):
+        # TODO when not in draft mode there are cases where inline comments create empty lines
+        self.write("{\\todo[inline]{%s}}" % self.capture(node.children))
+
+    def render_side_comment(self, node):
+        self.write("{\\todo{%s}}" % self.capture(node.children))
+
+
+class ReStructuredTextRenderer(Renderer):
+    escape_format = 'restructured_text'
+    text_replacements = (("---", "\u2014"), ("--", "\u2013"))
+    # footnotes are collected at the very end of the document
+    chunkable = False
+
+    def reset(self, counters=None):
+        super(ReStructuredTextRenderer, self).reset(counters)
+        self.footnotes = []
+
+    def end_document(self):
+        self.write("\n\n")
+        self.write("".join(self.footnotes))
+
+    def render_sections(self, sections):
+        # footnotes wait in a temporary file instead of memory
+        with tempfile.TemporaryFile("w+", encoding="utf-8", newline="") as footnotes_file:
+            for output in super(ReStructuredTextRenderer, self).render_sections(sections):
+                footnotes_file.writelines(self.footnotes)
+                del self.footnotes[:]
+                yield output
+            footnotes_file.seek(0)
+            while True:
+                footnotes = footnotes_file.read(64 * 1024)
+                if not footnotes:
+                    break
+                yield footnotes
+
+    def render_paragraph_break(self, node):
+        self.write("\n")
+
+    def render_section_break(self, node):
+        self.write("\n\n")
+
+    def render_headline(self, node):
+        text = self.capture(node.children)
+        self.chapters.add_chapter(text)
+        self.write("%s\n%s" % (text, "^" * (len(text) + 1)))  # TODO best character for this?
+
+    def render_image(self, node):
+        self.write("\n.. figure:: %s\n  :alt: %s\n  :align: center\n\n"
+                   % (self.verbatim(node.path), self.capture(node.alt.children)))
+        if node.title is not None:
+            self.write("  %s\n\n" % self.capture(node.title.children))
+
+    def render_quote(self, node):
+        self.write("»")
+        self.render_nodes(node.children)
+        self.write("«")
+
+    def render_bold(self, node):
+        # Make bold text work across sections
+        text = re.sub("\n(\n+)", r"**\n\1**", self.capture(node.children))
+        self.write("**%s**" % text)
+
+    def render_italic(self, node):
+        # Make italics work across sections
+        text = re.sub("\n(\n+)", r"*\n\1*", self.capture(node.children))
+        self.write("*%s*" % text)
+
+    def render_footnote(self, node):
+        self.footnotes.append(".. [#] %s\n" % self.capture(node.children))
+        self.write("[#]_")
+
+    # Do not show any comments (for now)
+    def render_highlight(self, node):
+        self.render_nodes(node.children)
+
+    def render_inline_comment(self, node):
+        pass
+
+    def render_side_comment(self, node):
+        pass
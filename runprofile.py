@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+import json
+import os
+import threading
+import time
+
+from logger import log
+
+
+class RunProfile(object):
+    """
+    Records the steps of a build (reading, parsing, rendering, template
+    substitution, writing, asset syncing) with their wall time, input and
+    output size and counts, from any thread.
+
+    Sizes are in characters for text and in bytes for assets. Steps of
+    stages running concurrently overlap, so their times may add up to more
+    than the total.
+    """
+    def __init__(self):
+        self.steps = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    # Measures the step in the with block, which may set 'output_size' and
+    # add 'counts' on the record it gets.
+    @contextmanager
+    def measure(self, stage, step, input_size=None):
+        record = {'stage': stage, 'step': step, 'input_size': input_size, 'output_size': None, 'counts': {}}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['start'] = start - self._start
+            record['seconds'] = time.perf_counter() - start
+            with self._lock:
+                self.steps.append(record)
+
+    def report(self):
+        with self._lock:
+            steps = sorted(self.steps, key=lambda record: record['start'])
+        return {'seconds': time.perf_counter() - self._start, 'steps': steps}
+
+    # returns the report as a table, slowest steps first
+    def summary(self):
+        report = self.report()
+        lines = ["%-18s %-11s %9s %12s %12s  %s" % ("stage", "step", "ms", "input", "output", "counts")]
+        for record in sorted(report['steps'], key=lambda record: record['seconds'], reverse=True):
+            counts = ", ".join("%s: %s" % item for item in sorted(record['counts'].items()))
+            lines.append("%-18s %-11s %9.1f %12s %12s  %s" % (record['stage'], record['step'], 1000 * record['seconds'],
+                                                              _size(record['input_size']),
+                                                              _size(record['output_size']), counts))
+        lines.append("%-18s %-11s %9.1f" % ("total", "", 1000 * report['seconds']))
+        return "\n".join(lines)
+
+    def write(self, file_path):
+        folder_path = os.path.dirname(file_path)
+        if folder_path and not os.path.exists(folder_path):
+            os.makedirs(folder_path, exist_ok=True)
+        temporary_file_path = file_path + ".tmp"
+        with open(temporary_file_path, "wb") as f:
+            f.write(json.dumps(self.report(), sort_keys=True, indent=1).encode("utf-8"))
+        os.replace(temporary_file_path, file_path)
+        log.info("Wrote run profile: %s.", file_path)
+
+
+# the step measured by the profile, if there is one
+def measure(profile, stage, step, input_size=None):
+    if profile is None:
+        return nullcontext({'counts': {}})
+    return profile.measure(stage, step, input_size)
+
+
+# returns the number of nodes of every kind in the tree below the nodes
+def count_nodes(nodes):
+    counts = Counter()
+    pending = list(nodes)
+    while pending:
+        node = pending.pop()
+        counts[node.kind] += 1
+        if node.kind == 'image':
+            if node.title is not None:
+                pending.extend(node.title.children)
+        elif hasattr(node, 'children'):
+            pending.extend(node.children)
+    return dict(counts)
+
+
+def _size(size):
+    return "" if size is None else str(size)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+import argparse
+import asyncio
+from collections import OrderedDict
+import functools
+import hashlib
+import json
+import logging
+import os
+from urllib.parse import urlsplit
+
+import toml
+
+from filt0r import HTML, LATEX_BODY, RESTRUCTURED_TEXT, render
+from logger import log
+from parallel import create_executor
+from textstory_setup import Setup
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8001
+# renderings waiting for a worker beyond the ones being rendered, more are refused
+DEFAULT_QUEUE_SIZE = 32
+# upper limit for the cached responses
+RESPONSE_CACHE_SIZE = 64 * 1024 * 1024
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+# formats: content type
+CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'latex': 'application/x-latex; charset=utf-8',
+    'rst': 'text/x-rst; charset=utf-8',
+}
+# formats: format of filt0r.render()
+_render_formats = {'html': HTML, 'latex': LATEX_BODY, 'rst': RESTRUCTURED_TEXT}
+
+_reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+            500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="filt0r.py serve",
+                                     description="Serve renderings of textstory markup on localhost. POST a JSON "
+                                                 "object with markup, setup (TOML) and format (html, latex or rst) "
+                                                 "to /render.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="address to listen on (default: %s)" % DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="port (default: %s)" % DEFAULT_PORT)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of rendering processes (default: number of CPUs)")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="renderings waiting for a process before requests are refused with 503 (default: %s)"
+                             % DEFAULT_QUEUE_SIZE)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(RenderService(args.host, args.port, args.workers, args.queue_size).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+@functools.lru_cache(maxsize=64)
+def _load_setup(setup_string):
+    return Setup(None, None, setup_toml=toml.loads(setup_string))
+
+
+# Renders in a worker process. Returns the HTTP status and the output (or the
+# error). Errors are returned as text, as not all exceptions can be pickled.
+def render_preview(markup, setup_string, output_format):
+    try:
+        setup = _load_setup(setup_string)
+    except Exception as e:
+        return 400, "Invalid setup: %s: %s" % (type(e).__name__, e)
+    try:
+        render_format = _render_formats[output_format]
+        return 200, render(markup, setup, (render_format,))[render_format]
+    except Exception as e:
+        log.exception("Rendering failed")
+        return 500, "Rendering failed: %s: %s" % (type(e).__name__, e)
+
+
+class RenderService(object):
+    """
+    HTTP/1.1 service on asyncio rendering markup on a pool of warm worker
+    processes (which keep imports, templates and setups loaded).
+
+    At most workers + queue_size renderings are pending, further requests are
+    refused with 503 right away. Responses are cached by a hash of format,
+    setup and markup, and identical requests share a pending rendering.
+    """
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=1, queue_size=DEFAULT_QUEUE_SIZE,
+                 cache_size=RESPONSE_CACHE_SIZE):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.cache_size = cache_size
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        self.refused = 0
+        self.executor = None
+        self.server = None
+        # key: (status, encoded output), least recently used first
+        self._responses = OrderedDict()
+        self._responses_size = 0
+        # key: task of the pending rendering, returning the response
+        self._renderings = {}
+
+    async def start(self):
+        self.executor = create_executor(self.workers, logging.WARNING)
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        log.info("Serving renderings on http://%s:%s/render with %s workers.", self.host, self.port, self.workers)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                length = int(headers.get('content-length', 0))
+                if length > MAX_REQUEST_SIZE:
+                    status, content_type, body = 413, 'text/plain; charset=utf-8', b"Request too large."
+                    keep_alive = False
+                else:
+                    request_body = await reader.readexactly(length)
+                    status, content_type, body = await self._respond(method, urlsplit(target).path, request_body)
+                self._write_response(writer, status, content_type, body, keep_alive)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            log.debug("Closing connection: %s", e)
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _write_response(writer, status, content_type, body, keep_alive):
+        headers = ["HTTP/1.1 %s %s" % (status, _reasons[status]),
+                   "Content-Type: %s" % content_type,
+                   "Content-Length: %s" % len(body),
+                   "Connection: %s" % ("keep-alive" if keep_alive else "close")]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body)
+
+    async def _respond(self, method, path, request_body):
+        if path == '/health':
+            stats = {'pending': self.pending, 'max_pending': self.max_pending, 'hits': self.hits,
+                     'misses': self.misses, 'refused': self.refused, 'cached': len(self._responses)}
+            return 200, 'application/json', json.dumps(stats, sort_keys=True).encode('utf-8')
+        if path != '/render':
+            return 404, 'text/plain; charset=utf-8', b"Not found."
+        if method != 'POST':
+            return 405, 'text/plain; charset=utf-8', b"Use POST."
+        try:
+            request = json.loads(request_body.decode('utf-8'))
+            markup = request['markup']
+            setup_string = request.get('setup', "")
+            output_format = request.get('format', 'html')
+            if output_format not in CONTENT_TYPES or not isinstance(markup, str) \
+                    or not isinstance(setup_string, str):
+                raise ValueError("expected markup and setup strings and format html, latex or rst")
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, 'text/plain; charset=utf-8', ("Invalid request: %s" % e).encode('utf-8')
+
+        status, body = await self._render(markup, setup_string, output_format)
+        if status != 200:
+            return status, 'text/plain; charset=utf-8', body
+        return status, CONTENT_TYPES[output_format], body
+
+    async def _render(self, markup, setup_string, output_format):
+        key = hashlib.sha1(json.dumps([output_format, setup_string, markup]).encode('utf-8')).hexdigest()
+        response = self._responses.get(key)
+        if response is not None:
+            self.hits += 1
+            self._responses.move_to_end(key)
+            return response
+        rendering = self._renderings.get(key)
+        if rendering is None:
+            if self.pending >= self.max_pending:
+                self.refused += 1
+                return 503, b"Too many renderings pending, try again later."
+            self.misses += 1
+            rendering = asyncio.ensure_future(self._render_response(key, markup, setup_string, output_format))
+            self._renderings[key] = rendering
+            self.pending += 1
+        # shielded, so that a client going away does not cancel it for the others
+        return await asyncio.shield(rendering)
+
+    # renders on a worker, returns and caches the response
+    async def _render_response(self, key, markup, setup_string, output_format):
+        try:
+            status, output = await asyncio.get_running_loop().run_in_executor(self.executor, render_preview, markup,
+                                                                              setup_string, output_format)
+        finally:
+            self.pending -= 1
+            del self._renderings[key]
+        response = status, output.encode('utf-8')
+        if status != 500:
+            self._cache(key, response)
+        return response
+
+    def _cache(self, key, response):
+        self._responses[key] = response
+        self._responses_size += len(response[1])
+        while self._responses_size > self.cache_size:
+            self._responses_size -= len(self._responses.popitem(last=False)[1][1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+import io
+import os
+import re
+
+from logger import log
+from markup import MarkupParser
+
+# characters read and rendered at once
+STREAM_SECTION_SIZE = 64 * 1024
+# Longest span (e.g. a quote) kept together, in characters. Beyond it, the
+# opening delimiter is taken literally, so that memory stays bounded.
+STREAM_SPAN_LIMIT = 1024 * 1024
+
+_newlines_pattern = re.compile(r'[\r\n]*')
+
+
+# Yields the document in a file in sections of about section_size characters,
+# cut after line breaks. Joined, they are the same as
+# DocumentReader(file_path).get_string().
+def read_sections(file_path, section_size=STREAM_SECTION_SIZE):
+    if not os.path.isfile(file_path):
+        raise SystemExit("File not found: %s" % file_path)
+    log.info("Reading file: %s.", file_path)
+    buffer = ""
+    started = False
+    try:
+        with io.open(file_path, encoding="utf-8", newline="") as f:
+            while True:
+                data = f.read(section_size)
+                if not data:
+                    break
+                if not started:
+                    # leading whitespace of the document is dropped
+                    data = data.lstrip()
+                    started = bool(data)
+                buffer += data
+                if len(buffer) < section_size:
+                    continue
+                cut = _find_cut(buffer)
+                if cut:
+                    yield buffer[:cut]
+                    buffer = buffer[cut:]
+    except UnicodeDecodeError:
+        raise SystemExit("Cannot read '" + file_path + "': UnicodeDecodeError.")
+    buffer = buffer.rstrip()
+    if buffer:
+        yield buffer
+
+
+# Returns the position after the last line break(s) followed by text, or 0.
+# The parser starts a new line there just like in the whole document, and
+# stripping the end of the document cannot affect what comes before.
+def _find_cut(buffer):
+    text_end = len(buffer.rstrip())
+    line_end = max(buffer.rfind('\n', 0, text_end), buffer.rfind('\r', 0, text_end))
+    if line_end < 0:
+        return 0
+    return _newlines_pattern.match(buffer, line_end).end()
+
+
+class StreamedDocument(object):
+    """
+    Markup that is read, parsed and rendered section by section, so that
+    memory does not grow with the size of the document (but with the size of
+    its longest line and span).
+
+    render() returns an iterator over the output of one section after the
+    other, to be written out right away. Sections containing the beginning
+    of a span are joined with the following ones until the span closes.
+    """
+    def __init__(self, file_path, section_size=STREAM_SECTION_SIZE, span_limit=STREAM_SPAN_LIMIT):
+        if not os.path.isfile(file_path):
+            raise SystemExit("File not found: %s" % file_path)
+        self.file_path = file_path
+        self.section_size = section_size
+        self.span_limit = span_limit
+
+    def render(self, renderer):
+        return renderer.render_sections(self._parse_sections())
+
+    # yields the top level nodes of every section
+    def _parse_sections(self):
+        pending = ""
+        document = None
+        for markup in read_sections(self.file_path, self.section_size):
+            pending += markup
+            parser = MarkupParser()
+            document = parser.parse(pending)
+            if parser.unclosed_spans:
+                if len(pending) < self.span_limit:
+                    continue
+                log.warning("Markup span longer than %s characters, its delimiter is taken literally.",
+                            self.span_limit)
+            yield document.children
+            pending = ""
+        if pending:
+            yield document.children
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+import os
+import string
+import threading
+
+from documentreader import DocumentReader
+
+# file path: (modification time, size, loaded file)
+_loaded_files = {}
+_lock = threading.Lock()
+
+
+class CompiledTemplate(object):
+    """
+    A string.Template split once into literal segments and placeholders, so
+    that substituting it does not scan the template again.
+
+    parts() returns the segments with the values in between instead of
+    joining them, so that a large value (or an iterable of strings, such as
+    a rendered stream.StreamedDocument) can be written out without copying.
+    """
+    def __init__(self, template_string):
+        # literals[i] precedes names[i], the last literal ends the template
+        self.literals = []
+        self.names = []
+        literal = []
+        pos = 0
+        for match in string.Template.pattern.finditer(template_string):
+            literal.append(template_string[pos:match.start()])
+            pos = match.end()
+            name = match.group('named') or match.group('braced')
+            if name is not None:
+                self.literals.append(''.join(literal))
+                self.names.append(name)
+                literal = []
+            elif match.group('escaped') is not None:
+                literal.append(string.Template.delimiter)
+            else:
+                raise ValueError("Invalid placeholder in template at position %s" % match.start('invalid'))
+        literal.append(template_string[pos:])
+        self.literals.append(''.join(literal))
+
+    def parts(self, **values):
+        parts = []
+        for literal, name in zip(self.literals, self.names):
+            parts.append(literal)
+            value = values[name]
+            # iterators are written piece by piece
+            parts.append(value if isinstance(value, str) or hasattr(value, '__next__') else '%s' % (value,))
+        parts.append(self.literals[-1])
+        return parts
+
+    def substitute(self, **values):
+        return ''.join(self.parts(**values))
+
+
+# Returns the template in the file, loaded only if the file changed since
+# the last call. Returns None for an empty file.
+def load_template(file_path):
+    return _load(file_path, 'template', lambda file_string: CompiledTemplate(file_string) if file_string else None)
+
+
+# Returns the (stripped) string in the file, loaded only if the file changed
+# since the last call.
+def load_text(file_path):
+    return _load(file_path, 'text', lambda file_string: file_string)
+
+
+def _load(file_path, kind, convert):
+    key = (file_path, kind)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        raise SystemExit("File not found: %s" % file_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        loaded = _loaded_files.get(key)
+        if loaded is not None and loaded[0] == version:
+            return loaded[1]
+    value = convert(DocumentReader(file_path).get_string())
+    with _lock:
+        _loaded_files[key] = (version, value)
+    return value
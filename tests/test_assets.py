@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+import os
+import shutil
+import tempfile
+
+from assets import HARDLINK, REFLINK, SyncResult, list_files, sync_assets
+
+
+class TestAssets(TestCase):
+    def setUp(self):
+        self.work_folder_path = tempfile.mkdtemp()
+        self.source_folder_path = os.path.join(self.work_folder_path, "source")
+        self.output_folder_path = os.path.join(self.work_folder_path, "output")
+        self.write("a.txt", b"aaaa")
+        self.write(os.path.join("img", "b.png"), b"bb")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_folder_path)
+
+    def write(self, name, content, mtime_ns=None):
+        file_path = os.path.join(self.source_folder_path, name)
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        with open(file_path, "wb") as f:
+            f.write(content)
+        if mtime_ns is not None:
+            os.utime(file_path, ns=(mtime_ns, mtime_ns))
+
+    def read(self, name):
+        with open(os.path.join(self.output_folder_path, "assets", name), "rb") as f:
+            return f.read()
+
+    def sync(self, link=None):
+        return sync_assets(list_files(self.source_folder_path, os.path.join(self.output_folder_path, "assets")),
+                           self.output_folder_path, link)
+
+    def test_sync(self):
+        self.assertEqual(SyncResult(2, 6, 0, 0), self.sync())
+        self.assertEqual(b"bb", self.read(os.path.join("img", "b.png")))
+        self.assertEqual(SyncResult(0, 0, 2, 6), self.sync())
+
+        # touched without changes
+        self.write("a.txt", b"aaaa", 10 ** 18)
+        self.assertEqual(SyncResult(0, 0, 2, 6), self.sync())
+        self.write("a.txt", b"cccc", 10 ** 18 + 1)
+        self.assertEqual(SyncResult(1, 4, 1, 2), self.sync())
+        self.assertEqual(b"cccc", self.read("a.txt"))
+
+        # changed or removed copies are copied again
+        os.remove(os.path.join(self.output_folder_path, "assets", "a.txt"))
+        self.assertEqual(SyncResult(1, 4, 1, 2), self.sync())
+        self.assertEqual(b"cccc", self.read("a.txt"))
+
+        # copies without source are removed
+        os.remove(os.path.join(self.source_folder_path, "a.txt"))
+        self.assertEqual(SyncResult(0, 0, 1, 2), self.sync())
+        self.assertFalse(os.path.exists(os.path.join(self.output_folder_path, "assets", "a.txt")))
+
+    def test_links(self):
+        self.sync(HARDLINK)
+        self.assertTrue(os.path.samefile(os.path.join(self.source_folder_path, "a.txt"),
+                                         os.path.join(self.output_folder_path, "assets", "a.txt")))
+        shutil.rmtree(self.output_folder_path)
+        # falls back to copying on file systems without reflinks
+        self.assertEqual(SyncResult(2, 6, 0, 0), self.sync(REFLINK))
+        self.assertEqual(b"aaaa", self.read("a.txt"))
+
+    def test_output_folder_with_sources(self):
+        # the default output folder is the one with the templates
+        for link in (None, HARDLINK):
+            self.assertEqual(SyncResult(0, 0, 2, 6),
+                             sync_assets(list_files(self.source_folder_path, self.source_folder_path),
+                                         self.source_folder_path, link))
+            with open(os.path.join(self.source_folder_path, "a.txt"), "rb") as f:
+                self.assertEqual(b"aaaa", f.read())
+            self.assertEqual([], [name for root, dirs, names in os.walk(self.source_folder_path)
+                                  for name in names if name.endswith(".tmp")])
+            shutil.rmtree(os.path.join(self.source_folder_path, ".textstory-cache"))
+
+    def test_relinked_source_changed(self):
+        self.sync(HARDLINK)
+        # changes the copy as well, which is the same file
+        self.write("a.txt", b"cccc", 10 ** 18)
+        self.assertEqual(SyncResult(0, 0, 2, 6), self.sync(HARDLINK))
+        self.assertEqual(b"cccc", self.read("a.txt"))
+        self.assertFalse(os.path.exists(os.path.join(self.output_folder_path, "assets", "a.txt.tmp")))
+
+    def test_unreadable_manifest(self):
+        self.sync()
+        with open(os.path.join(self.output_folder_path, ".textstory-cache", "asset-manifest.json"), "wb") as f:
+            f.write(b"{")
+        self.assertEqual(SyncResult(2, 6, 0, 0), self.sync())
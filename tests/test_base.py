@@ -5,9 +5,9 @@ from __future__ import unicode_literals
 from unittest import TestCase
 
 
-from distutils import dir_util, file_util
 from inspect import currentframe
 import os
+import shutil
 
 
 test_data_folder_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test_data")
@@ -23,7 +23,7 @@ class TestBase(TestCase):
         cls.output_html_folder_path = os.path.join(cls.output_folder_path, "html")
         cls.output_html_index_file_path = os.path.join(cls.output_html_folder_path, "index.html")
         cls.failure_folder_path = os.path.join(test_data_folder_path, "_failed")
-        # dir_util.remove_tree(cls.failure_folder_path)  # TODO remove only once before all test
+        # shutil.rmtree(cls.failure_folder_path)  # TODO remove only once before all test
 
     @classmethod
     def set_paths(cls, test_folder_path):
@@ -52,17 +52,17 @@ class TestBase(TestCase):
         first_file = self.read_file(expected_file_path)
         second_file = self.read_file(actual_file_path)
         if first_file != second_file:
-            dir_util.mkpath(self.failure_folder_path)
+            os.makedirs(self.failure_folder_path, exist_ok=True)
             split = os.path.split(expected_file_path)
             failure_file_prefix = currentframe().f_back.f_code.co_name
             first_fail_path = os.path.join(self.failure_folder_path, failure_file_prefix + "_expected_" + split[len(split) - 1])
-            file_util.copy_file(expected_file_path, first_fail_path, update=1)
+            shutil.copy2(expected_file_path, first_fail_path)
             split = os.path.split(actual_file_path)
             second_fail_path = os.path.join(self.failure_folder_path, failure_file_prefix + "_actual_" + split[len(split) - 1])
-            file_util.copy_file(actual_file_path, second_fail_path, update=1)
+            shutil.copy2(actual_file_path, second_fail_path)
             self.fail("{0} does not match {1}".format(expected_file_path, actual_file_path))
 
     def tearDown(self):
         # Cleanup
         if os.path.exists(self.output_folder_path):
-            dir_util.remove_tree(self.output_folder_path)
+            shutil.rmtree(self.output_folder_path)
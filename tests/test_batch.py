@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from test_base import test_data_folder_path
+
+import json
+import os
+import shutil
+import tempfile
+
+from batch import BATCH_SUMMARY_FILE, BUILT, FAILED, SKIPPED, find_projects, run_batch
+from paths import OUTFILE_HTML, OUTFILE_LATEX_BODY, OUTFILE_LATEX_DOC
+
+
+class TestBatch(TestCase):
+    test_names = ("comments-on", "table-of-contents")
+
+    def setUp(self):
+        self.work_folder_path = tempfile.mkdtemp()
+        self.projects_folder_path = os.path.join(self.work_folder_path, "projects")
+        for test_name in self.test_names:
+            shutil.copytree(os.path.join(test_data_folder_path, test_name, "src"),
+                            os.path.join(self.projects_folder_path, test_name, "src"))
+        broken_folder_path = os.path.join(self.projects_folder_path, "series", "broken")
+        os.makedirs(broken_folder_path)
+        with open(os.path.join(broken_folder_path, "textstory.txt"), "wb") as f:
+            f.write(b"text")
+        with open(os.path.join(broken_folder_path, "setup.toml"), "wb") as f:
+            f.write(b"[broken")
+        self.output_folder_path = os.path.join(self.work_folder_path, "output")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_folder_path)
+
+    def read_file(self, file_path):
+        with open(file_path, "rb") as f:
+            return f.read()
+
+    def statuses(self, summary):
+        return dict((result['name'], result['status']) for result in summary['projects'])
+
+    def test_find_projects(self):
+        projects = find_projects(self.projects_folder_path, self.output_folder_path)
+        self.assertEqual(["comments-on", "series/broken", "table-of-contents"], [project.name for project in projects])
+        self.assertEqual(os.path.join(self.output_folder_path, "comments-on"), projects[0].output_folder_path)
+
+    def test_run_batch(self):
+        summary = run_batch(self.projects_folder_path, self.output_folder_path, jobs=2)
+        self.assertEqual({"comments-on": BUILT, "series/broken": FAILED, "table-of-contents": BUILT},
+                         self.statuses(summary))
+        self.assertEqual(summary, json.loads(self.read_file(os.path.join(self.output_folder_path,
+                                                                         BATCH_SUMMARY_FILE)).decode("utf-8")))
+        for test_name in self.test_names:
+            for file_name in (OUTFILE_LATEX_BODY, OUTFILE_LATEX_DOC, OUTFILE_HTML):
+                self.assertEqual(self.read_file(os.path.join(test_data_folder_path, test_name, "expected", file_name)),
+                                 self.read_file(os.path.join(self.output_folder_path, test_name, file_name)))
+
+        # up to date projects are skipped, changed ones converted again
+        summary = run_batch(self.projects_folder_path, self.output_folder_path)
+        self.assertEqual({"comments-on": SKIPPED, "series/broken": FAILED, "table-of-contents": SKIPPED},
+                         self.statuses(summary))
+        with open(os.path.join(self.projects_folder_path, "comments-on", "src", "textstory.txt"), "ab") as f:
+            f.write(b"\nMore.")
+        summary = run_batch(self.projects_folder_path, self.output_folder_path)
+        self.assertEqual({"comments-on": BUILT, "series/broken": FAILED, "table-of-contents": SKIPPED},
+                         self.statuses(summary))
+
+        # as well as projects whose images changed
+        image_folder_path = os.path.join(self.projects_folder_path, "comments-on", "src", "img")
+        os.makedirs(image_folder_path)
+        with open(os.path.join(image_folder_path, "secret-message.png"), "wb") as f:
+            f.write(b"image")
+        summary = run_batch(self.projects_folder_path, self.output_folder_path)
+        self.assertEqual({"comments-on": BUILT, "series/broken": FAILED, "table-of-contents": SKIPPED},
+                         self.statuses(summary))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from test_base import test_data_folder_path
+
+import os
+import shutil
+import tempfile
+
+from cache import RenderCache
+from documentreader import DocumentReader
+from markup import parse_markup
+from parallel import ChapterDocument
+from renderers import HtmlRenderer, LatexRenderer, ReStructuredTextRenderer
+from textstory_setup import Setup
+
+
+class TestRenderCache(TestCase):
+    @classmethod
+    def setup_class(cls):
+        input_folder_path = os.path.join(test_data_folder_path, "comments-on", "src")
+        cls.setup = Setup(os.path.join(input_folder_path, "setup.toml"), None)
+        cls.markup = DocumentReader(os.path.join(input_folder_path, "textstory.txt")).get_string()
+
+    def setUp(self):
+        self.cache_folder_path = tempfile.mkdtemp()
+        self.cache_file_path = os.path.join(self.cache_folder_path, "cache.pickle")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_folder_path)
+
+    def check_same_as_serial(self, markup, cache):
+        document = parse_markup(markup)
+        cached_document = ChapterDocument(markup, cache=cache, cache_chunk_size=1000)
+        for renderer_class in (HtmlRenderer, LatexRenderer, ReStructuredTextRenderer):
+            serial_renderer = renderer_class(self.setup)
+            cached_renderer = renderer_class(self.setup)
+            self.assertEqual(serial_renderer.render(document), cached_document.render(cached_renderer))
+            self.assertEqual(serial_renderer.chapters.chapters, cached_renderer.chapters.chapters)
+
+    def test_rebuild(self):
+        markup = "\n\n".join([self.markup] * 3)
+        cache = RenderCache(self.cache_file_path)
+        self.check_same_as_serial(markup, cache)
+        cache.save()
+
+        # a new footnote in the first chapter shifts the numbering of all following ones
+        changed_markup = markup.replace("\n", "[new footnote]\n", 3)
+        cache = RenderCache(self.cache_file_path)
+        self.check_same_as_serial(changed_markup, cache)
+        self.assertTrue(cache.hits > 0)
+        self.assertTrue(cache.misses > 0)
+
+        # unchanged markup is taken from the cache entirely
+        cache = RenderCache(self.cache_file_path)
+        self.check_same_as_serial(markup, cache)
+        self.assertEqual(0, cache.misses)
+
+    def test_least_recently_used_eviction(self):
+        cache = RenderCache(self.cache_file_path, max_size=150)
+        cache.put("a", "a" * 50)
+        cache.put("b", "b" * 50)
+        self.assertEqual("a" * 50, cache.get("a"))
+        cache.put("c", "c" * 50)
+        self.assertEqual("a" * 50, cache.get("a"))
+        self.assertEqual(None, cache.get("b"))
+        self.assertEqual("c" * 50, cache.get("c"))
+
+    def test_unreadable_cache_file(self):
+        with open(self.cache_file_path, "wb") as f:
+            f.write(b"no pickle")
+        cache = RenderCache(self.cache_file_path)
+        self.assertEqual(None, cache.get("a"))
+        cache.put("a", 1)
+        cache.save()
+        self.assertEqual(1, RenderCache(self.cache_file_path).get("a"))
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from escaperoutes import escape, escape_all, escape_to_html, escape_to_latex, escape_to_restructured_text, \
+    get_escape
+
+
+class TestEscapeRoutes(TestCase):
+    def test_escape_to_formats(self):
+        escaped = escape_all('a \\-- b \\\\ c \\* & d < 50% ~')
+        self.assertEqual('a -- b \\ c * &amp; d &lt; 50% ~', escape_to_html(escaped))
+        self.assertEqual('a \\verb|--| b \\textbackslash{} c * \\& d < 50\\%  \\textasciitilde{}',
+                         escape_to_latex(escaped))
+        self.assertEqual('a -- b \\\\ c \\* & d \\< 50% ~', escape_to_restructured_text(escaped))
+
+    def test_escaped_backslash_before_escape(self):
+        # an escaped backslash followed by an asterisk, not a backslash followed by an escaped asterisk
+        self.assertEqual(get_escape("\\") + "*", escape_all('\\\\*'))
+        self.assertEqual(get_escape("\\") + get_escape("*"), escape_all('\\\\\\*'))
+
+    def test_single_backslash_stays_text(self):
+        self.assertEqual('\\&amp; \\&lt;', escape_to_html(escape_all('\\& \\<')))
+
+    def test_escape_single_route(self):
+        escaped = escape('\\* \\_', "*")
+        self.assertEqual(get_escape("*") + ' \\_', escaped)
+        self.assertEqual('* \\_', escape_to_html(escaped))
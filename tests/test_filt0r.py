@@ -4,9 +4,21 @@ from __future__ import unicode_literals
 
 from test_base import TestBase, test_data_folder_path
 
+from concurrent.futures import ThreadPoolExecutor
+import json
 import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+import toml
 
 import filt0r
+from paths import OUTFILE_PROFILE, OUTFILE_RESTRUCTURED_TEXT
+from textstory_setup import Setup
 
 
 class TestFilt0r(TestBase):
@@ -82,3 +94,242 @@ class TestFilt0r(TestBase):
 
         # Compare Html document with expected
         self.compare_file_contents(self.expected_html_index_file_path, self.output_html_index_file_path)
+
+    # Test LaTeX and Html output when chapters are rendered in parallel processes
+    def test_parallel_chapters(self):
+        for test_name in ("table-of-contents", "comments-on", "pirates-in-the-sea-of-blood"):
+            # Test paths
+            test_folder_path = os.path.join(test_data_folder_path, test_name)
+            self.set_paths(test_folder_path)
+
+            # Execute LaTeX and Html creation
+            filt0r.run(self.setup_file_path, self.input_file_path, self.output_folder_path, jobs=2)
+
+            # Compare LaTeX body, LaTeX document and Html document with expected
+            self.compare_file_contents(self.expected_latex_body_file_path, self.output_latex_body_file_path)
+            self.compare_file_contents(self.expected_latex_document_file_path, self.output_latex_document_file_path)
+            self.compare_file_contents(self.expected_html_index_file_path, self.output_html_index_file_path)
+
+    # Test reStructuredText file creation next to LaTeX and Html
+    def test_restructured_text(self):
+        # Test paths
+        test_folder_path = os.path.join(test_data_folder_path, "comments-on")
+        self.set_paths(test_folder_path)
+
+        # Execute LaTeX, Html and reStructuredText creation
+        filt0r.run(self.setup_file_path, self.input_file_path, self.output_folder_path, restructured_text=True)
+
+        # Compare reStructuredText with the one created on its own
+        restructured_text = filt0r.create_restructured_text(self.setup_file_path, self.input_file_path)
+        self.assertEqual(restructured_text.encode("utf-8"),
+                         self.read_file(os.path.join(self.output_folder_path, OUTFILE_RESTRUCTURED_TEXT)))
+        self.compare_file_contents(self.expected_html_index_file_path, self.output_html_index_file_path)
+
+    # Test LaTeX and Html output when rendered from the cache of a previous run and without cache
+    def test_cache(self):
+        # Test paths
+        test_folder_path = os.path.join(test_data_folder_path, "table-of-contents")
+        self.set_paths(test_folder_path)
+
+        for cache in (True, True, False):
+            # Execute LaTeX and Html creation
+            filt0r.run(self.setup_file_path, self.input_file_path, self.output_folder_path, cache=cache)
+
+            # Compare LaTeX body, LaTeX document and Html document with expected
+            self.compare_file_contents(self.expected_latex_body_file_path, self.output_latex_body_file_path)
+            self.compare_file_contents(self.expected_latex_document_file_path, self.output_latex_document_file_path)
+            self.compare_file_contents(self.expected_html_index_file_path, self.output_html_index_file_path)
+
+    # Test LaTeX, Html and reStructuredText output when the document is streamed section by section
+    def test_stream(self):
+        for test_name in ("table-of-contents", "comments-on", "pirates-in-the-sea-of-blood"):
+            # Test paths
+            test_folder_path = os.path.join(test_data_folder_path, test_name)
+            self.set_paths(test_folder_path)
+
+            # Execute LaTeX, Html and reStructuredText creation
+            filt0r.run(self.setup_file_path, self.input_file_path, self.output_folder_path, restructured_text=True,
+                       stream=True)
+
+            # Compare LaTeX body, LaTeX document, Html document and reStructuredText with expected
+            self.compare_file_contents(self.expected_latex_body_file_path, self.output_latex_body_file_path)
+            self.compare_file_contents(self.expected_latex_document_file_path, self.output_latex_document_file_path)
+            self.compare_file_contents(self.expected_html_index_file_path, self.output_html_index_file_path)
+            restructured_text = filt0r.create_restructured_text(self.setup_file_path, self.input_file_path)
+            self.assertEqual(restructured_text.encode("utf-8"),
+                             self.read_file(os.path.join(self.output_folder_path, OUTFILE_RESTRUCTURED_TEXT)))
+
+    # Test LaTeX, Html and reStructuredText rendered in memory, without writing files
+    def test_render(self):
+        # Test paths
+        test_folder_path = os.path.join(test_data_folder_path, "comments-on")
+        self.set_paths(test_folder_path)
+        restructured_text = filt0r.create_restructured_text(self.setup_file_path, self.input_file_path)
+        markup = self.read_file(self.input_file_path).decode("utf-8")
+        with open(self.setup_file_path, "rb") as f:
+            setup_toml = toml.loads(f.read().decode("utf-8"))
+
+        formats = (filt0r.HTML, filt0r.LATEX, filt0r.LATEX_BODY, filt0r.RESTRUCTURED_TEXT)
+        with mock.patch("os.makedirs", side_effect=AssertionError), \
+                mock.patch("filt0r.write_output", side_effect=AssertionError):
+            # setup given as Setup (with the output folder of the expected LaTeX document) and as dict
+            outputs = filt0r.render(markup, Setup(None, None, self.output_folder_path, setup_toml), formats, "utf-8")
+            html = filt0r.render(markup, setup_toml)[filt0r.HTML]
+
+        self.assertEqual(self.read_file(self.expected_html_index_file_path), outputs[filt0r.HTML])
+        self.assertEqual(self.read_file(self.expected_latex_document_file_path), outputs[filt0r.LATEX])
+        self.assertEqual(self.read_file(self.expected_latex_body_file_path), outputs[filt0r.LATEX_BODY])
+        self.assertEqual(restructured_text.encode("utf-8"), outputs[filt0r.RESTRUCTURED_TEXT])
+        self.assertEqual(outputs[filt0r.HTML], html.encode("utf-8"))
+        self.assertRaises(ValueError, filt0r.render, markup, setup_toml, ("pdf",))
+
+    # Test that documents rendered in parallel threads equal those rendered one after the other
+    def test_render_threads(self):
+        formats = (filt0r.HTML, filt0r.LATEX, filt0r.RESTRUCTURED_TEXT)
+        projects = []
+        for test_name in ("pirates-in-the-sea-of-blood", "comments-off", "comments-on", "table-of-contents"):
+            input_folder_path = os.path.join(test_data_folder_path, test_name, "src")
+            setup = Setup(os.path.join(input_folder_path, "setup.toml"), None)
+            markup = self.read_file(os.path.join(input_folder_path, "textstory.txt")).decode("utf-8")
+            projects.append((markup, setup))
+        projects = [projects[index % len(projects)] for index in range(64)]
+        expected = [filt0r.render(markup, setup, formats) for markup, setup in projects]
+
+        barrier = threading.Barrier(len(projects))
+
+        def render(project):
+            barrier.wait()
+            return filt0r.render(project[0], project[1], formats)
+
+        switch_interval = sys.getswitchinterval()
+        # switching threads often makes them interleave within renderings
+        sys.setswitchinterval(1e-6)
+        try:
+            with ThreadPoolExecutor(max_workers=len(projects)) as executor:
+                outputs = list(executor.map(render, projects))
+        finally:
+            sys.setswitchinterval(switch_interval)
+        self.assertEqual(expected, outputs)
+
+    # Test the run profile written next to the outputs
+    def test_profile(self):
+        # Test paths
+        test_folder_path = os.path.join(test_data_folder_path, "comments-on")
+        self.set_paths(test_folder_path)
+
+        for stream in (False, True):
+            # Execute LaTeX, Html and reStructuredText creation
+            filt0r.run(self.setup_file_path, self.input_file_path, self.output_folder_path, restructured_text=True,
+                       cache=False, stream=stream, profile=True)
+            self.compare_file_contents(self.expected_html_index_file_path, self.output_html_index_file_path)
+
+            report = json.loads(self.read_file(os.path.join(self.output_folder_path, OUTFILE_PROFILE)).decode("utf-8"))
+            steps = dict(((record['stage'], record['step']), record) for record in report['steps'])
+            for stage in (filt0r.LATEX, filt0r.HTML, filt0r.RESTRUCTURED_TEXT):
+                self.assertTrue((stage, 'render') in steps)
+            self.assertTrue((filt0r.ASSETS, 'sync') in steps)
+            self.assertEqual(len(self.read_file(self.expected_html_index_file_path).decode("utf-8")),
+                             steps[(filt0r.HTML, 'write')]['output_size'])
+            self.assertTrue(all(0 <= record['seconds'] <= report['seconds'] for record in report['steps']))
+            if not stream:
+                self.assertEqual(3, steps[(filt0r.DOCUMENT, 'parse')]['counts']['headline'])
+
+    # Test LaTeX bodies split into chapter files and the chapters typeset
+    def test_latex_chapters(self):
+        # Test paths
+        test_folder_path = os.path.join(test_data_folder_path, "table-of-contents")
+        self.set_paths(test_folder_path)
+        self.assertEqual([3, 5, 6, 7], filt0r.parse_chapters("3,5-7"))
+
+        work_folder_path = tempfile.mkdtemp()
+        try:
+            input_file_path = os.path.join(work_folder_path, "textstory.txt")
+            shutil.copy2(self.input_file_path, input_file_path)
+            latex_folder_path = os.path.join(work_folder_path, "output", "latex")
+
+            def convert(latex_chapters):
+                filt0r.run(self.setup_file_path, input_file_path, os.path.dirname(latex_folder_path),
+                           latex_chapters=latex_chapters)
+                document = self.read_file(os.path.join(latex_folder_path, "latex-document.tex")).decode("utf-8")
+                return [line for line in document.splitlines() if line.startswith("\\includeonly")]
+
+            # all chapters, the same LaTeX as a single body
+            self.assertEqual([], convert(filt0r.ALL_CHAPTERS))
+            self.compare_file_contents(self.expected_latex_document_file_path,
+                                       os.path.join(latex_folder_path, "latex-document.tex"))
+            chapter_file_names = sorted(os.listdir(os.path.join(latex_folder_path, "chapters")))
+            self.assertEqual(["chapter-%03d.tex" % number for number in range(1, 67)], chapter_file_names)
+            body = self.read_file(os.path.join(latex_folder_path, "latex-body.tex")).decode("utf-8")
+            self.assertEqual(["\\include{chapters/%s}" % file_name[:-4] for file_name in chapter_file_names],
+                             body.splitlines())
+            self.assertEqual(self.read_file(self.expected_latex_body_file_path),
+                             b"".join(self.read_file(os.path.join(latex_folder_path, "chapters", file_name))
+                                      for file_name in chapter_file_names))
+
+            # given chapters
+            self.assertEqual(["\\includeonly{chapters/chapter-002,chapters/chapter-005}"], convert([2, 5, 99]))
+
+            # changed chapters, the same ones again if nothing changed
+            with open(input_file_path, "rb") as f:
+                markup = f.read().decode("utf-8")
+            with open(input_file_path, "wb") as f:
+                f.write(markup.replace("Das Ziel der Reise", "Das Ende der Reise").encode("utf-8"))
+            self.assertEqual(["\\includeonly{chapters/chapter-002}"], convert(filt0r.CHANGED_CHAPTERS))
+            self.assertEqual(["\\includeonly{chapters/chapter-002}"], convert(filt0r.CHANGED_CHAPTERS))
+
+            # the text before the first chapter starts no new page
+            with open(input_file_path, "wb") as f:
+                f.write(("Vorwort.\n\n" + markup).encode("utf-8"))
+            convert(filt0r.ALL_CHAPTERS)
+            body = self.read_file(os.path.join(latex_folder_path, "latex-body.tex")).decode("utf-8")
+            self.assertEqual(["\\input{chapters/chapter-000}", "\\include{chapters/chapter-001}"],
+                             body.splitlines()[:2])
+        finally:
+            shutil.rmtree(work_folder_path)
+
+    # Test HTML pages of single chapters
+    def test_html_chapters(self):
+        # Test paths
+        test_folder_path = os.path.join(test_data_folder_path, "comments-on")
+        self.set_paths(test_folder_path)
+
+        work_folder_path = tempfile.mkdtemp()
+        try:
+            input_file_path = os.path.join(work_folder_path, "textstory.txt")
+            shutil.copy2(self.input_file_path, input_file_path)
+
+            def convert(name, cache):
+                output_folder_path = os.path.join(work_folder_path, name)
+                filt0r.run(self.setup_file_path, input_file_path, output_folder_path, cache=cache, html_chapters=True)
+                html_folder_path = os.path.join(output_folder_path, "html")
+                return dict((file_name, self.read_file(os.path.join(html_folder_path, file_name)).decode("utf-8"))
+                            for file_name in os.listdir(html_folder_path) if file_name.endswith(".html"))
+
+            # the same pages, rendered chunk by chunk or as a whole
+            pages = convert("cached", True)
+            self.assertEqual(pages, convert("uncached", False))
+            self.assertEqual(["chapter-001.html", "chapter-002.html", "chapter-003.html", "index.html"],
+                             sorted(pages))
+            self.assertEqual(["chapter-001.html", "chapter-002.html", "chapter-003.html"],
+                             re.findall(r'<li><a href="([^"]*)">', pages["index.html"]))
+            # every chapter once, sidenotes numbered from 1 on every page
+            expected_html = self.read_file(self.expected_html_index_file_path).decode("utf-8")
+            for number, headline in enumerate(re.findall(r'<h2>.*</h2>', expected_html), 1):
+                page = pages["chapter-%03d.html" % number]
+                self.assertEqual([headline], re.findall(r'<h2>.*</h2>', page))
+                self.assertEqual(number > 1, 'rel="prev"' in page)
+                self.assertEqual(number < 3, 'rel="next"' in page)
+            self.assertEqual(["sn-tufte-handout1"],
+                             re.findall(r'id="(sn-tufte-handout\d+)"', pages["chapter-002.html"]))
+
+            # a removed chapter, the pages before it are kept
+            html_folder_path = os.path.join(work_folder_path, "cached", "html")
+            modified = os.stat(os.path.join(html_folder_path, "chapter-001.html")).st_mtime_ns
+            with open(input_file_path, "rb") as f:
+                markup = f.read().decode("utf-8")
+            with open(input_file_path, "wb") as f:
+                f.write(markup.replace("##Kapitel 3", "Kapitel 3").encode("utf-8"))
+            self.assertEqual(["chapter-001.html", "chapter-002.html", "index.html"], sorted(convert("cached", True)))
+            self.assertEqual(modified, os.stat(os.path.join(html_folder_path, "chapter-001.html")).st_mtime_ns)
+        finally:
+            shutil.rmtree(work_folder_path)
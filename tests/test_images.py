@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase, skipIf
+from test_base import test_data_folder_path
+
+import os
+import re
+import shutil
+import tempfile
+
+import filt0r
+import images
+from images import PRINT_IMAGE_CACHE_PATH, PRINT_IMAGE_PATH, WEB_IMAGE_CACHE_PATH, WEB_IMAGE_PATH, Image, \
+    create_print_images, create_web_images, find_images
+from paths import HTML_PUBLISH_PATH, OUTFILE_LATEX_BODY
+
+
+class TestImages(TestCase):
+    def setUp(self):
+        self.work_folder_path = tempfile.mkdtemp()
+        self.source_folder_path = os.path.join(self.work_folder_path, "source")
+        self.output_folder_path = os.path.join(self.work_folder_path, "output")
+        self.html_folder_path = os.path.join(self.output_folder_path, "html")
+        os.makedirs(os.path.join(self.source_folder_path, "img"))
+        shutil.copy(os.path.join(test_data_folder_path, "comments-on", "src", "setup.toml"), self.source_folder_path)
+        with open(os.path.join(self.source_folder_path, "textstory.txt"), "wb") as f:
+            f.write(b'## One\n\nText.\n\n![A photo](img/photo.jpg "Caption")\n\n## Two\n\n![A drawing](img/drawing.png)\n'
+                    b'\n![Missing](img/missing.png)\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_folder_path)
+
+    def run_filt0r(self, **kwargs):
+        filt0r.run(os.path.join(self.source_folder_path, "setup.toml"),
+                   os.path.join(self.source_folder_path, "textstory.txt"), self.output_folder_path, **kwargs)
+        with open(os.path.join(self.html_folder_path, "index.html"), "rb") as f:
+            return f.read().decode("utf-8")
+
+    def test_find_images(self):
+        self.assertEqual(["img/a.jpg", "img/b.png"],
+                         find_images(['![A](img/a.jpg "a")\r\nText ![B](img/c.jpg)\n', '![A](img/a.jpg)\n',
+                                      '![B](img/b.png)']))
+
+    def test_without_pillow(self):
+        with open(os.path.join(self.source_folder_path, "img", "photo.jpg"), "wb") as f:
+            f.write(b"photo")
+        Image = images.Image
+        images.Image = None
+        try:
+            index = self.run_filt0r()
+        finally:
+            images.Image = Image
+        self.assertTrue('<img src="img/photo.jpg" alt="A photo"  />' in index)
+        with open(os.path.join(self.output_folder_path, OUTFILE_LATEX_BODY), "rb") as f:
+            self.assertTrue("{img/photo.jpg}" in f.read().decode("utf-8"))
+        self.assertFalse(os.path.exists(os.path.join(self.html_folder_path, WEB_IMAGE_PATH, "photo.jpg")))
+
+    @skipIf(Image is None, "Pillow is not installed")
+    def test_web_images(self):
+        self.write_image("photo.jpg", (2000, 1000), "RGB")
+        self.write_image("drawing.png", (300, 200), "RGBA")
+        index = self.run_filt0r(publish=True)
+        [photo, drawing] = re.findall(r'<img [^>]*alt="A [^>]*>', index)
+        self.assertTrue(re.match(r'<img src="img-web/photo-[0-9a-f]{16}-1600\.jpg" srcset="img-web/photo-[0-9a-f]{16}'
+                                 r'-480\.jpg 480w, .*-800\.jpg 800w, .*-1200\.jpg 1200w, .*-1600\.jpg 1600w" '
+                                 r'sizes="[^"]+" width="1600" height="800" alt="A photo" loading="lazy" '
+                                 r'decoding="async" />', photo))
+        self.assertTrue(re.match(r'<img src="img-web/drawing-[0-9a-f]{16}-300\.png" srcset="[^" ]* 300w" .*'
+                                 r'width="300" height="200"', drawing))
+        self.assertTrue('<img src="img/missing.png" alt="Missing"  />' in index)
+        for name in re.findall(r'img-web/([^" ]*)', photo + drawing):
+            image = Image.open(os.path.join(self.html_folder_path, WEB_IMAGE_PATH, name))
+            self.assertEqual(int(re.search(r'-(\d+)\.', name).group(1)), image.width)
+        self.assertEqual(5, len(os.listdir(os.path.join(self.html_folder_path, WEB_IMAGE_PATH))))
+        # the published page refers to the published variants
+        publish_folder_path = os.path.join(self.output_folder_path, HTML_PUBLISH_PATH)
+        with open(os.path.join(publish_folder_path, "index.html"), "rb") as f:
+            srcset = re.search(r'srcset="([^"]*)"', f.read().decode("utf-8")).group(1)
+        for candidate in srcset.split(", "):
+            self.assertTrue(os.path.isfile(os.path.join(publish_folder_path, *candidate.split()[0].split("/"))))
+
+        # unchanged images are taken from the cache, variants of changed ones replace the old ones
+        cache_folder_path = os.path.join(self.output_folder_path, WEB_IMAGE_CACHE_PATH)
+        result = create_web_images(["img/photo.jpg", "img/drawing.png"], self.source_folder_path,
+                                   self.html_folder_path, cache_folder_path)
+        self.assertEqual((0, 5), (result.made_files, result.cached_files))
+        self.write_image("photo.jpg", (1000, 2000), "RGB")
+        result = create_web_images(["img/photo.jpg", "img/drawing.png"], self.source_folder_path,
+                                   self.html_folder_path, cache_folder_path)
+        self.assertEqual((3, 1), (result.made_files, result.cached_files))
+        self.assertEqual((1000, 2000), (result.images["img/photo.jpg"].width, result.images["img/photo.jpg"].height))
+        self.assertEqual(4, len(os.listdir(os.path.join(self.html_folder_path, WEB_IMAGE_PATH))))
+
+    @skipIf(Image is None, "Pillow is not installed")
+    def test_print_images(self):
+        self.write_image("photo.jpg", (4000, 3000), "RGB")
+        self.write_image("drawing.png", (300, 200), "RGBA")
+        self.run_filt0r()
+        with open(os.path.join(self.output_folder_path, OUTFILE_LATEX_BODY), "rb") as f:
+            body = f.read().decode("utf-8")
+        # scaled to the width of the paper (A4 in draft mode) at 300 dpi, small ones are copied
+        [photo, drawing, missing] = re.findall(r'\\includegraphics\[[^]]*\]\{([^}]*)\}', body)
+        self.assertTrue(re.match(r'img-print/photo-[0-9a-f]{16}-2480\.jpg$', photo))
+        self.assertTrue(re.match(r'img-print/drawing-[0-9a-f]{16}-300\.png$', drawing))
+        self.assertEqual("img/missing.png", missing)
+        latex_folder_path = os.path.join(self.output_folder_path, "latex")
+        self.assertEqual((2480, 1860), Image.open(os.path.join(latex_folder_path, photo)).size)
+        with open(os.path.join(latex_folder_path, drawing), "rb") as f, \
+                open(os.path.join(self.source_folder_path, "img", "drawing.png"), "rb") as g:
+            self.assertEqual(g.read(), f.read())
+
+        # tall images fit the height of the paper, the old versions are removed
+        self.write_image("photo.jpg", (1000, 6000), "RGB")
+        cache_folder_path = os.path.join(self.output_folder_path, PRINT_IMAGE_CACHE_PATH)
+        result = create_print_images(["img/photo.jpg", "img/drawing.png"], self.source_folder_path, latex_folder_path,
+                                     cache_folder_path, (210, 297), 150)
+        self.assertEqual((1, 1), (result.made_files, result.cached_files))
+        self.assertTrue(result.images["img/photo.jpg"].endswith("-292.jpg"))
+        self.assertEqual(2, len(os.listdir(os.path.join(latex_folder_path, PRINT_IMAGE_PATH))))
+
+    def write_image(self, name, size, mode):
+        Image.new(mode, size, "red").save(os.path.join(self.source_folder_path, "img", name))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from test_base import test_data_folder_path
+
+import os
+import shutil
+import sys
+import tempfile
+
+import filt0r
+from latexbuild import build_pdf
+
+# Writes the labels of the body to the .aux file, like lualatex would, and a
+# PDF. With --ini, it writes a format instead (a broken one with --broken),
+# with --fmt, it fails if the format is broken.
+STUB_COMPILER = """
+import os, re, sys
+options = dict(argument.lstrip("-").partition("=")[::2] for argument in sys.argv[1:-1])
+job_name = options.get("jobname") or os.path.splitext(sys.argv[-1])[0]
+if "ini" in options:
+    with open(job_name + ".fmt", "wb") as f:
+        f.write(b"broken" if "broken" in options else b"format")
+    sys.exit()
+if "fmt" in options:
+    with open(options["fmt"] + ".fmt", "rb") as f:
+        if f.read() != b"format":
+            sys.exit(1)
+with open("latex-body.tex", "rb") as f:
+    labels = re.findall(br"\\\\label\\{([^}]*)\\}", f.read())
+with open(job_name + ".aux", "wb") as f:
+    f.write(b"".join(b"\\\\newlabel{" + label + b"}{{}{1}}\\n" for label in labels))
+with open(job_name + ".pdf", "wb") as f:
+    f.write(b"%PDF-1.5")
+"""
+
+
+class TestLatexBuild(TestCase):
+    def setUp(self):
+        self.work_folder_path = tempfile.mkdtemp()
+        self.output_folder_path = os.path.join(self.work_folder_path, "output")
+        input_folder_path = os.path.join(test_data_folder_path, "table-of-contents", "src")
+        filt0r.run(os.path.join(input_folder_path, "setup.toml"), os.path.join(input_folder_path, "textstory.txt"),
+                   self.output_folder_path)
+        self.latex_folder_path = os.path.join(self.output_folder_path, "latex")
+        stub_file_path = os.path.join(self.work_folder_path, "stub.py")
+        with open(stub_file_path, "w") as f:
+            f.write(STUB_COMPILER)
+        self.compiler = (sys.executable, stub_file_path)
+        self.format_compiler = self.compiler + ("--ini", "--jobname=latex-preamble")
+        self.format_file_path = os.path.join(self.latex_folder_path, "latex-preamble.fmt")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_folder_path)
+
+    def edit_file(self, file_name, old, new):
+        file_path = os.path.join(self.latex_folder_path, file_name)
+        with open(file_path, "rb") as f:
+            content = f.read().decode("utf-8")
+        self.assertTrue(old in content)
+        with open(file_path, "wb") as f:
+            f.write(content.replace(old, new, 1).encode("utf-8"))
+
+    def edit_body(self, old, new):
+        self.edit_file("latex-body.tex", old, new)
+
+    def build(self, format_compiler=None):
+        return build_pdf(self.latex_folder_path, self.compiler, format_compiler=format_compiler or self.format_compiler)
+
+    def format_state(self):
+        if not os.path.exists(self.format_file_path):
+            return None
+        with open(self.format_file_path, "rb") as f:
+            return os.stat(self.format_file_path).st_mtime_ns, f.read()
+
+    def test_passes(self):
+        # the second pass resolves the page references of the first one
+        result = self.build()
+        self.assertEqual((2, False), (len(result.pass_seconds), result.skipped))
+        self.assertTrue(os.path.isfile(result.pdf_file_path))
+        # unchanged
+        result = self.build()
+        self.assertEqual((0, True), (len(result.pass_seconds), result.skipped))
+        # changed text, same labels
+        self.edit_body("Wasser", "Meerwasser")
+        self.assertEqual(1, len(self.build().pass_seconds))
+        # changed labels
+        self.edit_body("\\label{0", "\\label{00")
+        self.assertEqual(2, len(self.build().pass_seconds))
+        # removed PDF
+        os.remove(os.path.join(self.latex_folder_path, "latex-document.pdf"))
+        self.assertEqual(1, len(self.build().pass_seconds))
+
+    def test_failure(self):
+        self.assertRaises(SystemExit, build_pdf, self.latex_folder_path, (sys.executable, "-c", "exit(1)"))
+        # the failed build is not taken as up to date
+        self.assertEqual(2, len(self.build().pass_seconds))
+
+    def test_format(self):
+        self.build()
+        format_state = self.format_state()
+        self.assertEqual(b"format", format_state[1])
+        # the same preamble, the format is kept
+        self.edit_body("Wasser", "Meerwasser")
+        self.build()
+        self.assertEqual(format_state, self.format_state())
+        # a changed preamble
+        for file_name in ("latex-preamble.tex", "latex-document.tex"):
+            self.edit_file(file_name, "\\usepackage{calc}", "\\usepackage{calc,ifthen}")
+        self.build()
+        self.assertNotEqual(format_state, self.format_state())
+        # a stale preamble file, the document is compiled as a whole
+        self.edit_file("latex-document.tex", "\\usepackage{calc,ifthen}", "\\usepackage{calc}")
+        self.assertEqual(1, len(self.build().pass_seconds))
+
+    def test_format_fallback(self):
+        # a broken format is removed after the first pass failed with it
+        result = self.build(self.format_compiler + ("--broken",))
+        self.assertEqual(2, len(result.pass_seconds))
+        self.assertTrue(os.path.isfile(result.pdf_file_path))
+        self.assertEqual(None, self.format_state())
+        # and built again the next time
+        self.edit_body("Wasser", "Meerwasser")
+        self.build()
+        self.assertEqual(b"format", self.format_state()[1])
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from test_base import test_data_folder_path
+
+import os
+import re
+
+from images import find_images
+from markup import parse_markup
+from renderers import HtmlRenderer, LatexRenderer, ReStructuredTextRenderer
+from textstory_setup import Setup
+
+
+class TestMarkup(TestCase):
+    @classmethod
+    def setup_class(cls):
+        setup_folder_path = os.path.join(test_data_folder_path, "comments-on", "src")
+        cls.setup = Setup(os.path.join(setup_folder_path, "setup.toml"), None)
+
+    def render(self, renderer_class, markup):
+        return renderer_class(self.setup).render(parse_markup(markup))
+
+    def test_tree(self):
+        document = parse_markup('## Title\nA "quote *with* [note]"\n\nNext')
+        kinds = [node.kind for node in document.children]
+        self.assertEqual(['headline', 'paragraph_break', 'text', 'quote', 'section_break', 'text'], kinds)
+        quote = document.children[3]
+        self.assertEqual(['text', 'italic', 'text', 'footnote'], [node.kind for node in quote.children])
+
+    def test_unclosed_delimiters_stay_text(self):
+        document = parse_markup('a "b *c" d')
+        self.assertEqual(['text', 'quote', 'text'], [node.kind for node in document.children])
+        self.assertEqual('b *c', document.children[1].children[0].text)
+
+    def test_escapes(self):
+        self.assertEqual('<section>\n<p>\\ * # &amp; &ndash; &lt;</p>\n</section>',
+                         self.render(HtmlRenderer, '\\\\ \\* \\# & -- <'))
+        self.assertEqual('\\textbackslash{} * \\#  \\& -- <', self.render(LatexRenderer, '\\\\ \\* \\# & -- <'))
+
+    def test_quote_across_paragraphs(self):
+        self.assertEqual('<section>\n<p>»a</p>\n\n<p>b«</p>\n\n<p class="indent">c</p>\n</section>',
+                         self.render(HtmlRenderer, '"a\nb"\nc'))
+        self.assertEqual('\\enquote{a\n\n\\noindent\nb}\n\nc', self.render(LatexRenderer, '"a\nb"\nc'))
+
+    def test_running_indices(self):
+        html = self.render(HtmlRenderer, 'a[one] b[[comment]] c[two [[nested]]]')
+        self.assertEqual(2, html.count('id="sn-tufte-handout1"') + html.count('for="sn-tufte-handout1"'))
+        self.assertEqual(2, html.count('id="sn-tufte-handout2"') + html.count('for="sn-tufte-handout2"'))
+        self.assertTrue('id="sn-tufte-comment2"' in html)
+        self.assertFalse('sn-tufte-handout3' in html)
+
+    def test_footnote_ending_side_comment(self):
+        markup = 'Text [[Kommentar [Fußnote]]] Ende'
+        self.assertEqual('Text {\\todo{Kommentar \\footnote{Fußnote}}} Ende', self.render(LatexRenderer, markup))
+        self.assertFalse('[' in self.render(HtmlRenderer, markup))
+        self.assertEqual(['text', 'side_comment', 'text'], [node.kind for node in parse_markup(markup).children])
+        self.assertEqual('footnote', parse_markup(markup).children[1].children[-1].kind)
+
+    def test_many_running_indices(self):
+        html = self.render(HtmlRenderer, 'a[note] b[[comment]]\n' * 10000)
+        self.assertEqual(list(range(1, 10001)),
+                         [int(index) for index in re.findall(r'id="sn-tufte-handout(\d+)"', html)])
+        self.assertEqual(10000, len(re.findall(r'id="sn-tufte-comment\d+"', html)))
+
+    def test_headlines_and_chapters(self):
+        renderer = LatexRenderer(self.setup)
+        renderer.render(parse_markup('## One\ntext\n##Two'))
+        self.assertEqual([{'id': '0One', 'name': 'One'}, {'id': '1Two', 'name': 'Two'}],
+                         renderer.chapters.chapters)
+        self.assertEqual('<section>\n<h2>One</h2>\n\n<p class="indent">x</p>\n</section>',
+                         self.render(HtmlRenderer, '## One\nx'))
+
+    def test_images(self):
+        html = self.render(HtmlRenderer, '![Alt](img/a_b.png "A *title*")')
+        self.assertEqual('<section>\n<figure class="textimage">\n<img src="img/a_b.png" alt="Alt"  />\n'
+                         '<figcaption>A <em>title</em></figcaption>\n</figure>\n</section>', html)
+        self.assertEqual('\n.. figure:: img/a_b.png\n  :alt: Alt\n  :align: center\n\n  A *title*\n\n\n\n',
+                         self.render(ReStructuredTextRenderer, '![Alt](img/a_b.png "A *title*")'))
+        # only on a line of their own
+        self.assertEqual('x !\\footnote{Alt}(a.png) y', self.render(LatexRenderer, 'x ![Alt](a.png) y'))
+        self.assertFalse('<figure' in self.render(HtmlRenderer, 'x ![Alt](a.png) y'))
+
+    def test_image_paths(self):
+        # the renderers look the images up by the paths images.find_images returns
+        markup = '![Alt]( img/a_b.png  "Title")'
+        [path] = find_images([markup])
+        self.setup.latex.print_images = {path: "img-print/a_b.png"}
+        try:
+            self.assertTrue('{img-print/a_b.png}' in self.render(LatexRenderer, markup))
+        finally:
+            self.setup.latex.print_images = {}
+
+    def test_restructured_text(self):
+        self.assertEqual('Head\n^^^^^\n»a« **b** – [#]_\n\n.. [#] *note*\n',
+                         self.render(ReStructuredTextRenderer, '## Head\n"a" __b__ -- [_note_]'))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from test_base import test_data_folder_path
+
+import os
+import time
+
+from documentreader import DocumentReader
+from markup import parse_markup
+from parallel import ChapterDocument, create_executor, run_stages, split_chapters
+from renderers import HtmlRenderer, LatexRenderer, ReStructuredTextRenderer
+from textstory_setup import Setup
+
+
+class TestParallel(TestCase):
+    @classmethod
+    def setup_class(cls):
+        input_folder_path = os.path.join(test_data_folder_path, "comments-on", "src")
+        cls.setup = Setup(os.path.join(input_folder_path, "setup.toml"), None)
+        cls.markup = DocumentReader(os.path.join(input_folder_path, "textstory.txt")).get_string()
+        cls.executor = create_executor(2)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.executor.shutdown()
+
+    def check_same_as_serial(self, markup):
+        document = parse_markup(markup)
+        chapter_document = ChapterDocument(markup, self.executor, 2)
+        for renderer_class in (HtmlRenderer, LatexRenderer, ReStructuredTextRenderer):
+            serial_renderer = renderer_class(self.setup)
+            parallel_renderer = renderer_class(self.setup)
+            self.assertEqual(serial_renderer.render(document), chapter_document.render(parallel_renderer))
+            self.assertEqual(serial_renderer.chapters.chapters, parallel_renderer.chapters.chapters)
+
+    def test_split_chapters(self):
+        self.assertEqual(["intro\n", "## a\ntext\n", "## b"], split_chapters("intro\n## a\ntext\n## b"))
+        self.assertEqual(["## a"], split_chapters("## a"))
+        self.assertEqual(["intro\n## a\ntext\n", "## b"], split_chapters("intro\n## a\ntext\n## b", 10))
+
+    def test_same_as_serial(self):
+        self.check_same_as_serial("\n\n".join([self.markup] * 5))
+
+    def test_span_across_chapters(self):
+        self.check_same_as_serial("## a\n\"quote[1]\n## b\nstill quoted\"[2]\n## c\n[3]")
+
+    def test_run_stages(self):
+        self.assertEqual([1, 2], run_stages([lambda: 1, lambda: 2]))
+
+    def test_failing_stage(self):
+        def fail():
+            raise ValueError("stage failed")
+        with self.assertRaises(ValueError):
+            run_stages([lambda: 1, fail])
+
+    def test_failing_stage_with_slow_stage(self):
+        finished = []
+
+        def slow():
+            time.sleep(0.2)
+            finished.append(True)
+            raise KeyError("failed later")
+
+        def fail():
+            raise ValueError("stage failed")
+        # the stage in this process runs to its end, the first error is raised
+        with self.assertRaises(ValueError):
+            run_stages([slow, fail])
+        self.assertEqual([True], finished)
+
+    def test_failing_stage_cancels_pool_work(self):
+        executor = create_executor(1)
+        futures = []
+
+        def slow():
+            futures.extend(executor.submit(time.sleep, 0.1) for _ in range(20))
+            return [future.result() for future in futures]
+
+        def fail():
+            time.sleep(0.05)
+            raise ValueError("stage failed")
+        try:
+            with self.assertRaises(ValueError):
+                run_stages([slow, fail], executor)
+        finally:
+            executor.shutdown()
+        self.assertTrue(any(future.cancelled() for future in futures))
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase, skipIf
+from test_base import test_data_folder_path
+
+import gzip
+import os
+import re
+import shutil
+import tempfile
+
+import filt0r
+from paths import HTML_PUBLISH_PATH, dir_path
+import publish
+from publish import FONT_CACHE_PATH, FONT_FLAVOR, font_subset, minify_css, minify_html, page_names, prune_css, \
+    publish_html
+
+
+class TestPublish(TestCase):
+    def setUp(self):
+        self.work_folder_path = tempfile.mkdtemp()
+        self.output_folder_path = os.path.join(self.work_folder_path, "output")
+        input_folder_path = os.path.join(test_data_folder_path, "comments-on", "src")
+        filt0r.run(os.path.join(input_folder_path, "setup.toml"), os.path.join(input_folder_path, "textstory.txt"),
+                   self.output_folder_path, html_chapters=True, publish=True)
+        self.html_folder_path = os.path.join(self.output_folder_path, "html")
+        self.publish_folder_path = os.path.join(self.output_folder_path, HTML_PUBLISH_PATH)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_folder_path)
+
+    def read(self, *names):
+        with open(os.path.join(*names), "rb") as f:
+            return f.read()
+
+    # returns the size of the page and the stylesheets in the folder
+    def size(self, folder_path, name):
+        css_folder_path = os.path.join(folder_path, "css")
+        return os.path.getsize(os.path.join(folder_path, name)) + sum(
+            os.path.getsize(os.path.join(css_folder_path, file_name)) for file_name in os.listdir(css_folder_path)
+            if file_name.endswith(".css"))
+
+    def test_minify(self):
+        self.assertEqual('<p>A <em>b</em> <strong>c</strong>\nd</p><p>e</p>\n',
+                         minify_html('<!-- comment -->\n<p>\n  A <em>b</em>  <strong>c</strong>\n d\n</p>\n\n<p>e</p>'))
+        self.assertEqual('<pre>\n  a\n</pre>\n', minify_html('<pre>\n  a\n</pre>'))
+        self.assertEqual('a>b,c{color:red;margin:calc(1em + 2px)}\n',
+                         minify_css('/* comment */\na > b,\nc {\n    color: red;\n    margin: calc(1em + 2px);\n}\n'))
+
+    def test_prune_css(self):
+        names = page_names('<html class="no-js"><body><p class="a b" id="c">x<em>y</em></p></body></html>')
+        self.assertEqual({"html", "body", "p", "em", ".no-js", ".a", ".b", "#c"}, names)
+        self.assertEqual('@import "x.css";:root{--x:1}p.a{color:red}@media (max-width:900px){p,em{color:blue}}'
+                         '@font-face{font-family:X}p:not(.d){margin:0}',
+                         prune_css('@import "x.css";:root{--x:1}p.a,p.d{color:red}h1{color:green}'
+                                   '@media (max-width:900px){p,em{color:blue}}@media print{h2{color:black}}'
+                                   '@font-face{font-family:X}input:checked+.a,p:not(.d){margin:0}', names))
+
+    def test_publish(self):
+        pages = sorted(name for name in os.listdir(self.publish_folder_path) if name.endswith(".html"))
+        self.assertEqual(["chapter-001.html", "chapter-002.html", "chapter-003.html", "index.html"], pages)
+        for name in pages:
+            page = self.read(self.publish_folder_path, name)
+            self.assertEqual(page, gzip.decompress(self.read(self.publish_folder_path, name + ".gz")))
+            # the text is the same
+            text = re.sub(r'<style>.*?</style>|<[^>]*>|\s', "", page.decode("utf-8"))
+            source = self.read(self.html_folder_path, name).decode("utf-8")
+            self.assertEqual(re.sub(r'<!--(?!\[if).*?-->|<[^>]*>|\s', "", source, flags=re.DOTALL), text)
+            # every stylesheet with a fingerprint, which exists, loaded after the inlined critical CSS
+            self.assertTrue(re.search(r'<style>.*body\{.*</style>', page.decode("utf-8")))
+            links = re.findall(r'<link [^>]*rel="preload" as="style"[^>]*>', page.decode("utf-8"))
+            stylesheets = [re.search(r'href="(css/[^"]*)"', link).group(1) for link in links]
+            self.assertEqual(5, len(stylesheets))
+            self.assertEqual(stylesheets, re.findall(r'<noscript><link [^>]*href="(css/[^"]*)"[^>]*></noscript>',
+                                                     page.decode("utf-8")))
+            for stylesheet in stylesheets:
+                self.assertTrue(re.match(r'css/[\w-]+\.[0-9a-f]{10}\.css$', stylesheet))
+                self.assertTrue(os.path.isfile(os.path.join(self.publish_folder_path, stylesheet)))
+        # the fonts of the stylesheet as well
+        [tufte] = [name for name in os.listdir(os.path.join(self.publish_folder_path, "css")) if
+                   name.startswith("tufte.") and name.endswith(".css")]
+        tufte = self.read(self.publish_folder_path, "css", tufte).decode("utf-8")
+        fonts = re.findall(r'url\("([^"]*)"\)', tufte)
+        self.assertEqual(2, len(fonts))
+        # and only the rules for elements and classes of the pages
+        self.assertTrue(".sidenote-number{" in tufte)
+        self.assertFalse("blockquote" in tufte)
+        for font in fonts:
+            self.assertTrue(os.path.isfile(os.path.join(self.publish_folder_path, "css", font)))
+        # fewer bytes for reading a chapter, though the critical CSS is in every page
+        self.assertLess(self.size(self.publish_folder_path, "chapter-001.html"),
+                        self.size(self.html_folder_path, "chapter-001.html") * 2 / 3)
+        # files not referenced keep their names
+        self.assertEqual(self.read(self.html_folder_path, "favicon.ico"),
+                         self.read(self.publish_folder_path, "favicon.ico"))
+
+    def test_update(self):
+        # nothing changed
+        result = publish_html(self.html_folder_path, self.publish_folder_path)
+        self.assertEqual(0, result.written_files)
+        # a missing compressed file is written again, though the page did not change
+        os.remove(os.path.join(self.publish_folder_path, "index.html.gz"))
+        result = publish_html(self.html_folder_path, self.publish_folder_path)
+        self.assertEqual(1, result.written_files)
+        self.assertEqual(self.read(self.publish_folder_path, "index.html"),
+                         gzip.decompress(self.read(self.publish_folder_path, "index.html.gz")))
+        # a changed stylesheet gets a new name, the old one is removed
+        with open(os.path.join(self.html_folder_path, "css", "styles.css"), "ab") as f:
+            f.write(b"\nh2 { color: black; }\n")
+        result = publish_html(self.html_folder_path, self.publish_folder_path)
+        self.assertEqual(5, result.written_files)
+        stylesheets = [name for name in os.listdir(os.path.join(self.publish_folder_path, "css"))
+                       if name.startswith("styles.") and not name.endswith(".br")]
+        self.assertEqual(2, len(stylesheets))
+        self.assertTrue(stylesheets[0] + ".gz" in stylesheets or stylesheets[1] + ".gz" in stylesheets)
+
+    def test_templates(self):
+        # as in the default output folder, which has the templates
+        shutil.copy(os.path.join(dir_path, "html", "index.tpl.html"), self.html_folder_path)
+        shutil.copytree(os.path.join(dir_path, "html", "templates"),
+                        os.path.join(self.html_folder_path, "templates"))
+        publish_html(self.html_folder_path, self.publish_folder_path)
+        self.assertFalse(os.path.exists(os.path.join(self.publish_folder_path, "index.tpl.html")))
+        self.assertFalse(os.path.exists(os.path.join(self.publish_folder_path, "templates")))
+
+    @skipIf(font_subset is None, "fonttools is not installed")
+    def test_subset_fonts(self):
+        css_folder_path = os.path.join(self.publish_folder_path, "css")
+        fonts = sorted(name for name in os.listdir(css_folder_path) if name.startswith("ETBembo-"))
+        self.assertEqual(2, len(fonts))
+        for font in fonts:
+            self.assertTrue(re.match(r'ETBembo-[\w-]+\.[0-9a-f]{10}\.%s$' % FONT_FLAVOR, font))
+            self.assertLess(os.path.getsize(os.path.join(css_folder_path, font)),
+                            os.path.getsize(os.path.join(self.html_folder_path, "css", re.sub(
+                                r'\.[0-9a-f]{10}\.%s$' % FONT_FLAVOR, ".ttf", font))) / 2)
+        # only the upright font is preloaded
+        page = self.read(self.publish_folder_path, "chapter-001.html").decode("utf-8")
+        self.assertEqual(["css/" + font for font in fonts if "Roman" in font],
+                         re.findall(r'<link rel="preload" href="([^"]*)" as="font" type="font/%s" crossorigin>'
+                                    % FONT_FLAVOR, page))
+        # the subset fonts are taken from the cache
+        cache_folder_path = os.path.join(self.output_folder_path, FONT_CACHE_PATH)
+        self.assertEqual(2, len(os.listdir(cache_folder_path)))
+        for file_name in os.listdir(cache_folder_path):
+            with open(os.path.join(cache_folder_path, file_name), "wb") as f:
+                f.write(b"cached")
+        shutil.rmtree(self.publish_folder_path)
+        publish_html(self.html_folder_path, self.publish_folder_path, font_cache_folder_path=cache_folder_path)
+        for font in os.listdir(css_folder_path):
+            if font.startswith("ETBembo-"):
+                self.assertEqual(b"cached", self.read(css_folder_path, font))
+
+    def test_no_font_tools(self):
+        font_subset = publish.font_subset
+        publish.font_subset = None
+        try:
+            shutil.rmtree(self.publish_folder_path)
+            publish_html(self.html_folder_path, self.publish_folder_path)
+        finally:
+            publish.font_subset = font_subset
+        # the fonts are published as they are, without preload hints
+        fonts = [name for name in os.listdir(os.path.join(self.publish_folder_path, "css"))
+                 if name.startswith("ETBembo-") and not name.endswith((".gz", ".br"))]
+        self.assertEqual(2, len(fonts))
+        for font in fonts:
+            self.assertTrue(font.endswith(".ttf"))
+        self.assertFalse('as="font"' in self.read(self.publish_folder_path, "index.html").decode("utf-8"))
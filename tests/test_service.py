@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from test_base import test_data_folder_path
+
+import asyncio
+from http.client import HTTPConnection
+import json
+import os
+import threading
+
+from paths import OUTFILE_HTML, OUTFILE_LATEX_BODY
+from service import RenderService
+
+
+class TestService(TestCase):
+    @classmethod
+    def setup_class(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.loop_thread = threading.Thread(target=cls.loop.run_forever)
+        cls.loop_thread.start()
+        cls.service = RenderService(port=0, workers=1, queue_size=1)
+        asyncio.run_coroutine_threadsafe(cls.service.start(), cls.loop).result(60)
+
+    @classmethod
+    def teardown_class(cls):
+        asyncio.run_coroutine_threadsafe(cls.service.stop(), cls.loop).result(60)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.loop_thread.join()
+        cls.loop.close()
+
+    def setUp(self):
+        self.connection = HTTPConnection("localhost", self.service.port, timeout=60)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def read_file(self, *path):
+        with open(os.path.join(test_data_folder_path, *path), "rb") as f:
+            return f.read().decode("utf-8")
+
+    def render(self, output_format, setup=None, path="/render"):
+        request = {'markup': self.read_file("comments-on", "src", "textstory.txt"),
+                   'setup': self.read_file("comments-on", "src", "setup.toml") if setup is None else setup,
+                   'format': output_format}
+        self.connection.request("POST", path, json.dumps(request).encode("utf-8"))
+        response = self.connection.getresponse()
+        return response.status, response.read().decode("utf-8")
+
+    def test_render(self):
+        self.assertEqual((200, self.read_file("comments-on", "expected", OUTFILE_HTML)), self.render("html"))
+        self.assertEqual((200, self.read_file("comments-on", "expected", OUTFILE_LATEX_BODY)), self.render("latex"))
+        # same connection, answered from the cache
+        hits = self.service.hits
+        self.assertEqual((200, self.read_file("comments-on", "expected", OUTFILE_HTML)), self.render("html"))
+        self.assertEqual(hits + 1, self.service.hits)
+
+    def test_concurrent(self):
+        # identical requests at the same time share one rendering
+        markup = self.read_file("comments-on", "src", "textstory.txt") + "\n\nConcurrent.\n"
+        misses = self.service.misses
+        responses = []
+
+        def render():
+            connection = HTTPConnection("localhost", self.service.port, timeout=60)
+            try:
+                request = {'markup': markup, 'setup': "", 'format': "html"}
+                connection.request("POST", "/render", json.dumps(request).encode("utf-8"))
+                response = connection.getresponse()
+                responses.append((response.status, response.read().decode("utf-8")))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=render) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(4, len(responses))
+        self.assertEqual(1, len(set(responses)))
+        self.assertEqual(200, responses[0][0])
+        self.assertTrue("Concurrent." in responses[0][1])
+        self.assertEqual(misses + 1, self.service.misses)
+
+    def test_errors(self):
+        self.assertEqual(400, self.render("html", setup="[broken")[0])
+        self.assertEqual(400, self.render("pdf")[0])
+        self.assertEqual(404, self.render("html", path="/other")[0])
+
+    def test_backpressure(self):
+        max_pending = self.service.max_pending
+        self.service.max_pending = 0
+        try:
+            status, _ = self.render("rst")
+        finally:
+            self.service.max_pending = max_pending
+        self.assertEqual(503, status)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from test_base import test_data_folder_path
+
+import io
+import os
+import shutil
+import tempfile
+
+from documentreader import DocumentReader
+from filt0r import write_output
+from markup import parse_markup
+from renderers import HtmlRenderer, LatexRenderer, ReStructuredTextRenderer
+from stream import StreamedDocument, read_sections
+from textstory_setup import Setup
+
+
+class TestStream(TestCase):
+    @classmethod
+    def setup_class(cls):
+        input_folder_path = os.path.join(test_data_folder_path, "comments-on", "src")
+        cls.setup = Setup(os.path.join(input_folder_path, "setup.toml"), None)
+        cls.markup = DocumentReader(os.path.join(input_folder_path, "textstory.txt")).get_string()
+
+    def setUp(self):
+        self.work_folder_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.work_folder_path, "textstory.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_folder_path)
+
+    def write(self, markup):
+        with io.open(self.file_path, "w", encoding="utf-8", newline="") as f:
+            f.write(markup)
+
+    def check_same_as_whole(self, markup, section_size):
+        self.write(markup)
+        document = parse_markup(DocumentReader(self.file_path).get_string())
+        streamed_document = StreamedDocument(self.file_path, section_size)
+        for renderer_class in (HtmlRenderer, LatexRenderer, ReStructuredTextRenderer):
+            renderer = renderer_class(self.setup)
+            streamed_renderer = renderer_class(self.setup)
+            self.assertEqual(renderer.render(document), "".join(streamed_document.render(streamed_renderer)))
+            self.assertEqual(renderer.chapters.chapters, streamed_renderer.chapters.chapters)
+
+    def test_read_sections(self):
+        markup = "\r\n \n" + "\n\n".join([self.markup] * 3) + "\r\n\r\n  \n"
+        self.write(markup)
+        sections = list(read_sections(self.file_path, 100))
+        self.assertTrue(len(sections) > 10)
+        self.assertEqual(markup.strip(), "".join(sections))
+        for section in sections[:-1]:
+            self.assertTrue(section.endswith("\n"))
+            self.assertFalse(section.strip() == "")
+
+    def test_same_as_whole(self):
+        self.check_same_as_whole("\n\n".join([self.markup] * 3), 100)
+        self.check_same_as_whole("\r\n".join([self.markup] * 2), 50)
+
+    def test_span_across_sections(self):
+        self.check_same_as_whole('## a\n"quote[1]\n\n' + "text\n" * 100 + 'still quoted"[2]\n## b\n[3]', 20)
+
+    def test_span_limit(self):
+        self.write('"a\n\n' + "text\n" * 100)
+        document = StreamedDocument(self.file_path, 20, span_limit=100)
+        self.assertTrue("".join(document.render(HtmlRenderer(self.setup))).startswith('<section>\n<p>"a</p>'))
+
+    def test_write_output_error(self):
+        # the error opening the file is raised, not one removing it
+        with self.assertRaises(FileNotFoundError) as context:
+            write_output(os.path.join(self.work_folder_path, "missing", "out.html"), ["text"])
+        self.assertIsNone(context.exception.__context__)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+import io
+import os
+import shutil
+import string
+import tempfile
+
+from documentreader import DocumentReader
+from paths import HTML_TEMPLATE, LATEX_TEMPLATE
+from templates import CompiledTemplate, load_template
+
+
+class TestTemplates(TestCase):
+    def setUp(self):
+        self.work_folder_path = tempfile.mkdtemp()
+        self.template_file_path = os.path.join(self.work_folder_path, "template.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_folder_path)
+
+    def write_template(self, template_string, mtime_ns):
+        with io.open(self.template_file_path, "w", encoding="utf-8", newline="") as f:
+            f.write(template_string)
+        os.utime(self.template_file_path, ns=(mtime_ns, mtime_ns))
+
+    def check_same_as_string_template(self, template_string):
+        matches = string.Template.pattern.finditer(template_string)
+        names = set(match.group('named') or match.group('braced') for match in matches) - set([None])
+        values = dict((name, "<%s>" % name) for name in names)
+        self.assertEqual(string.Template(template_string).substitute(**values),
+                         CompiledTemplate(template_string).substitute(**values))
+
+    def test_same_as_string_template(self):
+        self.check_same_as_string_template(DocumentReader(HTML_TEMPLATE).get_string())
+        self.check_same_as_string_template(DocumentReader(LATEX_TEMPLATE).get_string())
+        self.check_same_as_string_template("$a costs $$5, ${b}c $a")
+
+    def test_parts(self):
+        body = iter(["a", "b"])
+        self.assertEqual(["<p>", body, "</p> ", "1", ""], CompiledTemplate("<p>$body</p> $n").parts(body=body, n=1))
+        with self.assertRaises(KeyError):
+            CompiledTemplate("$body").parts()
+        with self.assertRaises(ValueError):
+            CompiledTemplate("costs $5")
+
+    def test_load_template(self):
+        self.write_template("  $a  ", 10 ** 18)
+        template = load_template(self.template_file_path)
+        self.assertEqual("1", template.substitute(a=1))
+        self.assertTrue(template is load_template(self.template_file_path))
+        self.write_template("$a$a", 10 ** 18 + 1)
+        self.assertEqual("11", load_template(self.template_file_path).substitute(a=1))
+        self.write_template("", 10 ** 18 + 2)
+        self.assertEqual(None, load_template(self.template_file_path))
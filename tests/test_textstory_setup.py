@@ -6,7 +6,7 @@ from test_base import TestBase, test_data_folder_path
 
 import os
 
-from textstory_setup import Setup
+from textstory_setup import Setup, length_in_mm
 
 
 class TestSetup(TestBase):
@@ -56,6 +56,8 @@ class TestSetup(TestBase):
         self.assertEqual("fontsize=11pt,", empty_textstory_setup.latex.latex_font_size)
         self.assertEqual("\\usepackage[a5paper, heightrounded, hmarginratio=1:1, vmarginratio=1:1]{geometry}",
                          empty_textstory_setup.latex.latex_geometry)
+        self.assertEqual((148, 210), empty_textstory_setup.latex.paper_size)
+        self.assertEqual(300, empty_textstory_setup.latex.image_dpi)
         self.assertEqual(empty_textstory_setup.latex.latex_title, empty_textstory_setup.latex.latex_half_title)
         self.assertEqual(empty_textstory_setup.general.subtitle, empty_textstory_setup.latex.latex_subtitle)
         self.assertEqual(empty_textstory_setup.general.title, empty_textstory_setup.latex.latex_title)
@@ -93,6 +95,7 @@ class TestSetup(TestBase):
         self.assertEqual("fontsize=10pt,", self.textstory_setup.latex.latex_font_size)
         self.assertEqual("\\usepackage[a4paper, heightrounded, hmarginratio=1:1, vmarginratio=1:1]{geometry}",
                          self.textstory_setup.latex.latex_geometry)
+        self.assertEqual((210, 297), self.textstory_setup.latex.paper_size)
         self.assertEqual("Blutige See", self.textstory_setup.latex.latex_half_title)
         self.assertEqual("Analoge Schatzsuche auf der Totenkopfinsel", self.textstory_setup.latex.latex_subtitle)
         self.assertEqual("Analoge Abenteuer in der blutigen See", self.textstory_setup.latex.latex_title)
@@ -115,6 +118,13 @@ class TestSetup(TestBase):
 
         # TODO page width page height --> geometry
 
+    def test_length_in_mm(self):
+        self.assertEqual(135, length_in_mm("135mm"))
+        self.assertEqual(215, length_in_mm("21.5cm"))
+        self.assertEqual(254, length_in_mm("10in"))
+        self.assertEqual(210, length_in_mm("210"))
+        self.assertEqual(None, length_in_mm("\\paperwidth"))
+
     def test_html(self):
         self.assertEqual("Digitale Abenteuer in der blutigen See | Josa Wode", self.textstory_setup.html.header_title)
         self.assertEqual("cs_CZ", self.textstory_setup.html.locale)  # Just because "de_DE" is default
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from test_base import test_data_folder_path
+
+from http.client import HTTPConnection
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from filt0r import CHANGED_CHAPTERS
+from paths import OUTFILE_PROFILE
+from watch import RELOAD_PATH, RELOAD_SCRIPT, Watcher
+
+
+class TestWatch(TestCase):
+    def setUp(self):
+        self.work_folder_path = tempfile.mkdtemp()
+        self.input_folder_path = os.path.join(self.work_folder_path, "src")
+        shutil.copytree(os.path.join(test_data_folder_path, "comments-on", "src"), self.input_folder_path)
+        self.input_file_path = os.path.join(self.input_folder_path, "textstory.txt")
+        self.output_folder_path = os.path.join(self.work_folder_path, "output")
+        self.watcher = Watcher(os.path.join(self.input_folder_path, "setup.toml"), self.input_file_path,
+                               self.output_folder_path, port=0)
+        self.watcher_thread = threading.Thread(target=self.watcher.run)
+        self.watcher_thread.start()
+
+    def tearDown(self):
+        self.watcher.stop()
+        self.watcher_thread.join()
+        shutil.rmtree(self.work_folder_path)
+
+    def wait_for(self, condition):
+        deadline = time.time() + 10
+        while not condition():
+            self.assertTrue(time.time() < deadline, "timed out")
+            time.sleep(0.01)
+
+    def read_output(self, file_name):
+        with open(os.path.join(self.output_folder_path, file_name), "rb") as f:
+            return f.read().decode("utf-8")
+
+    def test_rebuild_and_reload(self):
+        self.wait_for(lambda: self.watcher.server is not None)
+        connection = HTTPConnection("localhost", self.watcher.server.server_port, timeout=10)
+        connection.request("GET", "/")
+        page = connection.getresponse().read().decode("utf-8")
+        self.assertTrue(RELOAD_SCRIPT in page)
+
+        connection.request("GET", RELOAD_PATH)
+        reloads = connection.getresponse()
+        builds = self.watcher.builds
+        with open(self.input_file_path, "ab") as f:
+            f.write("\nA new paragraph[with a footnote].".encode("utf-8"))
+        self.assertEqual(b"data: reload\n", reloads.fp.readline())
+        self.assertEqual(builds + 1, self.watcher.builds)
+        self.assertTrue("A new paragraph" in self.read_output(os.path.join("html", "index.html")))
+        self.assertTrue("A new paragraph" in self.read_output(os.path.join("latex", "latex-body.tex")))
+        connection.close()
+
+    def test_failing_setup(self):
+        self.wait_for(lambda: self.watcher.server is not None)
+        builds = self.watcher.builds
+        with open(os.path.join(self.input_folder_path, "setup.toml"), "ab") as f:
+            f.write(b"\n[broken")
+        time.sleep(0.5)
+        self.assertEqual(builds, self.watcher.builds)
+        self.assertTrue(self.watcher_thread.is_alive())
+
+    def test_options(self):
+        self.wait_for(lambda: self.watcher.server is not None)
+        self.watcher.stop()
+        self.watcher_thread.join()
+        # the options of filt0r.py apply to every build
+        self.watcher = Watcher(os.path.join(self.input_folder_path, "setup.toml"), self.input_file_path,
+                               self.output_folder_path, port=0, profile=True,
+                               latex_chapters=CHANGED_CHAPTERS, html_chapters=True)
+        self.watcher_thread = threading.Thread(target=self.watcher.run)
+        self.watcher_thread.start()
+        self.wait_for(lambda: self.watcher.server is not None)
+        os.remove(os.path.join(self.output_folder_path, OUTFILE_PROFILE))
+        builds = self.watcher.builds
+        with open(self.input_file_path, "ab") as f:
+            f.write(b"\n\nA new paragraph.")
+        self.wait_for(lambda: self.watcher.builds > builds)
+        self.assertTrue(os.path.isfile(os.path.join(self.output_folder_path, OUTFILE_PROFILE)))
+        # only the changed (last) chapter is typeset
+        self.assertTrue("\\includeonly{chapters/chapter-003}" in self.read_output(os.path.join("latex",
+                                                                                           "latex-document.tex")))
+        # every page reloads
+        connection = HTTPConnection("localhost", self.watcher.server.server_port, timeout=10)
+        connection.request("GET", "/chapter-001.html")
+        page = connection.getresponse().read().decode("utf-8")
+        self.assertTrue(RELOAD_SCRIPT in page and "<nav" in page)
+        connection.close()
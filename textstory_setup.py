@@ -3,23 +3,36 @@
 
 from __future__ import unicode_literals
 import os
+import re
 import sys
 import toml
 
 from logger import log
 from documentreader import DocumentReader
-from fonts import FontManager
+from fonts import get_font_manager
 from paths import dir_path, PRELIMINARIES_PATH, APPENDIX_PATH
 
 PY2 = sys.version_info.major == 2
 
+# paper sizes (width, height) in mm by pageFormat
+PAPER_SIZES = {
+    'a0': (841, 1189), 'a1': (594, 841), 'a2': (420, 594), 'a3': (297, 420), 'a4': (210, 297), 'a5': (148, 210),
+    'a6': (105, 148), 'b0': (1000, 1414), 'b1': (707, 1000), 'b2': (500, 707), 'b3': (353, 500), 'b4': (250, 353),
+    'b5': (176, 250), 'b6': (125, 176), 'letter': (215.9, 279.4), 'legal': (215.9, 355.6),
+    'executive': (184.15, 266.7)}
+# millimeters per unit of TeX lengths, numbers without a unit are taken as mm
+LENGTH_UNITS = {'mm': 1.0, 'cm': 10.0, 'in': 25.4, 'pt': 25.4 / 72.27, 'bp': 25.4 / 72, '': 1.0}
+
 
 class Setup(object):
-    def __init__(self, setup_file_path, input_file_path, output_folder_path=None):
+    # setup_toml (the parsed TOML) may be given instead of setup_file_path
+    def __init__(self, setup_file_path, input_file_path, output_folder_path=None, setup_toml=None):
         self.input_file_path = input_file_path
         self.output_folder_path = output_folder_path
-        setup_file_string = DocumentReader(setup_file_path).get_string()
-        self.setup_toml = toml.loads(setup_file_string)
+        if setup_toml is None:
+            setup_file_string = DocumentReader(setup_file_path).get_string()
+            setup_toml = toml.loads(setup_file_string)
+        self.setup_toml = setup_toml
         self.general = GeneralSetupData(self.setup_toml)
         self.html = HtmlSetupData(self.setup_toml, self.general)
 
@@ -103,6 +116,8 @@ class HtmlSetupData(SetupData):
             self.og_image_tag = '<meta property="og:image" content="%s" />' % setup_toml['html']['previewimage']
         else:
             self.og_image_tag = ""
+        # web variants of the images by path, set by the build (see images.create_web_images)
+        self.responsive_images = {}
 
 
 class LatexSetupData(SetupData):
@@ -158,27 +173,43 @@ class LatexSetupData(SetupData):
         # isbn
         self.isbn = self.get_string(category, 'isbn', default="")
 
-        # geometry
+        # geometry, paper_size is (width, height) in mm or None if unknown
         self.latex_geometry = "\\usepackage["
         page_format = self.get_string(category, 'pageFormat', default="")
         if general.output_mode == "draft" or general.output_mode == "manuscript":
             self.latex_geometry += "a4paper"
+            self.paper_size = PAPER_SIZES['a4']
         elif page_format:
             self.latex_geometry += "%spaper" % page_format
+            self.paper_size = PAPER_SIZES.get(page_format.lower())
         else:
             page_width = self.get_string(category, 'pageWidth', default="")
             page_height = self.get_string(category, 'pageHeight', default="")
             if page_width and page_height:
                 self.latex_geometry += "paperwidth=%s, paperheight=%s" % (page_width, page_height,)
+                self.paper_size = (length_in_mm(page_width), length_in_mm(page_height))
+                if None in self.paper_size:
+                    self.paper_size = None
             else:  # default
                 self.latex_geometry += "a5paper"
+                self.paper_size = PAPER_SIZES['a5']
         binding_offset = self.get_string(category, 'bindingOffset', default="")
         if binding_offset:
             self.latex_geometry += ", bindingoffset=%s" % binding_offset
         self.latex_geometry += ", heightrounded, hmarginratio=1:1, vmarginratio=1:1]{geometry}"
 
+        # images are scaled down to this resolution on the paper (see images.create_print_images)
+        image_dpi = self.get_string(category, 'imageDpi', default="300")
+        try:
+            self.image_dpi = int(image_dpi)
+        except ValueError:
+            log.warning("[" + category + "][imageDpi] not a number, using 300.")
+            self.image_dpi = 300
+        # print versions of the images by path, set by the build
+        self.print_images = {}
+
         # font
-        font_manager = FontManager()
+        font_manager = get_font_manager()
         if general.output_mode == "draft" or general.output_mode == "manuscript":
             log.info(general.output_mode + " mode. Using courier as main font.")
             self.font = font_manager.get_latex_font_setup("courier")
@@ -215,3 +246,11 @@ class LatexSetupData(SetupData):
         if general.output_mode == "draft":
             self.todonotes_config = 'draft'
         self.todonotes_config += ', backgroundcolor=white, linecolor=black'
+
+
+# returns a TeX length (e.g. "135mm", "21.5cm") in mm, or None if it is not a length
+def length_in_mm(length):
+    match = re.match(r'\s*(\d+(?:\.\d*)?|\.\d+)\s*([a-z]*)\s*$', length)
+    if match is None or match.group(2) not in LENGTH_UNITS:
+        return None
+    return float(match.group(1)) * LENGTH_UNITS[match.group(2)]
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2019 Jan-Philip Gehrcke. See LICENSE file for details.
+
+from __future__ import unicode_literals
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+
+from cache import CACHE_FILE, RenderCache
+from filt0r import ASSETS, LATEX, HTML, RESTRUCTURED_TEXT, OUTPUTS, build, prepare_out_folder
+from latexbuild import build_pdf
+from logger import log
+from parallel import create_executor
+from paths import dir_path, HTML_TEMPLATE, HTML_LICENSE, LATEX_TEMPLATE, OUTFILE_PROFILE, PRELIMINARIES_PATH, \
+    APPENDIX_PATH
+from runprofile import RunProfile
+from textstory_setup import Setup
+
+# seconds between two looks at the watched files
+WATCH_INTERVAL = 0.1
+DEFAULT_PORT = 8000
+
+RELOAD_PATH = "/__reload"
+# makes a page served by LiveReloadServer reload after every build
+RELOAD_SCRIPT = '<script>new EventSource("%s").onmessage = function () { location.reload(); };</script>' % RELOAD_PATH
+
+
+class Watcher(object):
+    """
+    Builds a document and builds it again whenever one of its sources changes,
+    until stop() is called (or Ctrl+C is pressed).
+
+    Setup, render cache and process pool stay in memory between builds, and
+    only the outputs depending on the changed files are created again. The
+    HTML output is served on localhost:port, where open pages reload after
+    every build. The other options are those of filt0r.run_with_setup, they
+    apply to every build.
+    """
+    def __init__(self, setup_file_path, input_file_path, output_folder_path=None, jobs=1, restructured_text=False,
+                 cache=True, port=DEFAULT_PORT, link_assets=None, stream=False, profile=False, pdf=False,
+                 latex_chapters=None, html_chapters=False, publish=False):
+        self.setup_file_path = os.path.realpath(setup_file_path)
+        self.input_file_path = os.path.realpath(input_file_path)
+        self.output_folder_path = output_folder_path
+        # streamed documents are neither cached nor rendered in parallel (see filt0r.run_with_setup)
+        self.jobs = 1 if stream else jobs
+        self.cache = cache and not stream
+        self.port = port
+        self.link_assets = link_assets
+        self.stream = stream
+        self.profile = profile
+        self.pdf = pdf
+        self.latex_chapters = latex_chapters
+        self.html_chapters = html_chapters
+        self.publish = publish
+        self.outputs = OUTPUTS + (RESTRUCTURED_TEXT,) if restructured_text else OUTPUTS
+        text_outputs = tuple(output for output in self.outputs if output != ASSETS)
+        # watched path: outputs depending on it
+        self.dependents = {
+            self.input_file_path: text_outputs,
+            self.setup_file_path: text_outputs,
+            LATEX_TEMPLATE: (LATEX,),
+            HTML_TEMPLATE: (HTML,),
+            HTML_LICENSE: (HTML,),
+            os.path.join(dir_path, 'latex', PRELIMINARIES_PATH): (ASSETS, LATEX),
+            os.path.join(dir_path, 'latex', APPENDIX_PATH): (ASSETS, LATEX),
+        }
+        # the setup depends on these, too (it lists the copied preliminaries and appendix)
+        self.setup_sources = [self.setup_file_path,
+                              os.path.join(dir_path, 'latex', PRELIMINARIES_PATH),
+                              os.path.join(dir_path, 'latex', APPENDIX_PATH)]
+        self.setup = None
+        self.render_cache = None
+        self.executor = None
+        self.server = None
+        self.builds = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        if not self._load_setup():
+            return
+        if self.cache:
+            self.render_cache = RenderCache(os.path.join(self.setup.output_folder_path, CACHE_FILE))
+        if self.jobs > 1:
+            self.executor = create_executor(self.jobs)
+        try:
+            state = self._snapshot()
+            self._build(self.outputs)
+            self.server = LiveReloadServer(self.port, os.path.join(self.setup.output_folder_path, 'html'))
+            server_thread = threading.Thread(target=self.server.serve_forever)
+            server_thread.daemon = True
+            server_thread.start()
+            log.info("Serving HTML on http://localhost:%s/ (reloads after every build)", self.server.server_port)
+            log.info("Watching %s for changes, stop with Ctrl+C.", self.input_file_path)
+            while not self._stopped.wait(WATCH_INTERVAL):
+                new_state = self._snapshot()
+                if new_state == state:
+                    continue
+                # wait until the files are written completely
+                while not self._stopped.wait(WATCH_INTERVAL):
+                    settled_state = self._snapshot()
+                    if settled_state == new_state:
+                        break
+                    new_state = settled_state
+                changed = [path for path in new_state if new_state[path] != state[path]]
+                state = new_state
+                self._rebuild(changed)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.server is not None:
+                self.server.stop()
+            if self.executor is not None:
+                self.executor.shutdown()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _load_setup(self):
+        try:
+            setup = Setup(self.setup_file_path, self.input_file_path, self.output_folder_path)
+        except (Exception, SystemExit) as e:
+            log.error("Failed loading setup: %s", e)
+            return False
+        if not prepare_out_folder(setup):
+            return False
+        self.setup = setup
+        return True
+
+    # returns the modification time and size of all watched files
+    def _snapshot(self):
+        state = {}
+        for path in self.dependents:
+            if os.path.isdir(path):
+                files = []
+                for root, dirs, file_names in os.walk(path):
+                    for file_name in file_names:
+                        files.append((os.path.join(root, file_name),) + _file_state(os.path.join(root, file_name)))
+                state[path] = sorted(files)
+            else:
+                state[path] = _file_state(path)
+        return state
+
+    def _rebuild(self, changed):
+        log.info("Changed: %s", ", ".join(os.path.basename(os.path.normpath(path)) for path in changed))
+        outputs = set()
+        for path in changed:
+            outputs.update(self.dependents[path])
+        start = time.time()
+        if ASSETS in outputs:
+            outputs.remove(ASSETS)
+            if not self._build((ASSETS,)):
+                return
+        if any(path in self.setup_sources for path in changed) and not self._load_setup():
+            return
+        if self._build([output for output in self.outputs if output in outputs]):
+            log.info("Rebuilt in %.0f ms.", (time.time() - start) * 1000)
+            self.server.notify_reload()
+
+    def _build(self, outputs):
+        run_profile = RunProfile() if self.profile else None
+        try:
+            succeeded = build(self.setup, outputs, self.render_cache, self.executor, self.jobs, self.stream,
+                              self.link_assets, run_profile, self.latex_chapters, self.html_chapters, self.publish)
+            if succeeded and self.pdf and LATEX in outputs:
+                build_pdf(os.path.join(self.setup.output_folder_path, 'latex'), profile=run_profile)
+        except (Exception, SystemExit) as e:
+            log.error("Build failed: %s", e)
+            if self.executor is not None:
+                # a failed build cancels the work on the process pool by shutting it down
+                self.executor.shutdown()
+                self.executor = create_executor(self.jobs)
+            return False
+        finally:
+            if run_profile is not None:
+                run_profile.write(os.path.join(self.setup.output_folder_path, OUTFILE_PROFILE))
+                log.info("Run profile:\n%s", run_profile.summary())
+        self.builds += 1
+        return succeeded
+
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class LiveReloadServer(ThreadingHTTPServer):
+    """
+    Serves a folder on localhost. Pages (.html files) get a script that makes
+    them reload on notify_reload().
+    """
+    daemon_threads = True
+
+    def __init__(self, port, folder_path):
+        self.folder_path = folder_path
+        self.version = 0
+        self.stopped = False
+        self.reloaded = threading.Condition()
+        ThreadingHTTPServer.__init__(self, ('localhost', port), LiveReloadRequestHandler)
+
+    def notify_reload(self):
+        with self.reloaded:
+            self.version += 1
+            self.reloaded.notify_all()
+
+    def stop(self):
+        with self.reloaded:
+            self.stopped = True
+            self.reloaded.notify_all()
+        self.shutdown()
+        self.server_close()
+
+
+class LiveReloadRequestHandler(SimpleHTTPRequestHandler):
+    def __init__(self, request, client_address, server):
+        SimpleHTTPRequestHandler.__init__(self, request, client_address, server, directory=server.folder_path)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path == RELOAD_PATH:
+            self.send_reloads()
+        elif path.endswith(('/', '.html')):
+            self.send_page(self.translate_path(path + 'index.html' if path.endswith('/') else path))
+        else:
+            SimpleHTTPRequestHandler.do_GET(self)
+
+    def send_page(self, file_path):
+        try:
+            with open(file_path, "rb") as f:
+                page = f.read()
+        except IOError:
+            self.send_error(404)
+            return
+        if b"</body>" in page:
+            page = page.replace(b"</body>", RELOAD_SCRIPT.encode("utf-8") + b"\n</body>", 1)
+        else:
+            page += RELOAD_SCRIPT.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(page)
+
+    # sends a server-sent event after every build, until the client or the server goes away
+    def send_reloads(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        server = self.server
+        version = server.version
+        try:
+            while True:
+                with server.reloaded:
+                    server.reloaded.wait_for(lambda: server.version != version or server.stopped, timeout=15)
+                    if server.stopped:
+                        return
+                    reload = server.version != version
+                    version = server.version
+                # a comment keeps the connection open and notices closed ones
+                self.wfile.write(b"data: reload\n\n" if reload else b": waiting\n\n")
+                self.wfile.flush()
+        except (IOError, OSError):
+            return
+
+    def log_message(self, format, *args):
+        log.debug("%s - %s", self.address_string(), format % args)